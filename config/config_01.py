@@ -1,6 +1,51 @@
 # --- API LIMITS AND TIME FILTERS ---
 MAX_LIMIT = 5 # 1000 
 TIME_FILTER = 'year' 
+# Reddit listings stop at ~1000 results per search. If True (and MAX_LIMIT is above that cap), every search
+# that hits the cap is split into narrower queries (e.g. 'gaza OR palestine*' -> 'gaza', 'palestine*'),
+# recursively, so coverage grows with the volume of matching content.
+PARTITION_QUERIES = True
+
+# --- CONCURRENCY ---
+# Reddit's OAuth quota (requests per minute), shared by all workers through a token bucket.
+REQUESTS_PER_MINUTE = 100
+# Number of workers for combinations (and, separately, for per-post comment fetches). 1 = sequential.
+N_WORKERS = 8
+# Failed requests (429, 5xx, network errors) are retried individually with exponential backoff
+# (base * 2^attempt seconds + jitter, or the Retry-After header when present).
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+
+# --- OUTPUT ---
+# Number of records buffered in memory before being flushed to a new RAW Parquet part file.
+WRITE_BATCH_SIZE = 5000
+
+# --- CROSS-RUN DEDUPLICATION ---
+# If True, posts/comments already stored in data/raw_data (by any previous run) are skipped:
+# known posts are neither written again nor have their comment tree fetched.
+USE_SEEN_ID_INDEX = True
+# Incremental (change-detection) mode, requires USE_SEEN_ID_INDEX. Instead of skipping known posts, their search
+# result is compared with the last stored snapshot: the comment tree is refetched only if num_comments grew,
+# otherwise only a metrics row is written (post_metrics_raw_*.parquet).
+INCREMENTAL_MODE = True
+
+# --- COMMENT TREE EXPANSION ---
+# Max API calls spent per post expanding 'MoreComments' stubs (largest first, concurrently).
+# 0 = discard the stubs, keeping only the comments returned with the post (replace_more(limit=0)).
+MORE_COMMENTS_BUDGET_PER_POST = 0 # 32
+# Max API calls spent on expansion over the whole run (None = no run-level limit).
+MORE_COMMENTS_BUDGET_PER_RUN = 2000
+
+# --- OFFLINE DUMP INGESTION (01c) ---
+# Directory (relative to the project root) with Reddit dump files: RS_*/RC_*.zst or <subreddit>_submissions/_comments.zst
+DUMP_DIR = 'data/dumps'
+# Number of processes decompressing and parsing dump files in parallel (one file per process)
+DUMP_N_PROCESSES = 4
+
+# --- AUTHOR ENRICHMENT (01d) ---
+# Author data (karma, account age, status) is cached in data/author_cache.sqlite and looked up again
+# only once older than this many days.
+AUTHOR_CACHE_TTL_DAYS = 30
 
 # --- SEARCH STRATEGIES ---
 
@@ -0,0 +1,26 @@
+# --- INCREMENTAL PROCESSING ---
+# If True, only RAW files not processed by a previous run are processed, and only the partitions of
+# data/processed_data/02_processed_data/ they touch are rebuilt (see the 02_processed_manifest.json manifest).
+# If False (or with --full), the processed dataset is rebuilt from scratch.
+INCREMENTAL_PROCESSING = True
+
+# --- DEDUPLICATION ---
+# Posts and comments repeat across extractions: only the latest extraction_time snapshot of every post_id/comment_id
+# is kept. Rows are hash-partitioned by post_id into DEDUP_N_BUCKETS buckets, deduplicated (and processed) one bucket
+# at a time, so memory is bounded by a bucket rather than by the whole RAW history. Raise it as the data grows
+# (changing it triggers a full rebuild).
+DEDUP_N_BUCKETS = 64
+
+# --- PARTITION PRUNING ---
+# RAW files are hive-partitioned by extraction_date and subreddit (see 01_extract_raw_data.py).
+# Only the partitions matching these filters are read; None = no filter.
+# Note: legacy RAW files (written directly in data/raw_data, without partitions) are skipped by any active filter.
+EXTRACTION_DATE_FROM = None # e.g. '2024-01-01' (inclusive)
+EXTRACTION_DATE_TO = None   # e.g. '2024-12-31' (inclusive)
+SUBREDDITS_TO_PROCESS = None # e.g. ['politics', 'Conservative']
+
+# --- TOKEN COUNTS ---
+# If True, the processed tables store the token counts of post_title/post_body/comment_body (*_n_tokens, see
+# token_utils), reused by the truncation policies of 03c/04c. Needs the tokenizer's encoding (downloaded by tiktoken
+# on first use) and adds a Python step to the streaming query. If False, 03c/04c count the tokens of the records they send.
+COMPUTE_TOKEN_COUNTS = False
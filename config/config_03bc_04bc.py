@@ -9,38 +9,52 @@ from src.feature_engineering_utils import (content_relevance_score,
                                            sentiment_score, 
                                            discourse_tone_score,
                                            dominant_frame_score,
-                                           argument_quality_score
+                                           argument_quality_score,
+                                           content_relevance_prompt,
+                                           political_stance_prompt,
+                                           sentiment_prompt,
+                                           discourse_tone_prompt,
+                                           dominant_frame_prompt,
+                                           argument_quality_prompt
                                            )
 
+# 'func' calls the LLM; 'prompt' only builds its chat messages (used to count prompt tokens before a run)
+
 FEATURE_CONFIG = {
     'content_relevance_score': {
         'func': content_relevance_score,
+        'prompt': content_relevance_prompt,
         'type': 'ordinal', # 0-5
         'cutoff': 3,       # For binary filtering check
         'validation_threshold': 0.8 # binary accuracy threshold
     },
     'political_stance': {
         'func': political_stance_score,
+        'prompt': political_stance_prompt,
         'type': 'ordinal',  # 1-5
         'validation_threshold': 0.9 # adjacent accuracy threshold
     },
     'argument_quality_score': {
         'func': argument_quality_score,
+        'prompt': argument_quality_prompt,
         'type': 'ordinal',  # 0-5
         'validation_threshold': 0.9 # adjacent accuracy threshold
     },
     'sentiment_score': {
         'func': sentiment_score,
+        'prompt': sentiment_prompt,
         'type': 'continuous', # Float -1.0 to 1.0
         'validation_threshold': 0.25 # MAE threshold
     },
     'discourse_tone': {
         'func': discourse_tone_score,
+        'prompt': discourse_tone_prompt,
         'type': 'categorical', # Nominal (String)
         'validation_threshold': 0.8 # accuracy threshold
     },
     'dominant_frame': {
         'func': dominant_frame_score,
+        'prompt': dominant_frame_prompt,
         'type': 'categorical', # Nominal (String)
         'validation_threshold': 0.8 # accuracy threshold
     }
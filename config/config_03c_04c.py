@@ -1,4 +1,44 @@
 PILOT_MODE = True
 PILOT_SIZE = 25
 PILOT_SEED = 111
-BATCH_SAVE_SIZE = 5  
\ No newline at end of file
+BATCH_SAVE_SIZE = 5  
+# Every BATCH_SAVE_SIZE records are saved as a new part file in data/features/<feature_name>/;
+# every COMPACT_EVERY_N_PARTS parts are merged in the background (and everything at the end of a run)
+COMPACT_EVERY_N_PARTS = 50
+
+# Concurrent generation: LLM calls in flight at once (raise it up to what the provider's rate limit allows).
+# Rate-limited (429) and failed calls are retried by the OpenAI client with exponential backoff, LLM_MAX_RETRIES times.
+MAX_CONCURRENT_REQUESTS = 8
+LLM_MAX_RETRIES = 5
+
+# Post context sent with every comment (see post_context_utils): the post body is the same for all the comments
+# of a post, so it is compacted once per post instead of being sent in full with each comment.
+# 'full' | 'truncate' (body cut at POST_CONTEXT_MAX_CHARS) | 'summary' (one cached LLM summary per long post)
+POST_CONTEXT_MODE = 'truncate'
+POST_CONTEXT_MAX_CHARS = 1500
+
+# Token budget (see token_utils): per-field truncation applied before the 'text_content' is assembled.
+# 'head' keeps the first max_tokens tokens | 'head_tail' keeps the first and last max_tokens / 2 tokens
+TRUNCATION_POLICIES = {
+    'post_body': {'max_tokens': 400, 'policy': 'head'},
+    'comment_body': {'max_tokens': 800, 'policy': 'head_tail'},
+}
+# Projected cost before each run: expected reply size (a one-key JSON object) and prompt size reported as outlier
+OUTPUT_TOKENS_PER_RECORD = 12
+OUTLIER_PROMPT_TOKENS = 4000
+
+# Batch mode (see llm_batch_utils): for full-dataset runs, the prompts of every pending record are submitted as JSONL
+# files through the provider's asynchronous batch interface (batch pricing, results within 24h) instead of live calls.
+# Batches are polled every BATCH_POLL_SECONDS; after BATCH_TIMEOUT_SECONDS (None = no limit) polling stops and the
+# next run resumes the same batches.
+BATCH_MODE = False
+BATCH_MAX_REQUESTS_PER_JOB = 50_000
+BATCH_POLL_SECONDS = 60
+BATCH_TIMEOUT_SECONDS = None
+
+# Thread-grouped requests: the pending comments of a post are classified together, with the post context sent once and
+# the comments as a numbered list, in chunks of up to THREAD_MAX_COMMENTS_PER_REQUEST comments and
+# THREAD_MAX_COMMENT_TOKENS comment tokens. Comments missing from a reply fall back to single-comment calls.
+THREAD_BATCHING_MODE = False
+THREAD_MAX_COMMENT_TOKENS = 3000
+THREAD_MAX_COMMENTS_PER_REQUEST = 20
@@ -29,3 +29,7 @@ FEATURES_TO_GENERATE = [
     ]
 
 
+
+# 04b/04c: combined mode - one call per comment returns every feature as one JSON object (each feature keeps its own
+# guidelines and few-shot labels) instead of one call per feature. 04b validates it next to the per-feature calls.
+COMBINED_FEATURES_MODE = False
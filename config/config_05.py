@@ -0,0 +1,12 @@
+# --- STANCE INPUT ---
+# Feature (generated by 04c, stored as part/compacted files under data/features/<name>/ and read with
+# scan_feature_results) used as the stance of every comment.
+STANCE_FEATURE = 'political_stance'
+
+# Stance score (1-5) -> stance group index: 0 = Pro-Palestine, 1 = Neutral, 2 = Pro-Israel
+STANCE_GROUPS = {1: 0, 2: 0, 3: 1, 4: 2, 5: 2}
+STANCE_GROUP_NAMES = ['pro_palestine', 'neutral', 'pro_israel']
+
+# --- THREAD METRICS ---
+# Threads with fewer comment-to-comment replies between stance-scored comments are dropped from the output
+MIN_THREAD_STANCE_EDGES = 5
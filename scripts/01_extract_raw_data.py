@@ -1,4 +1,4 @@
-import polars as pl
+import argparse
 import datetime as dt
 from dotenv import load_dotenv
 import os
@@ -14,15 +14,26 @@ sys.path.insert(0, project_path)
 
 from config.config_01 import (
     LIST_SUBREDDITS, LIST_QUERIES, LIST_SORTS, 
-    MAX_LIMIT, TIME_FILTER
+    MAX_LIMIT, TIME_FILTER, PARTITION_QUERIES,
+    REQUESTS_PER_MINUTE, N_WORKERS, MAX_RETRIES, BACKOFF_BASE_SECONDS,
+    WRITE_BATCH_SIZE, USE_SEEN_ID_INDEX, INCREMENTAL_MODE,
+    MORE_COMMENTS_BUDGET_PER_POST, MORE_COMMENTS_BUDGET_PER_RUN
 )
 # Se usa 'data_extraction_uitls' para coincidir con el nombre de archivo subido
-from src.data_extraction_uitls import authenticate_praw, run_extraction 
+from src.data_extraction_uitls import (
+    TokenBucket, ApiCallBudget, ParquetPartWriter, ExtractionManifest, SeenIdIndex, POST_SCHEMA, COMMENT_SCHEMA, POST_METRICS_SCHEMA,
+    authenticate_praw, run_extraction, load_seen_ids, extraction_date_from_id
+)
 
 # --- 0. CONFIGURATION & SETUP ---
 
-# Dynamic data_extraction_id based on the current datetime (YYYYMMDDHHMMSS)
-data_extraction_id = dt.datetime.now().strftime('%Y%m%d%H%M%S') 
+parser = argparse.ArgumentParser(description="Extracts RAW posts and comments from Reddit.")
+parser.add_argument('--resume', metavar='EXTRACTION_ID', default=None,
+                    help="Resume an interrupted extraction: completed combinations are skipped and records already on disk are not extracted again.")
+args = parser.parse_args()
+
+# Dynamic data_extraction_id based on the current datetime (YYYYMMDDHHMMSS), or the one of the run being resumed
+data_extraction_id = args.resume if args.resume else dt.datetime.now().strftime('%Y%m%d%H%M%S') 
 
 # Define logging directories and file path
 logs_dir = os.path.join(project_path, 'logs')
@@ -35,7 +46,7 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(logs_file_path, mode='w', encoding='utf-8'),
+        logging.FileHandler(logs_file_path, mode='a' if args.resume else 'w', encoding='utf-8'),
         logging.StreamHandler(sys.stdout)
     ]
 )
@@ -53,51 +64,100 @@ USER_AGENT = "ResearchScript v1.0 by /u/Hour_Sell5070"
 if __name__ == "__main__":
     
     # 1. Authenticate and exit if failed 
-    reddit = authenticate_praw(CLIENT_ID, CLIENT_SECRET, USER_AGENT)
+    # All API calls (from every worker) are paced by a single token bucket sized to the quota
+    token_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+    reddit = authenticate_praw(CLIENT_ID, CLIENT_SECRET, USER_AGENT, token_bucket,
+                               max_retries=MAX_RETRIES, backoff_base_seconds=BACKOFF_BASE_SECONDS)
     if not reddit:
         logging.error("❌ Authentication failed. Exiting script.")
         sys.exit(1)
         
-    # 2. Run the full extraction process
+    # 2. Open streaming writers: records are flushed to RAW Parquet part files while extraction runs.
+    # The post writer always flushes the comment writer first, so a post on disk always has its comments on disk.
+    # RAW layout: data/raw_data/extraction_date=YYYY-MM-DD/subreddit=<name>/<file_prefix>_partNNNNN.parquet
+    output_data_dir = os.path.join(project_path, 'data', 'raw_data')
+    partitions = {'extraction_date': extraction_date_from_id(data_extraction_id)}
+    comment_writer = ParquetPartWriter(output_data_dir, f"comments_data_raw_{data_extraction_id}", COMMENT_SCHEMA, WRITE_BATCH_SIZE,
+                                       partitions=partitions, partition_by={'subreddit': 'comment_subreddit'})
+    post_writer = ParquetPartWriter(output_data_dir, f"posts_data_raw_{data_extraction_id}", POST_SCHEMA, WRITE_BATCH_SIZE,
+                                    depends_on=comment_writer, partitions=partitions, partition_by={'subreddit': 'post_subreddit'})
+    post_metrics_writer = ParquetPartWriter(output_data_dir, f"post_metrics_raw_{data_extraction_id}", POST_METRICS_SCHEMA, WRITE_BATCH_SIZE,
+                                            partitions=partitions)
+
+    # Run manifest: one checkpoint per completed (subreddit, query, sort, time_filter) combination
+    manifests_dir = os.path.join(project_path, 'data', 'extraction_manifests')
+    manifest = ExtractionManifest(manifests_dir, data_extraction_id)
+
+    # When resuming, records already flushed by the interrupted run are not extracted again
+    post_ids_seen = load_seen_ids(post_writer.part_paths, 'post_id')
+    comment_ids_seen = load_seen_ids(comment_writer.part_paths, 'comment_id')
+    if args.resume:
+        logging.info(f"🔄 Resuming extraction {data_extraction_id}: {len(post_ids_seen)} posts and {len(comment_ids_seen)} comments already on disk.")
+
+    # Cross-run deduplication: skip everything already stored by previous extractions.
+    # In incremental mode, known posts are not skipped but checked against their last snapshot instead.
+    known_posts = None
+    if USE_SEEN_ID_INDEX:
+        seen_id_index = SeenIdIndex(os.path.join(project_path, 'data', 'seen_id_index.sqlite'))
+        seen_id_index.sync_from_raw_data(output_data_dir)
+        if INCREMENTAL_MODE:
+            known_posts = seen_id_index.load_post_snapshots()
+        else:
+            post_ids_seen |= seen_id_index.load_post_ids()
+        comment_ids_seen |= seen_id_index.load_comment_ids()
+        seen_id_index.close()
+        logging.info(f"🗂️ Known IDs loaded: {len(known_posts) if known_posts is not None else len(post_ids_seen)} posts | {len(comment_ids_seen)} comments.")
+
+    # Run-level API-call budget for 'MoreComments' expansion, shared by all workers
+    run_budget = ApiCallBudget(MORE_COMMENTS_BUDGET_PER_RUN) if MORE_COMMENTS_BUDGET_PER_RUN is not None else None
+
+    # 3. Run the full extraction process
     logging.info("Starting data extraction...")
     start_time = time.time()
-    post_data_list, comment_data_list = run_extraction(
-        reddit, 
-        LIST_SUBREDDITS, 
-        LIST_QUERIES, 
-        LIST_SORTS,
-        MAX_LIMIT,
-        TIME_FILTER
-    )
+    try:
+        run_extraction(
+            reddit, 
+            LIST_SUBREDDITS, 
+            LIST_QUERIES, 
+            LIST_SORTS,
+            MAX_LIMIT,
+            TIME_FILTER,
+            n_workers=N_WORKERS,
+            post_writer=post_writer,
+            comment_writer=comment_writer,
+            manifest=manifest,
+            post_ids_seen=post_ids_seen,
+            comment_ids_seen=comment_ids_seen,
+            known_posts=known_posts,
+            post_metrics_writer=post_metrics_writer,
+            more_comments_budget=MORE_COMMENTS_BUDGET_PER_POST,
+            run_budget=run_budget,
+            partition_queries=PARTITION_QUERIES
+        )
+    finally:
+        # Flush whatever is still buffered, even if extraction crashed midway
+        post_part_paths = post_writer.close()
+        comment_part_paths = comment_writer.close()
+        post_metrics_writer.close()
     end_time = time.time()
     logging.info(f"✅ Data Extraction completed in {round((end_time - start_time)/60, 2)} minutes.")
 
-    # 3. Convert to Polars DataFrames and Save (RAW Data Only)
-    
-    logging.info("Saving extracted data")
+    # 4. Report saved RAW data
 
-    output_data_dir = os.path.join(project_path, 'data', 'raw_data')
-    os.makedirs(output_data_dir, exist_ok=True)
-    
     # --- POSTS (RAW) ---
-    if post_data_list:
-        df_posts = pl.DataFrame(post_data_list)
-        output_filename_posts = f"posts_data_raw_{data_extraction_id}.parquet"
-        output_file_path_posts = os.path.join(output_data_dir, output_filename_posts)
-        df_posts.write_parquet(output_file_path_posts)
-        logging.info(f"📁 RAW POSTS data saved successfully to {output_file_path_posts} (Records: {len(df_posts)})")
+    if len(post_writer):
+        logging.info(f"📁 RAW POSTS data saved successfully to {len(post_part_paths)} part files in {output_data_dir} (Records: {len(post_writer)})")
     else:
         logging.warning("❌ No post data was extracted.")
         
     # --- COMMENTS (RAW) ---
-    if comment_data_list:
-        df_comments = pl.DataFrame(comment_data_list)
-        output_filename_comments = f"comments_data_raw_{data_extraction_id}.parquet"
-        output_file_path_comments = os.path.join(output_data_dir, output_filename_comments)
-        df_comments.write_parquet(output_file_path_comments)
-        logging.info(f"📁 RAW COMMENTS data saved successfully to {output_file_path_comments} (Records: {len(df_comments)})")
+    if len(comment_writer):
+        logging.info(f"📁 RAW COMMENTS data saved successfully to {len(comment_part_paths)} part files in {output_data_dir} (Records: {len(comment_writer)})")
     else:
         logging.warning("❌ No comment data was extracted.")
+
+    # --- POST METRICS (RAW, incremental mode only) ---
+    if len(post_metrics_writer):
+        logging.info(f"📁 RAW POST METRICS of unchanged posts saved to {output_data_dir} (Records: {len(post_metrics_writer)})")
       
     logging.info(f"📥 DATA EXTRACTION COMPLETED")
-    
\ No newline at end of file
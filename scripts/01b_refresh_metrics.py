@@ -0,0 +1,89 @@
+import datetime as dt
+from dotenv import load_dotenv
+import os
+import logging
+import sys
+import time
+
+# ------------------------------------------------------------------------------------------
+script_path = os.path.dirname(os.path.abspath(__file__))
+project_path = os.path.join(script_path, '..')
+sys.path.insert(0, project_path)
+# ------------------------------------------------------------------------------------------
+
+from config.config_01 import (
+    REQUESTS_PER_MINUTE, N_WORKERS, MAX_RETRIES, BACKOFF_BASE_SECONDS,
+    WRITE_BATCH_SIZE
+)
+from src.data_extraction_uitls import (
+    TokenBucket, ParquetPartWriter, SeenIdIndex, POST_METRICS_SCHEMA, COMMENT_METRICS_SCHEMA,
+    authenticate_praw, run_metrics_refresh
+)
+
+# --- 0. CONFIGURATION & SETUP ---
+
+# Dynamic snapshot id based on the current datetime (YYYYMMDDHHMMSS)
+metrics_snapshot_id = dt.datetime.now().strftime('%Y%m%d%H%M%S') 
+
+# Define logging directories and file path
+logs_dir = os.path.join(project_path, 'logs')
+logs_file_name = f'metrics_refresh_{metrics_snapshot_id}.log'
+os.makedirs(logs_dir, exist_ok=True) 
+logs_file_path = os.path.join(logs_dir, logs_file_name)
+
+# Configure logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(logs_file_path, mode='w', encoding='utf-8'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logging.info(f"Logging configured. Output file: {logs_file_path}")
+
+# Load environment variables
+load_dotenv(os.path.join(project_path, '.env'))
+
+CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
+CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
+USER_AGENT = "ResearchScript v1.0 by /u/Hour_Sell5070" 
+
+# --- MAIN EXECUTION BLOCK ---
+
+if __name__ == "__main__":
+    
+    # 1. Authenticate and exit if failed 
+    token_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+    reddit = authenticate_praw(CLIENT_ID, CLIENT_SECRET, USER_AGENT, token_bucket,
+                               max_retries=MAX_RETRIES, backoff_base_seconds=BACKOFF_BASE_SECONDS)
+    if not reddit:
+        logging.error("❌ Authentication failed. Exiting script.")
+        sys.exit(1)
+
+    # 2. Collect the IDs of every post/comment already stored in data/raw_data
+    raw_data_dir = os.path.join(project_path, 'data', 'raw_data')
+    seen_id_index = SeenIdIndex(os.path.join(project_path, 'data', 'seen_id_index.sqlite'))
+    seen_id_index.sync_from_raw_data(raw_data_dir)
+    post_ids = seen_id_index.load_post_ids()
+    comment_ids = seen_id_index.load_comment_ids()
+    seen_id_index.close()
+
+    # 3. Refresh metrics in batches of 100 fullnames per API call.
+    # Snapshots are kept out of data/raw_data: they must not feed the change detection of 01_extract_raw_data.py,
+    # whose comment refetch decision relies on comment counts of posts whose comments were actually extracted.
+    output_data_dir = os.path.join(project_path, 'data', 'metrics_snapshots')
+    post_metrics_writer = ParquetPartWriter(output_data_dir, f"post_metrics_{metrics_snapshot_id}", POST_METRICS_SCHEMA, WRITE_BATCH_SIZE)
+    comment_metrics_writer = ParquetPartWriter(output_data_dir, f"comment_metrics_{metrics_snapshot_id}", COMMENT_METRICS_SCHEMA, WRITE_BATCH_SIZE)
+
+    logging.info("Starting metrics refresh...")
+    start_time = time.time()
+    try:
+        run_metrics_refresh(reddit, post_ids, comment_ids, post_metrics_writer, comment_metrics_writer, n_workers=N_WORKERS)
+    finally:
+        post_metrics_writer.close()
+        comment_metrics_writer.close()
+    end_time = time.time()
+
+    logging.info(f"📁 Metrics snapshot {metrics_snapshot_id} saved to {output_data_dir} (Posts: {len(post_metrics_writer)} | Comments: {len(comment_metrics_writer)})")
+    logging.info(f"✅ Metrics refresh completed in {round((end_time - start_time)/60, 2)} minutes.")
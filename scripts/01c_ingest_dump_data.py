@@ -0,0 +1,65 @@
+import datetime as dt
+import os
+import logging
+import sys
+import time
+
+# ------------------------------------------------------------------------------------------
+script_path = os.path.dirname(os.path.abspath(__file__))
+project_path = os.path.join(script_path, '..')
+sys.path.insert(0, project_path)
+# ------------------------------------------------------------------------------------------
+
+from config.config_01 import (
+    LIST_SUBREDDITS, LIST_QUERIES,
+    WRITE_BATCH_SIZE, DUMP_DIR, DUMP_N_PROCESSES
+)
+from src.dump_ingestion_utils import run_dump_ingestion
+
+# --- 0. CONFIGURATION & SETUP ---
+
+# Same id format as 01_extract_raw_data.py, so dump ingestions are just another extraction for stage 02
+data_extraction_id = dt.datetime.now().strftime('%Y%m%d%H%M%S') 
+
+# Define logging directories and file path
+logs_dir = os.path.join(project_path, 'logs')
+logs_file_name = f'dump_ingestion_{data_extraction_id}.log'
+os.makedirs(logs_dir, exist_ok=True) 
+logs_file_path = os.path.join(logs_dir, logs_file_name)
+
+# Configure logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(logs_file_path, mode='w', encoding='utf-8'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logging.info(f"Logging configured. Output file: {logs_file_path}")
+
+# --- MAIN EXECUTION BLOCK ---
+
+if __name__ == "__main__":
+
+    dump_dir = os.path.join(project_path, DUMP_DIR)
+    if not os.path.isdir(dump_dir):
+        logging.error(f"❌ Dump directory not found: {dump_dir}. Exiting script.")
+        sys.exit(1)
+
+    output_data_dir = os.path.join(project_path, 'data', 'raw_data')
+
+    logging.info("Starting dump ingestion...")
+    start_time = time.time()
+    run_dump_ingestion(
+        dump_dir,
+        output_data_dir,
+        data_extraction_id,
+        LIST_SUBREDDITS,
+        LIST_QUERIES,
+        n_processes=DUMP_N_PROCESSES,
+        batch_size=WRITE_BATCH_SIZE
+    )
+    end_time = time.time()
+    logging.info(f"✅ Dump ingestion completed in {round((end_time - start_time)/60, 2)} minutes.")
+    logging.info(f"📥 DATA EXTRACTION COMPLETED")
@@ -0,0 +1,85 @@
+import datetime as dt
+from dotenv import load_dotenv
+import os
+import logging
+import sys
+import time
+
+# ------------------------------------------------------------------------------------------
+script_path = os.path.dirname(os.path.abspath(__file__))
+project_path = os.path.join(script_path, '..')
+sys.path.insert(0, project_path)
+# ------------------------------------------------------------------------------------------
+
+from config.config_01 import (
+    REQUESTS_PER_MINUTE, N_WORKERS, MAX_RETRIES, BACKOFF_BASE_SECONDS,
+    AUTHOR_CACHE_TTL_DAYS
+)
+from src.data_extraction_uitls import TokenBucket, authenticate_praw
+from src.author_enrichment_utils import AuthorCache, collect_author_ids, run_author_enrichment
+
+# --- 0. CONFIGURATION & SETUP ---
+
+# Dynamic run id based on the current datetime (YYYYMMDDHHMMSS)
+author_enrichment_id = dt.datetime.now().strftime('%Y%m%d%H%M%S')
+
+# Define logging directories and file path
+logs_dir = os.path.join(project_path, 'logs')
+logs_file_name = f'author_enrichment_{author_enrichment_id}.log'
+os.makedirs(logs_dir, exist_ok=True)
+logs_file_path = os.path.join(logs_dir, logs_file_name)
+
+# Configure logging settings
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(logs_file_path, mode='w', encoding='utf-8'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logging.info(f"Logging configured. Output file: {logs_file_path}")
+
+# Load environment variables
+load_dotenv(os.path.join(project_path, '.env'))
+
+CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
+CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
+USER_AGENT = "ResearchScript v1.0 by /u/Hour_Sell5070"
+
+# --- MAIN EXECUTION BLOCK ---
+
+if __name__ == "__main__":
+
+    # 1. Authenticate and exit if failed
+    token_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+    reddit = authenticate_praw(CLIENT_ID, CLIENT_SECRET, USER_AGENT, token_bucket,
+                               max_retries=MAX_RETRIES, backoff_base_seconds=BACKOFF_BASE_SECONDS)
+    if not reddit:
+        logging.error("❌ Authentication failed. Exiting script.")
+        sys.exit(1)
+
+    # 2. Collect the unique authors of every post/comment stored in data/raw_data
+    raw_data_dir = os.path.join(project_path, 'data', 'raw_data')
+    author_ids = collect_author_ids(raw_data_dir)
+
+    # 3. Resolve authors missing from the cache (or older than the TTL) in batches of 100 per API call
+    author_cache = AuthorCache(os.path.join(project_path, 'data', 'author_cache.sqlite'))
+
+    logging.info("Starting author enrichment...")
+    start_time = time.time()
+    try:
+        run_author_enrichment(reddit, author_ids, author_cache, ttl_days=AUTHOR_CACHE_TTL_DAYS, n_workers=N_WORKERS)
+
+        # 4. Export the author table joined onto posts and comments by 02_process_raw_data.py
+        author_data_dir = os.path.join(project_path, 'data', 'author_data')
+        os.makedirs(author_data_dir, exist_ok=True)
+        author_data_path = os.path.join(author_data_dir, 'author_data.parquet')
+        author_data = author_cache.export(author_ids)
+        author_data.write_parquet(author_data_path)
+    finally:
+        author_cache.close()
+    end_time = time.time()
+
+    logging.info(f"📁 Author data saved to {author_data_path} (Authors: {len(author_data)})")
+    logging.info(f"✅ Author enrichment completed in {round((end_time - start_time)/60, 2)} minutes.")
@@ -1,5 +1,6 @@
 import os
-import polars as pl
+import sys
+import argparse
 import logging 
 import time
 
@@ -11,68 +12,43 @@ logging.info("⚙️ Starting data processing script.")
 # --- PATH SETUP ---
 script_path = os.path.dirname(os.path.abspath(__file__))
 project_path = os.path.join(script_path, '..')
+sys.path.insert(0, project_path)
 raw_data_dir = os.path.join(project_path, 'data', 'raw_data')
 processed_data_dir = os.path.join(project_path, 'data', 'processed_data')
+author_data_path = os.path.join(project_path, 'data', 'author_data', 'author_data.parquet') # Optional (01d script)
 os.makedirs(processed_data_dir, exist_ok=True) # Create output directory
 
-start_time = time.time()
-
-# --- DATA LOADING ---
-logging.info("Loading raw Parquet data files...")
-raw_data = {}
-for raw_data_name in os.listdir(raw_data_dir):
-   raw_data_path = os.path.join(raw_data_dir, raw_data_name)
-   raw_data[raw_data_name.split('.')[0]] = pl.read_parquet(raw_data_path)
-
-# Separate and vertically concatenate raw posts and comments
-post_raw_data_list = [raw_data[k] for k in raw_data.keys() if 'posts' in k]
-comments_raw_data_list = [raw_data[k] for k in raw_data.keys() if 'comments' in k]
-post_raw_data = pl.concat(post_raw_data_list, how='vertical')
-comments_raw_data = pl.concat(comments_raw_data_list, how='vertical')
-
-# TODO: delete duplicate rows from post_raw_data and comments_raw_data. 
-# Assuming that multiple data extraction will be performed winth 01 script (at different moments), 
-#those different extractions are very likely to share data (rows), therefore duplicated rows must be removed.
-
-# --- DATA PROCESSING AND CLEANING ---
-
-logging.info("Starting data processing...")
-# Unification: INNER JOIN comments with posts on 'post_id' to add context.
-processed_data = comments_raw_data.join(post_raw_data, on='post_id', how='inner')
-
-# Filter 1: Remove rows where comment_body is empty, [deleted], or [removed] (noise).
-processed_data = processed_data.filter(
-   ~pl.col('comment_body').is_in(["", "[deleted]", "[removed]"])
+from config.config_02 import (
+    INCREMENTAL_PROCESSING, DEDUP_N_BUCKETS, EXTRACTION_DATE_FROM, EXTRACTION_DATE_TO, SUBREDDITS_TO_PROCESS,
+    COMPUTE_TOKEN_COUNTS
 )
+from src.data_processing_utils import run_processing
 
-# Filter 2: Remove rows where both post title and body are noise (robustness check).
-processed_data = processed_data.filter(
-   ~ (
-   (pl.col('post_title').is_in(["", "[deleted]", "[removed]"])) &
-   (pl.col('post_body').is_in(["", "[deleted]", "[removed]"]))
-   )
-) 
-
-# --- FEATURE GENERATION ---
+parser = argparse.ArgumentParser(description="Processes RAW posts and comments into the processed dataset.")
+parser.add_argument('--full', action='store_true',
+                    help="Rebuild the processed dataset from scratch instead of processing only new RAW files.")
+args = parser.parse_args()
 
-# Create unified text variable ('text_content') for LLM input.
-# Ensure post fields handle nulls/empties safely with .fill_null("").
-processed_data = processed_data.with_columns((
-    'Post Title:' + '\n\n' + 
-    pl.col('post_title').fill_null("") + '\n\n' + 
-    'Post Body:' + '\n\n' +
-    pl.col('post_body').fill_null("") + '\n\n' + 
-    'Comment Body:' + '\n\n' + 
-    pl.col('comment_body')
- ).alias('text_content')
-)
-
-# --- SAVE OUTPUT ---
+start_time = time.time()
 
-# Save the processed DataFrame to a single Parquet file.
-processed_data_path = os.path.join(processed_data_dir, '02_processed_data.parquet')
-processed_data.write_parquet(processed_data_path)
+# --- DEDUPLICATION, PROCESSING AND SAVING ---
+# RAW files are pruned by partition (config_02) and deduplicated (latest extraction wins) into hash buckets;
+# per bucket, the filters and author joins run as lazy queries, streamed straight into a partition of the
+# normalized posts and comments tables (data/processed_data/02_processed_data/). Post texts are stored once per
+# post: 'text_content' is assembled downstream, only for the records sent to the LLM.
+# In incremental mode only new RAW files are merged and only the buckets they touch are rebuilt.
+logging.info("Scanning raw Parquet data files...")
+if os.path.exists(os.path.join(processed_data_dir, '02_processed_data.parquet')):
+   logging.warning("⚠️ Legacy 02_processed_data.parquet found: it is no longer read (the dataset is now the 02_processed_data/ directory).")
+if not run_processing(raw_data_dir, processed_data_dir, author_data_path,
+                      incremental=INCREMENTAL_PROCESSING and not args.full,
+                      n_buckets=DEDUP_N_BUCKETS,
+                      extraction_date_from=EXTRACTION_DATE_FROM,
+                      extraction_date_to=EXTRACTION_DATE_TO,
+                      subreddits=SUBREDDITS_TO_PROCESS,
+                      token_counts=COMPUTE_TOKEN_COUNTS):
+   sys.exit(1)
 
 end_time = time.time()
 elapsed_time = round((end_time - start_time) / 60, 2)
-logging.info(f"Process completed in {elapsed_time} minutes. Final data saved to {processed_data_path}")
+logging.info(f"Process completed in {elapsed_time} minutes. Processed dataset: {os.path.join(processed_data_dir, '02_processed_data')}")
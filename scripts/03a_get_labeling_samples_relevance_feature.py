@@ -22,13 +22,14 @@ from config.config_03abc import (
 )
 
 from src.feature_engineering_utils import run_labeling_samples
+from src.data_processing_utils import scan_processed_table
 
 
 # --- LOGGING SETUP ---
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
-# Input: Base processed data (from Step 02)
-base_data_path = os.path.join(project_path, 'data', 'processed_data', '02_processed_data.parquet')
+# Input: Base processed data (from Step 02: posts and comments tables)
+processed_data_dir = os.path.join(project_path, 'data', 'processed_data')
 
 # Output: New dedicated folder for manual labeling inputs
 labeling_dir = os.path.join(project_path, 'data', 'labeled_samples')
@@ -44,7 +45,9 @@ def main():
         exit()
 
     try:
-        df = pl.read_parquet(base_data_path)
+        # Comments are sampled alone; the post texts are only joined onto the sampled records
+        df = scan_processed_table(processed_data_dir, 'comments').collect()
+        posts = scan_processed_table(processed_data_dir, 'posts')
         logging.info(f"📂 Base dataset loaded: {len(df)} records.")
     except Exception as e:
         logging.error(f"❌ Error loading data: {e}")
@@ -53,7 +56,7 @@ def main():
     run_labeling_samples(df, DATA_COLUMNS_TO_INCLUDE, FEATURES_TO_LABEL, 
                          SAMPLE_N, SAMPLE_SEED, VAL_SAMPLE_RATIO, 
                          MANUAL_TRAIN_IDS, MANUAL_VAL_IDS,
-                         train_sample_path, val_sample_path)
+                         train_sample_path, val_sample_path, posts=posts)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
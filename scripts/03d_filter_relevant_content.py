@@ -10,8 +10,6 @@ project_path = os.path.join(script_path, '..')
 
 features_dir = os.path.join(project_path, 'data', 'features')
 processed_data_dir = os.path.join(project_path, 'data', 'processed_data')
-feature_file_path = os.path.join(features_dir, 'content_relevance_score.parquet')
-base_data_path = os.path.join(processed_data_dir, '02_processed_data.parquet')
 processed_data_path = os.path.join(processed_data_dir, '03d_processed_data.parquet')
 
 sys.path.append(project_path)
@@ -19,9 +17,12 @@ sys.path.append(project_path)
 from config.config_03b import (
     RELEVANCE_CUTOFF
 )
+from src.data_processing_utils import scan_processed_table
+from src.feature_store_utils import scan_feature_results
 
-df_base = pl.read_parquet(base_data_path)
-feature_df = pl.read_parquet(feature_file_path)
+# Comments table only: post texts stay in the 02 posts table and are joined back on demand (04a/04c)
+df_base = scan_processed_table(processed_data_dir, 'comments').collect()
+feature_df = scan_feature_results(features_dir, 'content_relevance_score', 'ordinal').collect()
 processed_df = df_base.join(feature_df, how='left', on='comment_id')
 processed_df = processed_df.filter(pl.col('content_relevance_score') >= RELEVANCE_CUTOFF)
 processed_df.write_parquet(processed_data_path)
\ No newline at end of file
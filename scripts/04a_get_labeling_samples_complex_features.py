@@ -22,13 +22,15 @@ from config.config_04abc import (
 )
 
 from src.feature_engineering_utils import run_labeling_samples
+from src.data_processing_utils import scan_processed_table
 
 
 # --- LOGGING SETUP ---
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
-# Input: Base processed data (from Step 03d)
-base_data_path = os.path.join(project_path, 'data', 'processed_data', '03d_processed_data.parquet')
+# Input: Relevant comments (from Step 03d) and their posts (from Step 02)
+processed_data_dir = os.path.join(project_path, 'data', 'processed_data')
+base_data_path = os.path.join(processed_data_dir, '03d_processed_data.parquet')
 
 # Output: New dedicated folder for manual labeling inputs
 labeling_dir = os.path.join(project_path, 'data', 'labeled_samples')
@@ -45,6 +47,7 @@ def main():
 
     try:
         df = pl.read_parquet(base_data_path)
+        posts = scan_processed_table(processed_data_dir, 'posts')
         logging.info(f"📂 Base dataset loaded: {len(df)} records.")
     except Exception as e:
         logging.error(f"❌ Error loading data: {e}")
@@ -53,7 +56,7 @@ def main():
     run_labeling_samples(df, DATA_COLUMNS_TO_INCLUDE, FEATURES_TO_LABEL, 
                          SAMPLE_N, SAMPLE_SEED, VAL_SAMPLE_RATIO, 
                          MANUAL_TRAIN_IDS, MANUAL_VAL_IDS,
-                         train_sample_path, val_sample_path)
+                         train_sample_path, val_sample_path, posts=posts)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
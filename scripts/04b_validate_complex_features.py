@@ -8,11 +8,12 @@ project_path = os.path.join(script_path, '..')
 sys.path.insert(0, project_path)
 
 # --- CONFIGURATION ---
-from feature_config.config_03b_04b import (
+from config.config_03bc_04bc import (
     FEATURE_CONFIG
 )
-from feature_config.config_04b import (
-    FEATURES_TO_VALIDATE
+from config.config_04abc import (
+    FEATURES_TO_VALIDATE,
+    COMBINED_FEATURES_MODE
 )
 
 # Directories
@@ -25,7 +26,8 @@ os.makedirs(reports_dir, exist_ok=True)
 # Import LLM function (Ensure utils is updated)
 from src.feature_engineering_utils import (ValidationLogger, 
                                            load_labeled_sample,
-                                           run_validation_for_feature 
+                                           run_validation_for_feature,
+                                           run_combined_validation_for_features
                                            )
 
 load_dotenv()
@@ -36,7 +38,7 @@ load_dotenv()
 def main():
 
     # Initialize Logger
-    logger = ValidationLogger()
+    logger = ValidationLogger(reports_dir, 'complex_features')
 
     logger.log("🚀 STARTING MULTI-FEATURE VALIDATION")
     
@@ -44,7 +46,7 @@ def main():
     try:
         client = OpenAI()
     except Exception:
-        logger.error("❌ OpenAI Client failed.")
+        logger.log("❌ OpenAI Client failed.")
         exit()
     
     # Load Data
@@ -57,6 +59,10 @@ def main():
 
         run_validation_for_feature(feature_name, feature_config, df_train, df_val, client, logger)
 
+    # Same features from one call per record, to check that accuracy holds up in combined mode
+    if COMBINED_FEATURES_MODE:
+        run_combined_validation_for_features(FEATURES_TO_VALIDATE, FEATURE_CONFIG, df_train, df_val, client, logger)
+
     # Save final logger
     logger.save()
 
@@ -18,18 +18,40 @@ from config.config_03c_04c import (
     PILOT_SIZE, 
     PILOT_SEED,
     # Save progress every N records 
-    BATCH_SAVE_SIZE
+    BATCH_SAVE_SIZE,
+    COMPACT_EVERY_N_PARTS,
+    # LLM calls in flight and retries per call
+    MAX_CONCURRENT_REQUESTS,
+    LLM_MAX_RETRIES,
+    # Compact post context shared by all the comments of a post
+    POST_CONTEXT_MODE,
+    POST_CONTEXT_MAX_CHARS,
+    # Token budget and run estimates
+    TRUNCATION_POLICIES,
+    OUTPUT_TOKENS_PER_RECORD,
+    OUTLIER_PROMPT_TOKENS,
+    # Asynchronous batch submission instead of live calls
+    BATCH_MODE,
+    BATCH_MAX_REQUESTS_PER_JOB,
+    BATCH_POLL_SECONDS,
+    BATCH_TIMEOUT_SECONDS,
+    # Comments of the same post classified together
+    THREAD_BATCHING_MODE,
+    THREAD_MAX_COMMENT_TOKENS,
+    THREAD_MAX_COMMENTS_PER_REQUEST
 )
 from config.config_04abc import (
-    FEATURES_TO_GENERATE
+    FEATURES_TO_GENERATE,
+    COMBINED_FEATURES_MODE
 )
 from config.config_03bc_04bc import (
     FEATURE_CONFIG
 )
 
 
-# 1. Input Data (Full processed dataset)
-processed_data_path = os.path.join(project_path, 'data', 'processed_data', '03d_processed_data.parquet')
+# 1. Input Data (Relevant comments from 03d, and their posts from 02)
+processed_data_dir = os.path.join(project_path, 'data', 'processed_data')
+processed_data_path = os.path.join(processed_data_dir, '03d_processed_data.parquet')
 
 # 2. Training Data (Expert samples for Few-Shot Learning)
 train_sample_path = os.path.join(project_path, 'data', 'labeled_samples', '04a_train_sample_relevance.json')
@@ -39,7 +61,11 @@ features_dir = os.path.join(project_path, 'data', 'features')
 os.makedirs(features_dir, exist_ok=True)
 
 # Import Utils
-from src.feature_engineering_utils import load_labeled_sample, run_generation_for_feature
+from src.feature_engineering_utils import (LLM_MODEL, load_labeled_sample, run_generation_for_feature, run_batch_generation_for_feature,
+                                           run_combined_generation_for_features, run_thread_generation_for_feature)
+from src.data_processing_utils import scan_processed_table
+from src.post_context_utils import PostContextCache, build_post_contexts
+from src.token_utils import apply_truncation_policies
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
@@ -51,28 +77,76 @@ load_dotenv()
 def main():
 
     try:
+        # Post texts are held once per post; 'text_content' is assembled per batch sent to the LLM
         df = pl.read_parquet(processed_data_path)
+        posts = scan_processed_table(processed_data_dir, 'posts').select('post_id', 'post_title', 'post_body', pl.col('^post_(title|body)_n_tokens$')).collect()
         logging.info(f"📂 Base dataset loaded: {len(df)} records.")
     except Exception as e:
         logging.error(f"❌ Failed to load base data: {e}")
         exit()
 
     try:
-        client = OpenAI()
+        client = OpenAI(max_retries=LLM_MAX_RETRIES)
     except Exception as e:
         logging.error(f"❌ OpenAI Client Error: {e}")
         exit()
 
-    df_train = load_labeled_sample(train_sample_path)
-     
-    for feature_name in FEATURES_TO_GENERATE:
+    # One compact context per post, reused for every comment of the post
+    post_context_cache = None
+    if POST_CONTEXT_MODE == 'summary':
+        post_context_cache = PostContextCache(os.path.join(project_path, 'data', 'post_context_cache.sqlite'))
+
+    def prepare_records(df_to_process, posts):
+        # Only the posts of the records about to be sent (after resume and pilot selection) get a context
+        posts = posts.filter(pl.col('post_id').is_in(df_to_process['post_id'].unique().implode()))
+        posts = build_post_contexts(posts, POST_CONTEXT_MODE, POST_CONTEXT_MAX_CHARS, client=client, cache=post_context_cache,
+                                    max_concurrent_requests=MAX_CONCURRENT_REQUESTS, model=LLM_MODEL)
+        # Per-field token budgets, so a single giant post/comment cannot blow up latency and cost
+        return apply_truncation_policies(df_to_process, TRUNCATION_POLICIES), apply_truncation_policies(posts, TRUNCATION_POLICIES)
 
-        feature_file_path = os.path.join(features_dir, f'{feature_name}.parquet')
+    df_train = load_labeled_sample(train_sample_path)
 
-        feature_config = FEATURE_CONFIG.get(feature_name)
+    try:
+        if COMBINED_FEATURES_MODE:
+            # One call per comment for all the features, fanned out to the per-feature outputs
+            if BATCH_MODE or THREAD_BATCHING_MODE:
+                logging.warning("⚠️ Batch mode and thread-grouped requests are not available in combined mode: running one live call per comment.")
+            run_combined_generation_for_features(FEATURES_TO_GENERATE, features_dir, FEATURE_CONFIG, df, df_train,
+                                                 BATCH_SAVE_SIZE, PILOT_MODE, PILOT_SIZE, PILOT_SEED, client, logging, posts=posts,
+                                                 output_tokens_per_record=OUTPUT_TOKENS_PER_RECORD, outlier_prompt_tokens=OUTLIER_PROMPT_TOKENS,
+                                                 max_concurrent_requests=MAX_CONCURRENT_REQUESTS, compact_every=COMPACT_EVERY_N_PARTS,
+                                                 prepare_records=prepare_records)
+            return
+     
+        for feature_name in FEATURES_TO_GENERATE:
+
+            feature_config = FEATURE_CONFIG.get(feature_name)
+
+            if BATCH_MODE:
+                run_batch_generation_for_feature(feature_name, features_dir, feature_config, df, df_train, PILOT_MODE, PILOT_SIZE, PILOT_SEED, client, logging, posts=posts,
+                                                 output_tokens_per_record=OUTPUT_TOKENS_PER_RECORD, outlier_prompt_tokens=OUTLIER_PROMPT_TOKENS,
+                                                 max_requests_per_batch=BATCH_MAX_REQUESTS_PER_JOB, poll_seconds=BATCH_POLL_SECONDS,
+                                                 timeout_seconds=BATCH_TIMEOUT_SECONDS, compact_every=COMPACT_EVERY_N_PARTS,
+                                                 prepare_records=prepare_records)
+                continue
+
+            if THREAD_BATCHING_MODE:
+                run_thread_generation_for_feature(feature_name, features_dir, feature_config, df, df_train, BATCH_SAVE_SIZE, PILOT_MODE, PILOT_SIZE, PILOT_SEED, client, logging, posts,
+                                                  output_tokens_per_record=OUTPUT_TOKENS_PER_RECORD, outlier_prompt_tokens=OUTLIER_PROMPT_TOKENS,
+                                                  max_concurrent_requests=MAX_CONCURRENT_REQUESTS, compact_every=COMPACT_EVERY_N_PARTS,
+                                                  max_comment_tokens=THREAD_MAX_COMMENT_TOKENS, max_comments_per_request=THREAD_MAX_COMMENTS_PER_REQUEST,
+                                                  prepare_records=prepare_records)
+                continue
+
+            run_generation_for_feature(feature_name, features_dir, feature_config, df, df_train, 
+                                       BATCH_SAVE_SIZE, PILOT_MODE, PILOT_SIZE, PILOT_SEED, client, logging, posts=posts,
+                                       output_tokens_per_record=OUTPUT_TOKENS_PER_RECORD, outlier_prompt_tokens=OUTLIER_PROMPT_TOKENS,
+                                       max_concurrent_requests=MAX_CONCURRENT_REQUESTS, compact_every=COMPACT_EVERY_N_PARTS,
+                                       prepare_records=prepare_records)
+    finally:
+        if post_context_cache is not None:
+            post_context_cache.close()
 
-        run_generation_for_feature(feature_name, feature_file_path, feature_config, df, df_train, 
-                                   BATCH_SAVE_SIZE, PILOT_MODE, PILOT_SIZE, PILOT_SEED, client, logging)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import os, sys
+import json
+import time
+import logging
+import polars as pl
+
+# --- PATH CONFIGURATION ---
+script_path = os.path.dirname(os.path.abspath(__file__))
+project_path = os.path.join(script_path, '..')
+sys.path.append(project_path)
+
+from config.config_05 import (
+    STANCE_FEATURE,
+    STANCE_GROUPS,
+    STANCE_GROUP_NAMES,
+    MIN_THREAD_STANCE_EDGES
+)
+from src.graph_utils import (
+    build_reply_edges, build_comment_adjacency, build_author_adjacency, author_stance_groups,
+    author_exposure_metrics, thread_echo_chamber_metrics, compute_global_metrics
+)
+from src.data_processing_utils import scan_processed_data
+from src.feature_store_utils import scan_feature_results
+
+processed_data_dir = os.path.join(project_path, 'data', 'processed_data')
+features_dir = os.path.join(project_path, 'data', 'features')
+graph_metrics_dir = os.path.join(project_path, 'data', 'graph_metrics')
+os.makedirs(graph_metrics_dir, exist_ok=True)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+
+
+# --- MAIN EXECUTION ---
+
+def main():
+
+    start_time = time.time()
+    n_groups = len(STANCE_GROUP_NAMES)
+
+    # 1. Comments (every processed comment is a graph node, scored or not) + stance feature
+    graph_columns = ['comment_id', 'post_id', 'comment_parent_id', 'comment_author_id', 'post_author_id']
+    try:
+        comments = scan_processed_data(processed_data_dir).select(graph_columns).collect()
+        logging.info(f"📂 Comments loaded: {len(comments)} records.")
+    except Exception as e:
+        logging.error(f"❌ Failed to load processed data (re-run 01 and 02 to capture reply structure): {e}")
+        exit()
+
+    try:
+        # One row per comment_id, values parsed (also from legacy raw-JSON files)
+        stance = scan_feature_results(features_dir, STANCE_FEATURE, 'ordinal')
+        stance = stance.select('comment_id', pl.col(STANCE_FEATURE).cast(pl.Float64).alias('stance')).collect()
+        comments = comments.join(stance, on='comment_id', how='left')
+        logging.info(f"Stance ({STANCE_FEATURE}) available for {comments['stance'].is_not_null().sum()} comments.")
+    except FileNotFoundError as e:
+        logging.warning(f"⚠️ {e} Only structural metrics will be computed.")
+        comments = comments.with_columns(pl.lit(None, dtype=pl.Float64).alias('stance'))
+
+    # 2. Reply edges and sparse adjacency matrices
+    edges = build_reply_edges(comments, STANCE_GROUPS)
+    comment_adjacency, _ = build_comment_adjacency(edges)
+    author_adjacency, author_ids = build_author_adjacency(edges)
+    logging.info(f"Reply graph: {len(edges)} edges | {comment_adjacency.shape[0]} comment nodes ({comment_adjacency.nnz} comment-to-comment edges) | "
+                 f"{author_adjacency.shape[0]} author nodes ({author_adjacency.nnz} author pairs).")
+
+    # 3. Metrics
+    author_groups = author_stance_groups(comments, author_ids, STANCE_GROUPS)
+    author_metrics, author_mixing = author_exposure_metrics(author_adjacency, author_ids, author_groups, n_groups)
+    thread_metrics = thread_echo_chamber_metrics(comments, edges, STANCE_GROUPS, n_groups)
+    thread_metrics = thread_metrics.filter(pl.col('n_stance_edges') >= MIN_THREAD_STANCE_EDGES)
+    global_metrics = compute_global_metrics(edges, author_mixing, n_groups)
+    global_metrics['stance_groups'] = STANCE_GROUP_NAMES
+
+    for name, value in global_metrics.items():
+        if not isinstance(value, list):
+            logging.info(f"   {name}: {value}")
+
+    # 4. Save outputs
+    edges.write_parquet(os.path.join(graph_metrics_dir, '05_reply_edges.parquet'))
+    author_metrics.with_columns(
+        pl.col('stance_group').replace_strict(dict(enumerate(STANCE_GROUP_NAMES)), default=None, return_dtype=pl.Utf8)
+    ).write_parquet(os.path.join(graph_metrics_dir, '05_author_metrics.parquet'))
+    thread_metrics.write_parquet(os.path.join(graph_metrics_dir, '05_thread_metrics.parquet'))
+    with open(os.path.join(graph_metrics_dir, '05_global_metrics.json'), 'w', encoding='utf-8') as f:
+        json.dump(global_metrics, f, indent=2)
+
+    elapsed_time = round((time.time() - start_time) / 60, 2)
+    logging.info(f"✅ Reply graph metrics computed in {elapsed_time} minutes. Saved to {graph_metrics_dir}")
+
+if __name__ == "__main__":
+    main()
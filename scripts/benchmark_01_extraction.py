@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+import datetime as dt
+import polars as pl
+
+# ------------------------------------------------------------------------------------------
+script_path = os.path.dirname(os.path.abspath(__file__))
+project_path = os.path.join(script_path, '..')
+sys.path.insert(0, project_path)
+# ------------------------------------------------------------------------------------------
+
+# No network access at all: skip PRAW's update check
+os.environ.setdefault('praw_check_for_updates', 'False')
+
+from src.data_extraction_uitls import (
+    TokenBucket, ParquetPartWriter, POST_SCHEMA, COMMENT_SCHEMA,
+    authenticate_praw, run_extraction
+)
+from src.fake_backend_utils import FakeRedditSession
+
+# --- BENCHMARK CONFIGURATION ---
+# Offline benchmark of run_extraction against FakeRedditSession (no credentials needed).
+# Extraction configurations of increasing size; each one runs sequentially and with a worker pool.
+
+LATENCY_SECONDS = 0.05      # Simulated network latency per request
+LATENCY_JITTER = 0.02
+ERROR_RATE = 0.0            # Probability of an injected transient 500/503 per request
+REQUESTS_PER_MINUTE = 60_000 # Token bucket: high enough that latency, not the quota, dominates
+
+BENCHMARK_CONFIGS = [
+    # name, n_subreddits, n_queries, n_sorts, posts_per_search, comments_per_post
+    ('xs', 1, 1, 1, 10, 10),
+    ('s',  2, 2, 1, 25, 20),
+    ('m',  3, 2, 2, 50, 40),
+    ('l',  4, 3, 2, 100, 40),
+]
+N_WORKERS_LIST = [1, 8]
+
+# --- LOGGING SETUP ---
+logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+
+
+def run_benchmark(name, n_subreddits, n_queries, n_sorts, posts_per_search, comments_per_post, n_workers,
+                  latency_seconds=LATENCY_SECONDS, latency_jitter=LATENCY_JITTER):
+    """Runs one extraction against a fresh fake backend and returns its throughput metrics."""
+    session = FakeRedditSession(
+        posts_per_search=posts_per_search,
+        comments_per_post=comments_per_post,
+        latency_seconds=latency_seconds,
+        latency_jitter=latency_jitter,
+        error_rate=ERROR_RATE,
+    )
+    reddit = authenticate_praw('fake-id', 'fake-secret', 'ExtractionBenchmark', TokenBucket(REQUESTS_PER_MINUTE), session)
+
+    subreddits = [f"subreddit{i}" for i in range(n_subreddits)]
+    queries = [f"(gaza OR palestine*) AND topic{i}" for i in range(n_queries)]
+    sorts = ['relevance', 'top', 'new', 'comments'][:n_sorts]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        comment_writer = ParquetPartWriter(output_dir, 'comments_data_raw_benchmark', COMMENT_SCHEMA)
+        post_writer = ParquetPartWriter(output_dir, 'posts_data_raw_benchmark', POST_SCHEMA, depends_on=comment_writer)
+        n_requests_before = session.n_requests # Authentication
+
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        run_extraction(reddit, subreddits, queries, sorts, posts_per_search, 'year',
+                       n_workers=n_workers,
+                       post_writer=post_writer, comment_writer=comment_writer)
+        post_writer.close()
+        comment_writer.close()
+        elapsed_seconds = time.perf_counter() - start_time
+        cpu_seconds = time.process_time() - start_cpu_time
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    n_records = len(post_writer) + len(comment_writer)
+    n_api_calls = session.n_requests - n_requests_before
+    return {
+        'config': name,
+        'n_workers': n_workers,
+        'n_combinations': n_subreddits * n_queries * n_sorts,
+        'n_posts': len(post_writer),
+        'n_comments': len(comment_writer),
+        'n_api_calls': n_api_calls,
+        'n_api_errors': session.n_errors,
+        'elapsed_seconds': round(elapsed_seconds, 2),
+        'records_per_second': round(n_records / elapsed_seconds, 1) if elapsed_seconds else None,
+        'api_calls_per_record': round(n_api_calls / n_records, 4) if n_records else None,
+        # CPU time of the whole process (fake backend included) per record
+        'cpu_us_per_record': round(cpu_seconds / n_records * 1e6, 1) if n_records else None,
+        'peak_memory_mb': round(peak_memory / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the extraction against a fake Reddit backend.")
+    parser.add_argument('--no-latency', action='store_true',
+                        help="Answer requests instantly, so the run is CPU-bound (measures per-record processing overhead).")
+    args = parser.parse_args()
+    latency_seconds, latency_jitter = (0.0, 0.0) if args.no_latency else (LATENCY_SECONDS, LATENCY_JITTER)
+
+    results = []
+    for config in BENCHMARK_CONFIGS:
+        for n_workers in N_WORKERS_LIST:
+            result = run_benchmark(*config, n_workers, latency_seconds, latency_jitter)
+            print(f"⏱️ {result['config']:>3} | workers={n_workers} | {result['records_per_second']} records/s | "
+                  f"{result['api_calls_per_record']} calls/record | {result['cpu_us_per_record']} µs CPU/record | "
+                  f"peak {result['peak_memory_mb']} MB")
+            results.append(result)
+
+    df_results = pl.DataFrame(results)
+    with pl.Config(tbl_cols=-1, tbl_width_chars=200):
+        print(df_results)
+
+    benchmarks_dir = os.path.join(project_path, 'data', 'benchmarks')
+    os.makedirs(benchmarks_dir, exist_ok=True)
+    results_path = os.path.join(benchmarks_dir, f"extraction_benchmark_{dt.datetime.now().strftime('%Y%m%d%H%M%S')}.csv")
+    df_results.write_csv(results_path)
+    print(f"📁 Benchmark results saved to {results_path}")
+
+if __name__ == "__main__":
+    main()
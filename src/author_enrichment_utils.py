@@ -0,0 +1,179 @@
+# author_enrichment_utils.py
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+import polars as pl
+from concurrent.futures import ThreadPoolExecutor
+
+from src.data_extraction_uitls import list_raw_files
+
+# --- AUTHOR DATA SCHEMA ---
+
+# One row per author, joined onto posts (post_author_id) and comments (comment_author_id) in stage 02.
+AUTHOR_SCHEMA = {
+    'author_id': pl.Utf8,
+    'author_name': pl.Utf8,
+    'author_post_karma': pl.Int64,
+    'author_comment_karma': pl.Int64,
+    'author_created_utc': pl.Float64,
+    'account_age_days': pl.Int64,
+    'author_status': pl.Utf8,
+}
+
+# --- AUTHOR ID COLLECTION ---
+
+def collect_author_ids(raw_data_dir):
+    """
+    Returns the set of unique author fullnames (t2_*) found in the RAW posts/comments Parquet files (any layout).
+    Only the author ID columns are read; files written before authors were captured are skipped.
+    """
+    author_ids = set()
+    for file_path in list_raw_files(raw_data_dir):
+        file_name = os.path.basename(file_path)
+        if file_name.startswith('posts'):
+            column = 'post_author_id'
+        elif file_name.startswith('comments'):
+            column = 'comment_author_id'
+        else:
+            continue
+        lf = pl.scan_parquet(file_path)
+        if column not in lf.collect_schema().names():
+            continue
+        ids = lf.select(pl.col(column).drop_nulls().unique()).collect()[column]
+        author_ids.update(ids.to_list())
+    return author_ids
+
+# --- PERSISTENT AUTHOR CACHE ---
+
+class AuthorCache:
+    """
+    On-disk (SQLite) cache of resolved author data, keyed by author fullname.
+    Every row keeps the time it was fetched, so an author is looked up again only once its row is older
+    than the refresh window (TTL). Deleted/suspended authors are cached too, so they are not retried every run.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        # Shared by the lookup workers: writes are serialized with a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS authors (
+                author_id TEXT PRIMARY KEY,
+                author_name TEXT,
+                author_post_karma INTEGER,
+                author_comment_karma INTEGER,
+                author_created_utc REAL,
+                author_status TEXT,
+                fetched_at REAL
+            ) WITHOUT ROWID;
+        """)
+
+    def stale_ids(self, author_ids, ttl_days):
+        """Returns the IDs in `author_ids` that are not cached or whose cached row is older than `ttl_days`."""
+        min_fetched_at = time.time() - ttl_days * 86400
+        fresh = {row[0] for row in self.conn.execute("SELECT author_id FROM authors WHERE fetched_at >= ?", (min_fetched_at,))}
+        return set(author_ids) - fresh
+
+    def upsert(self, records):
+        """Inserts or replaces author rows (dicts with the `authors` table columns)."""
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO authors
+                    (author_id, author_name, author_post_karma, author_comment_karma, author_created_utc, author_status, fetched_at)
+                VALUES
+                    (:author_id, :author_name, :author_post_karma, :author_comment_karma, :author_created_utc, :author_status, :fetched_at)
+            """, records)
+
+    def export(self, author_ids=None):
+        """
+        Returns the cached authors (restricted to `author_ids` if given) as a DataFrame with AUTHOR_SCHEMA.
+        account_age_days is computed at export time, so it stays correct however old the cached row is.
+        """
+        rows = self.conn.execute("""
+            SELECT author_id, author_name, author_post_karma, author_comment_karma, author_created_utc, author_status
+            FROM authors
+        """).fetchall()
+        if author_ids is not None:
+            author_ids = set(author_ids)
+            rows = [row for row in rows if row[0] in author_ids]
+
+        columns = [column for column in AUTHOR_SCHEMA if column != 'account_age_days']
+        df = pl.DataFrame(rows, schema={column: AUTHOR_SCHEMA[column] for column in columns}, orient='row')
+        return df.with_columns(
+            ((pl.lit(time.time()) - pl.col('author_created_utc')) // 86400).cast(pl.Int64).alias('account_age_days')
+        ).select(list(AUTHOR_SCHEMA))
+
+    def close(self):
+        self.conn.close()
+
+# --- HELPER FUNCTION: AUTHOR RECORD BUILDER ---
+
+def _build_author_record(author_id, partial_redditor, fetched_at):
+    """
+    Flattens a PRAW PartialRedditor into an author cache row. Accounts missing from the lookup response
+    (deleted, or unknown IDs) and suspended accounts get null karma/creation time and their status.
+    """
+    record = {
+        'author_id': author_id,
+        'author_name': None,
+        'author_post_karma': None,
+        'author_comment_karma': None,
+        'author_created_utc': None,
+        'author_status': 'Deleted',
+        'fetched_at': fetched_at,
+    }
+    if partial_redditor is None:
+        return record
+
+    record['author_name'] = getattr(partial_redditor, 'name', None)
+    if getattr(partial_redditor, 'is_suspended', False):
+        record['author_status'] = 'Suspended'
+        return record
+
+    record.update({
+        'author_post_karma': getattr(partial_redditor, 'link_karma', None),
+        'author_comment_karma': getattr(partial_redditor, 'comment_karma', None),
+        'author_created_utc': getattr(partial_redditor, 'created_utc', None),
+        'author_status': 'Active',
+    })
+    return record
+
+# --- CORE ENRICHMENT FUNCTION ---
+
+def run_author_enrichment(reddit, author_ids, author_cache, ttl_days=30, batch_size=100, n_workers=1):
+    """
+    Resolves the account data (karma, creation time, status) of `author_ids` into `author_cache`.
+
+    Only authors not cached, or cached more than `ttl_days` ago, are looked up, in batches of `batch_size`
+    fullnames per API call (`reddit.redditors.partial_redditors`, max 100). Batches that fail are logged and
+    left out of the cache, so they are retried on the next run. Returns the number of authors fetched.
+    """
+    stale_ids = sorted(author_cache.stale_ids(author_ids, ttl_days))
+    batches = [stale_ids[i:i + batch_size] for i in range(0, len(stale_ids), batch_size)]
+    logging.info(f"Authors: {len(author_ids)} unique | {len(author_ids) - len(stale_ids)} cached | "
+                 f"{len(stale_ids)} to fetch in {len(batches)} API calls.")
+
+    def fetch_batch(batch):
+        try:
+            # A single request per batch (len(batch) <= 100)
+            found = {partial.fullname: partial for partial in reddit.redditors.partial_redditors(batch)}
+            fetched_at = time.time()
+            author_cache.upsert([_build_author_record(author_id, found.get(author_id), fetched_at) for author_id in batch])
+            return len(batch)
+        except Exception as e:
+            logging.error(f"❌ Error fetching a batch of {len(batch)} authors ({batch[0]}...): {e}")
+            return 0
+
+    if n_workers <= 1:
+        n_fetched = sum(fetch_batch(batch) for batch in batches)
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            n_fetched = sum(executor.map(fetch_batch, batches))
+
+    logging.info(f"Author enrichment completed. Authors fetched: {n_fetched}.")
+    return n_fetched
@@ -1,206 +1,973 @@
 # data_extraction_uitls.py
 
+import os
+import json
+import sqlite3
 import praw
 import prawcore
+import polars as pl
 import time
+import random
 import datetime as dt
 import logging
 import itertools
+import threading
+import heapq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from praw.models import MoreComments
+
+from src.search_query_utils import split_query
+
+# Reddit listings (including search) never return more than this many items
+LISTING_CAP = 1000
+
+# --- RATE LIMITING ---
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker that talks to the Reddit API.
+    Refills at `requests_per_minute / 60` tokens per second, up to `capacity` tokens.
+
+    The refill rate adapts to the quota Reddit reports in every response (see update_from_headers):
+    the remaining requests are spread evenly over the time left until the quota window resets.
+    """
+
+    def __init__(self, requests_per_minute, capacity=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else requests_per_minute
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, n=1):
+        """Blocks until `n` tokens are available and consumes them."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait_seconds = (n - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def update_from_headers(self, headers):
+        """Re-paces the bucket from the X-Ratelimit-Remaining / X-Ratelimit-Reset headers of a response."""
+        remaining = headers.get('x-ratelimit-remaining')
+        reset_seconds = headers.get('x-ratelimit-reset')
+        if remaining is None or reset_seconds is None:
+            return
+        remaining, reset_seconds = float(remaining), max(float(reset_seconds), 1.0)
+        with self.lock:
+            self._refill()
+            # Never hold more tokens than Reddit still grants in this window
+            self.tokens = min(self.tokens, remaining)
+            # Spread what is left of the quota over what is left of the window (at least one request per window)
+            self.rate = max(remaining, 1.0) / reset_seconds
+
+
+class RateLimitedRequestor(prawcore.Requestor):
+    """
+    prawcore Requestor that takes one token from a shared TokenBucket before every HTTP request,
+    re-paces the bucket from the rate-limit headers of every response, and retries only the failed
+    request (exponential backoff with jitter, or Retry-After) on 429/5xx responses and network errors.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504, 520, 522}
+
+    def __init__(self, *args, token_bucket=None, max_retries=5, backoff_base_seconds=1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_bucket = token_bucket
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+
+    def _backoff_seconds(self, attempt, response=None):
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_base_seconds * 2 ** attempt + random.uniform(0, self.backoff_base_seconds)
+
+    def request(self, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            if self.token_bucket is not None:
+                self.token_bucket.acquire()
+
+            try:
+                response = super().request(*args, **kwargs)
+            except prawcore.exceptions.RequestException as e:
+                # Network-level error (timeout, connection reset...): no response to inspect
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff_seconds(attempt)
+                logging.warning(f"⚠️ Request failed ({e}). Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+
+            if self.token_bucket is not None:
+                self.token_bucket.update_from_headers(response.headers)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            delay = self._backoff_seconds(attempt, response)
+            logging.warning(f"⚠️ HTTP {response.status_code}. Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+class ApiCallBudget:
+    """Thread-safe counter of API calls that may still be spent (e.g. on comment-tree expansion during a run)."""
+
+    def __init__(self, max_calls):
+        self.remaining = max_calls
+        self.lock = threading.Lock()
+
+    def try_spend(self, n=1):
+        """Consumes `n` calls if available. Returns False (and consumes nothing) if the budget is exhausted."""
+        with self.lock:
+            if self.remaining < n:
+                return False
+            self.remaining -= n
+            return True
+
+# --- STREAMING PARQUET OUTPUT ---
+
+# Explicit RAW schemas, so every part file has identical column types (even when a batch is all-null).
+# Records are tuples with one value per column, in schema order, except DERIVED_COLUMNS.
+POST_SCHEMA = {
+    'post_id': pl.Utf8,
+    'post_subreddit': pl.Utf8,
+    'post_title': pl.Utf8,
+    'post_body': pl.Utf8,
+    'post_url': pl.Utf8,
+    'post_score': pl.Int64,
+    'post_upvote_ratio': pl.Float64,
+    'post_num_comments': pl.Int64,
+    'post_num_crossposts': pl.Int64,
+    'post_total_awards': pl.Int64,
+    'post_is_self': pl.Boolean,
+    'post_is_over_18': pl.Boolean,
+    'post_is_stickied': pl.Boolean,
+    'post_is_locked': pl.Boolean,
+    'post_subreddit_subscribers': pl.Int64,
+    'post_domain': pl.Utf8,
+    'post_flair': pl.Utf8,
+    'post_author_id': pl.Utf8,
+    'post_author_name': pl.Utf8,
+    'post_created_utc': pl.Float64,
+    'post_created_utc_date': pl.Utf8,
+    'extraction_query': pl.Utf8,
+    'extraction_sort': pl.Utf8,
+    'extraction_time': pl.Utf8,
+}
+
+COMMENT_SCHEMA = {
+    'comment_id': pl.Utf8,
+    'post_id': pl.Utf8,
+    'comment_subreddit': pl.Utf8,
+    'comment_body': pl.Utf8,
+    'comment_score': pl.Int64,
+    'comment_score_hidden': pl.Boolean,
+    'comment_author_id': pl.Utf8,
+    'comment_author_name': pl.Utf8,
+    'comment_parent_id': pl.Utf8,
+    'comment_depth': pl.Int64,
+    'comment_created_utc': pl.Float64,
+    'comment_created_utc_date': pl.Utf8,
+    'extraction_time': pl.Utf8,
+}
+
+# Metrics-only snapshot of a post (no text), written when the post has not changed since the last extraction.
+POST_METRICS_SCHEMA = {
+    'post_id': pl.Utf8,
+    'post_score': pl.Int64,
+    'post_upvote_ratio': pl.Float64,
+    'post_num_comments': pl.Int64,
+    'post_num_crossposts': pl.Int64,
+    'post_total_awards': pl.Int64,
+    'post_is_locked': pl.Boolean,
+    'post_subreddit_subscribers': pl.Int64,
+    'post_created_utc': pl.Float64,
+    'extraction_time': pl.Utf8,
+}
+
+# Metrics-only snapshot of a comment, written by the metrics refresh (run_metrics_refresh).
+COMMENT_METRICS_SCHEMA = {
+    'comment_id': pl.Utf8,
+    'comment_score': pl.Int64,
+    'comment_score_hidden': pl.Boolean,
+    'extraction_time': pl.Utf8,
+}
+
+
+# Columns computed from another column at write time, vectorized, instead of per record:
+# ISO-8601 UTC date strings (same format as datetime.isoformat(), e.g. '2024-01-31T12:00:00+00:00').
+DERIVED_COLUMNS = {
+    'post_created_utc_date': 'post_created_utc',
+    'comment_created_utc_date': 'comment_created_utc',
+}
+
+
+def _iso_date_expr(source_column):
+    return (pl.from_epoch(pl.col(source_column).cast(pl.Int64), time_unit='s')
+              .dt.replace_time_zone('UTC')
+              .dt.strftime('%Y-%m-%dT%H:%M:%S%:z'))
+
+
+def record_schema(schema):
+    """The columns a record (tuple) provides for `schema`: every column but the derived ones."""
+    return {column: dtype for column, dtype in schema.items() if column not in DERIVED_COLUMNS}
+
+
+def records_to_frame(records, schema):
+    """Builds a DataFrame with `schema` from record tuples, computing the derived columns vectorized."""
+    df = pl.DataFrame(records, schema=record_schema(schema), orient='row')
+    derived = [_iso_date_expr(DERIVED_COLUMNS[column]).alias(column) for column in schema if column in DERIVED_COLUMNS]
+    return df.with_columns(derived).select(list(schema)) if derived else df
+
+
+class ParquetPartWriter:
+    """
+    Thread-safe sink that buffers records (tuples, see record_schema) and flushes them every `batch_size` records
+    as an Arrow-backed record batch to a new Parquet part file:
+    `<output_dir>/<file_prefix>_part00000.parquet`, `..._part00001.parquet`, ...
+    Peak memory is bounded by `batch_size`, regardless of how many records are written.
+
+    Hive partitioning: part files go to `<output_dir>/<key>=<value>/.../` directories built from the fixed
+    `partitions` values (e.g. {'extraction_date': '2024-01-31'}) and, with `partition_by` ({key: column},
+    e.g. {'subreddit': 'post_subreddit'}), from the record values: each flushed batch is split per value.
+    Part numbers are unique across all partitions of a writer.
+
+    Part files already on disk for the same prefix (a resumed run) are kept and numbering continues after them.
+    If `depends_on` is given, that writer is always flushed first (used so that a post is never on disk
+    before its comments, which makes resuming safe).
+    """
+
+    def __init__(self, output_dir, file_prefix, schema, batch_size=5000, depends_on=None, partitions=None, partition_by=None):
+        self.output_dir = output_dir
+        self.file_prefix = file_prefix
+        self.schema = schema
+        self.batch_size = batch_size
+        self.depends_on = depends_on
+        self.partitions = partitions or {}
+        self.partition_by = partition_by or {}
+        self.buffer = []
+        self.n_records = 0
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self.part_paths = list_part_files(output_dir, file_prefix)
+
+        # Remove temporary files left behind by a run that crashed mid-write
+        for dir_path, _, file_names in os.walk(output_dir):
+            for name in file_names:
+                if name.startswith(f"{file_prefix}_part") and name.endswith('.parquet.tmp'):
+                    os.remove(os.path.join(dir_path, name))
+
+    def __len__(self):
+        return self.n_records
+
+    def append(self, record):
+        with self.lock:
+            self.buffer.append(record)
+            self.n_records += 1
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        if self.depends_on is not None:
+            self.depends_on.flush()
+        df = records_to_frame(self.buffer, self.schema)
+        if self.partition_by:
+            groups = df.partition_by(list(self.partition_by.values()), as_dict=True, maintain_order=True)
+            batches = [(dict(zip(self.partition_by, values)), batch_df) for values, batch_df in groups.items()]
+        else:
+            batches = [({}, df)]
+
+        for values, batch_df in batches:
+            part_dir = hive_partition_dir(self.output_dir, {**self.partitions, **values})
+            os.makedirs(part_dir, exist_ok=True)
+            part_path = os.path.join(part_dir, f"{self.file_prefix}_part{len(self.part_paths):05d}.parquet")
+            # Write to a temporary file and rename, so a crash never leaves a truncated part file behind
+            tmp_path = part_path + '.tmp'
+            batch_df.write_parquet(tmp_path)
+            os.replace(tmp_path, part_path)
+            self.part_paths.append(part_path)
+            logging.info(f"📁 Flushed part file {part_path} ({self.n_records} records written so far)")
+        self.buffer = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        """Flushes the remaining records. Returns the list of part files written."""
+        self.flush()
+        return self.part_paths
+
+# --- HIVE-PARTITIONED RAW LAYOUT ---
+# RAW part files are stored as <raw_data>/extraction_date=YYYY-MM-DD/subreddit=<name>/<prefix>_partNNNNN.parquet,
+# so readers can prune whole directories by path. Files written before this layout (directly in <raw_data>)
+# are still found by every reader; they simply carry no partition values.
+
+def hive_partition_dir(output_dir, partitions):
+    """Directory of a hive partition: `<output_dir>/<key1>=<value1>/<key2>=<value2>/...` (null values -> 'unknown')."""
+    return os.path.join(output_dir, *(f"{key}={'unknown' if value is None else value}" for key, value in partitions.items()))
+
+
+def parse_hive_partitions(file_path, root_dir):
+    """Returns the {key: value} hive partitions encoded in the directories between `root_dir` and `file_path`."""
+    relative_dir = os.path.relpath(os.path.dirname(file_path), root_dir)
+    return dict(part.split('=', 1) for part in relative_dir.split(os.sep) if '=' in part)
+
+
+def extraction_date_from_id(data_extraction_id):
+    """'YYYYMMDDHHMMSS' extraction id -> 'YYYY-MM-DD' extraction_date partition value."""
+    return dt.datetime.strptime(data_extraction_id, '%Y%m%d%H%M%S').strftime('%Y-%m-%d')
+
+
+def list_raw_files(raw_data_dir, file_prefix=''):
+    """Returns every Parquet file under `raw_data_dir` (any partition depth) whose name starts with `file_prefix`, sorted by name."""
+    if not os.path.isdir(raw_data_dir):
+        return []
+    paths = [
+        os.path.join(dir_path, name)
+        for dir_path, _, file_names in os.walk(raw_data_dir)
+        for name in file_names
+        if name.startswith(file_prefix) and name.endswith('.parquet')
+    ]
+    return sorted(paths, key=os.path.basename)
+
+
+def list_part_files(output_dir, file_prefix):
+    """Returns the list of Parquet part files written for `file_prefix` in `output_dir` (any partition), in part order."""
+    return list_raw_files(output_dir, f"{file_prefix}_part")
+
+
+def load_seen_ids(part_paths, id_column):
+    """Reads only `id_column` from the given part files and returns its values as a set."""
+    if not part_paths:
+        return set()
+    return set(pl.scan_parquet(part_paths).select(id_column).collect()[id_column].to_list())
+
+# --- PERSISTENT SEEN-ID INDEX ---
+
+class SeenIdIndex:
+    """
+    On-disk (SQLite) set of every post_id and comment_id already stored in the RAW Parquet files,
+    plus the latest stored snapshot (num_comments, created_utc) of every post, used for change detection.
+    RAW part files are immutable, so each file is indexed exactly once and later syncs only read new files.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS indexed_files (file_name TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS post_ids (id TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS comment_ids (id TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS post_snapshots (
+                post_id TEXT PRIMARY KEY,
+                num_comments INTEGER,
+                created_utc REAL,
+                snapshot_time TEXT
+            ) WITHOUT ROWID;
+        """)
+        # Indexes built before post snapshots existed: re-read their posts files once to backfill them
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            with self.conn:
+                self.conn.execute("DELETE FROM indexed_files WHERE file_name LIKE 'posts%'")
+                self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def sync_from_raw_data(self, raw_data_dir):
+        """
+        Indexes every RAW posts/comments/post_metrics Parquet file not indexed yet (flat or hive-partitioned layout;
+        file names are unique). Returns the number of new files.
+        """
+        indexed = {row[0] for row in self.conn.execute("SELECT file_name FROM indexed_files")}
+        snapshot_columns = ['post_id', 'post_num_comments', 'post_created_utc', 'extraction_time']
+        n_new_files = 0
+        for file_path in list_raw_files(raw_data_dir):
+            file_name = os.path.basename(file_path)
+            if file_name in indexed:
+                continue
+            with self.conn:
+                if file_name.startswith('posts'):
+                    df = pl.read_parquet(file_path, columns=snapshot_columns).select(snapshot_columns)
+                    self.conn.executemany("INSERT OR IGNORE INTO post_ids (id) VALUES (?)", ((i,) for i in df['post_id'].to_list()))
+                    self._upsert_snapshots(df)
+                elif file_name.startswith('post_metrics'):
+                    df = pl.read_parquet(file_path, columns=snapshot_columns).select(snapshot_columns)
+                    self._upsert_snapshots(df)
+                elif file_name.startswith('comments'):
+                    ids = pl.read_parquet(file_path, columns=['comment_id'])['comment_id'].unique()
+                    self.conn.executemany("INSERT OR IGNORE INTO comment_ids (id) VALUES (?)", ((i,) for i in ids.to_list()))
+                else:
+                    continue
+                self.conn.execute("INSERT INTO indexed_files (file_name) VALUES (?)", (file_name,))
+            n_new_files += 1
+        logging.info(f"🗂️ Seen-ID index synced: {n_new_files} new RAW files indexed.")
+        return n_new_files
+
+    def _upsert_snapshots(self, df):
+        """Keeps, for every post, the snapshot with the latest extraction_time."""
+        self.conn.executemany("""
+            INSERT INTO post_snapshots (post_id, num_comments, created_utc, snapshot_time) VALUES (?, ?, ?, ?)
+            ON CONFLICT(post_id) DO UPDATE SET
+                num_comments = excluded.num_comments,
+                created_utc = excluded.created_utc,
+                snapshot_time = excluded.snapshot_time
+            WHERE excluded.snapshot_time >= post_snapshots.snapshot_time
+        """, df.iter_rows())
+
+    def load_post_ids(self):
+        return {row[0] for row in self.conn.execute("SELECT id FROM post_ids")}
+
+    def load_comment_ids(self):
+        return {row[0] for row in self.conn.execute("SELECT id FROM comment_ids")}
+
+    def load_post_snapshots(self):
+        """Returns {post_id: (num_comments, created_utc)} with the latest stored snapshot of every post."""
+        return {row[0]: (row[1], row[2]) for row in self.conn.execute("SELECT post_id, num_comments, created_utc FROM post_snapshots")}
+
+    def close(self):
+        self.conn.close()
+
+# --- RUN MANIFEST (CHECKPOINTING) ---
+
+class ExtractionManifest:
+    """
+    JSON manifest of an extraction run, stored at `<manifest_dir>/extraction_<extraction_id>.json`.
+    Records every completed (subreddit, query, sort, time_filter) combination together with the number
+    of records it produced and the part files flushed when it was checkpointed.
+    """
+
+    def __init__(self, manifest_dir, extraction_id):
+        self.extraction_id = extraction_id
+        self.path = os.path.join(manifest_dir, f"extraction_{extraction_id}.json")
+        self.lock = threading.Lock()
+        os.makedirs(manifest_dir, exist_ok=True)
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {
+                'extraction_id': extraction_id,
+                'status': 'running',
+                'created_at': dt.datetime.now(dt.timezone.utc).isoformat(),
+                'completed_combinations': [],
+            }
+        self.completed_keys = {self.combination_key(**c['combination']) for c in self.data['completed_combinations']}
+        self.recorded_parts = {p for c in self.data['completed_combinations'] for p in c['output_parts']}
+
+    @staticmethod
+    def combination_key(subreddit, query, sort, time_filter):
+        return (subreddit, query, sort, time_filter)
+
+    def is_completed(self, subreddit, query, sort, time_filter):
+        return self.combination_key(subreddit, query, sort, time_filter) in self.completed_keys
+
+    def mark_completed(self, subreddit, query, sort, time_filter, n_posts, n_comments, part_paths):
+        """Records a finished combination. `part_paths` are all part files on disk at checkpoint time."""
+        with self.lock:
+            new_parts = [os.path.basename(p) for p in part_paths if os.path.basename(p) not in self.recorded_parts]
+            self.recorded_parts.update(new_parts)
+            self.completed_keys.add(self.combination_key(subreddit, query, sort, time_filter))
+            self.data['completed_combinations'].append({
+                'combination': {'subreddit': subreddit, 'query': query, 'sort': sort, 'time_filter': time_filter},
+                'n_posts': n_posts,
+                'n_comments': n_comments,
+                'output_parts': new_parts,
+                'completed_at': dt.datetime.now(dt.timezone.utc).isoformat(),
+            })
+            self._save()
+
+    def finish(self):
+        with self.lock:
+            self.data['status'] = 'completed'
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
 
 # --- AUTHENTICATION ---
 
-def authenticate_praw(CLIENT_ID, CLIENT_SECRET, USER_AGENT):
-    """Initializes the PRAW instance in read-only mode."""
+def authenticate_praw(CLIENT_ID, CLIENT_SECRET, USER_AGENT, token_bucket=None, session=None, max_retries=5, backoff_base_seconds=1.0):
+    """
+    Initializes the PRAW instance in read-only mode.
+    If a TokenBucket is given, every API call made through this instance is paced by it.
+    Failed requests (429/5xx/network errors) are retried individually up to `max_retries` times (see RateLimitedRequestor).
+    `session` replaces the underlying `requests.Session` (e.g. fake_backend_utils.FakeRedditSession for offline runs).
+    """
     try:
         reddit = praw.Reddit(
             client_id=CLIENT_ID,
             client_secret=CLIENT_SECRET,
             user_agent=USER_AGENT,
+            requestor_class=RateLimitedRequestor,
+            requestor_kwargs={
+                'token_bucket': token_bucket,
+                'session': session,
+                'max_retries': max_retries,
+                'backoff_base_seconds': backoff_base_seconds,
+            },
         )
-        reddit.user.me() 
+        # Fetches an application-only token: fails here if the credentials are invalid
+        reddit.auth.scopes()
         logging.info("PRAW instance initialized successfully (read-only mode).")
         return reddit
     except Exception as e:
         logging.error(f"Authentication failed: {e}")
         return None
 
-# --- HELPER FUNCTION: AUTHOR DATA EXTRACTION ---
+# --- HELPER FUNCTIONS: RECORD BUILDERS ---
+# Builders return plain tuples (one value per schema column, in schema order) instead of dicts: no per-record
+# key storage or hashing in the extraction hot loop. Derived columns are computed by ParquetPartWriter at flush.
 
-'''
-def _get_author_data(author_obj):
+def _get_author_fields(item):
     """
-    Safely extracts author data (ID, name, karma, age) from a PRAW Author object.
-    Handles deleted/suspended accounts by returning default values.
+    Returns (author fullname, author name) of a PRAW Submission/Comment, read from the data the listing already
+    returned. Instance attributes are read directly because a missing attribute would trigger a lazy fetch
+    (one extra API call per item). Deleted authors give (None, None). Karma, account age and status are
+    resolved later, in bulk, by the author enrichment stage (author_enrichment_utils).
     """
-    # Default values for deleted/suspended users
-    default_data = {
-        'author_id': '[unavailable]',
-        'author_name': '[deleted]',
-        'author_post_karma': 0,
-        'author_comment_karma': 0,
-        'account_age_days': -1,
-        'author_status': 'Deleted'
-    }
-    
-    if author_obj is None:
-        return default_data
-        
+    attributes = vars(item)
+    author = attributes.get('author')
+    return attributes.get('author_fullname'), author.name if author is not None else None
+
+
+def _build_post_record(post, query, sort, extraction_time_utc):
+    """Flattens a PRAW Submission into a RAW post row (a tuple in POST_SCHEMA order, without derived columns)."""
+
+    author_id, author_name = _get_author_fields(post)
+
+    return (
+        # Identifiers
+        post.id,                                    # post_id
+        post.subreddit.display_name,                # post_subreddit
+        # Text Content
+        post.title,                                 # post_title
+        post.selftext,                              # post_body
+        post.url,                                   # post_url
+        # Post Metrics
+        post.score,                                 # post_score
+        post.upvote_ratio,                          # post_upvote_ratio
+        post.num_comments,                          # post_num_comments
+        post.num_crossposts,                        # post_num_crossposts
+        post.total_awards_received,                 # post_total_awards
+        post.is_self,                               # post_is_self
+        post.over_18,                               # post_is_over_18
+        post.stickied,                              # post_is_stickied
+        post.locked,                                # post_is_locked
+        post.subreddit_subscribers,                 # post_subreddit_subscribers
+        post.domain,                                # post_domain
+        post.link_flair_text or None,               # post_flair
+        # Author Data
+        author_id,                                  # post_author_id
+        author_name,                                # post_author_name
+        # Timestamps
+        post.created_utc,                           # post_created_utc
+        # Traceability Metadata
+        query,                                      # extraction_query
+        sort,                                       # extraction_sort
+        extraction_time_utc,                        # extraction_time
+    )
+
+
+def _build_post_metrics_record(post, extraction_time_utc):
+    """Flattens the engagement metrics of a PRAW Submission into a row in POST_METRICS_SCHEMA order."""
+
+    return (
+        post.id,                                    # post_id
+        post.score,                                 # post_score
+        post.upvote_ratio,                          # post_upvote_ratio
+        post.num_comments,                          # post_num_comments
+        post.num_crossposts,                        # post_num_crossposts
+        post.total_awards_received,                 # post_total_awards
+        post.locked,                                # post_is_locked
+        post.subreddit_subscribers,                 # post_subreddit_subscribers
+        post.created_utc,                           # post_created_utc
+        extraction_time_utc,                        # extraction_time
+    )
+
+
+def _build_comment_metrics_record(comment, extraction_time_utc):
+    """Flattens the engagement metrics of a PRAW Comment into a row in COMMENT_METRICS_SCHEMA order."""
+
+    return (
+        comment.id,                                 # comment_id
+        comment.score,                              # comment_score
+        comment.score_hidden,                       # comment_score_hidden
+        extraction_time_utc,                        # extraction_time
+    )
+
+
+def _build_comment_record(comment, post_id, extraction_time_utc):
+    """Flattens a PRAW Comment into a RAW comment row (a tuple in COMMENT_SCHEMA order, without derived columns)."""
+
+    author_id, author_name = _get_author_fields(comment)
+
+    return (
+        # Identifiers
+        comment.id,                                 # comment_id
+        post_id,                                    # post_id
+        comment.subreddit.display_name,             # comment_subreddit
+        # Text Content
+        comment.body,                               # comment_body
+        # Comment Metrics
+        comment.score,                              # comment_score
+        comment.score_hidden,                       # comment_score_hidden
+        # Author Data
+        author_id,                                  # comment_author_id
+        author_name,                                # comment_author_name
+        # Reply Structure (parent fullname: 't1_<comment_id>' for replies, 't3_<post_id>' for top-level comments)
+        comment.parent_id,                          # comment_parent_id
+        vars(comment).get('depth'),                 # comment_depth
+        # Timestamps
+        comment.created_utc,                        # comment_created_utc
+        # Extraction Metadata
+        extraction_time_utc,                        # extraction_time
+    )
+
+# --- HELPER FUNCTIONS: COMMENT TREE EXPANSION ---
+
+def _flatten_comments(items, comments, more_heap):
+    """Walks a (possibly nested) list of comments: Comments go to `comments`, MoreComments stubs to `more_heap`."""
+    stack = list(items)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, MoreComments):
+            # Max-heap on the number of hidden comments; id() breaks ties without comparing PRAW objects
+            heapq.heappush(more_heap, (-item.count, id(item), item))
+        else:
+            comments.append(item)
+            stack.extend(item.replies)
+
+
+def _load_more_comments(more):
+    """Expands one MoreComments stub (one API call) into the flat list of Comments and MoreComments it hides (walked by _flatten_comments)."""
     try:
-        # Check for suspended accounts
-        if author_obj.is_suspended:
-            default_data['author_name'] = '[suspended]'
-            default_data['author_status'] = 'Suspended'
-            return default_data
-
-        # Calculate account age in days
-        created_utc = author_obj.created_utc
-        account_age_days = (dt.datetime.now(dt.timezone.utc) - dt.datetime.fromtimestamp(created_utc, dt.timezone.utc)).days
-
-        return {
-            'author_id': author_obj.id,
-            'author_name': author_obj.name,
-            'author_post_karma': author_obj.link_karma,
-            'author_comment_karma': author_obj.comment_karma,
-            'account_age_days': account_age_days,
-            'author_status': 'Active'
-        }
-    except Exception:
-        # Fallback for unexpected errors or other inaccessible accounts
-        default_data['author_status'] = 'Error'
-        return default_data
-'''
-        
+        return list(more.comments())
+    except Exception as e:
+        logging.warning(f"❌ Error expanding MoreComments ({more.count} hidden comments): {e}")
+        return []
+
+
+def expand_comment_tree(post, per_post_budget, run_budget=None, executor=None):
+    """
+    Returns the flat list of Comments of `post`, expanding its MoreComments stubs largest first
+    (by number of hidden comments) instead of discarding them as `replace_more(limit=0)` does.
+
+    At most `per_post_budget` expansion calls are made for this post, and each one is also taken from the
+    shared `run_budget` (ApiCallBudget) if given. Stubs are expanded in waves submitted to `executor`,
+    so the largest pending stubs of a thread are fetched concurrently. Stubs left over when a budget runs
+    out are dropped.
+    """
+    comments, more_heap = [], []
+    _flatten_comments(post.comments, comments, more_heap)
+
+    n_calls = 0
+    while more_heap and n_calls < per_post_budget:
+        # Next wave: the largest pending stubs, as many as both budgets allow
+        wave = []
+        while more_heap and n_calls + len(wave) < per_post_budget:
+            if run_budget is not None and not run_budget.try_spend():
+                break
+            wave.append(heapq.heappop(more_heap)[2])
+        if not wave:
+            break
+        n_calls += len(wave)
+
+        results = executor.map(_load_more_comments, wave) if executor is not None else map(_load_more_comments, wave)
+        for new_items in results:
+            _flatten_comments(new_items, comments, more_heap)
+
+    if more_heap:
+        logging.info(f"✂️ Post {post.id}: {len(more_heap)} MoreComments stubs left unexpanded (budget reached after {n_calls} calls).")
+    return comments
+
 # --- CORE EXTRACTION FUNCTION ---
 
-def run_extraction(reddit, subreddits, queries, sorts, max_limit, time_filter):
+def run_extraction(reddit, subreddits, queries, sorts, max_limit, time_filter, n_workers=1,
+                   post_writer=None, comment_writer=None, manifest=None, post_ids_seen=None, comment_ids_seen=None,
+                   known_posts=None, post_metrics_writer=None, more_comments_budget=0, run_budget=None,
+                   partition_queries=False):
     """
     Runs the full extraction process over all combinations of subreddits, queries, and sorts.
     Always extracts posts AND top-level comments for the Comment-Centric strategy.
+
+    Records are appended to `post_writer` / `comment_writer` (e.g. ParquetPartWriter) as they are extracted,
+    so nothing accumulates in RAM. If no writers are given, plain in-memory lists of record tuples are used and
+    returned (see records_to_frame).
+
+    With n_workers > 1, combinations and per-post comment fetches are spread across thread pools of that size.
+    There is no fixed pause between combinations: pacing and retries happen per request, through the
+    TokenBucket / RateLimitedRequestor attached to `reddit` (see authenticate_praw).
+
+    If an ExtractionManifest is given (requires writers), combinations it already lists as completed are skipped,
+    and each newly completed combination is checkpointed into it after flushing the writers.
+    `post_ids_seen` / `comment_ids_seen` can be pre-filled (e.g. with the IDs already written by an interrupted run)
+    so those records are not extracted again.
+
+    Incremental (change-detection) mode: if `known_posts` ({post_id: (num_comments, created_utc)}, see
+    SeenIdIndex.load_post_snapshots) is given, a known post whose search result shows the same created_utc and
+    no new comments only gets a metrics-only row in `post_metrics_writer`; its comment tree is not fetched.
+    Posts whose comment count grew are fully re-extracted (already stored comments are still skipped
+    through `comment_ids_seen`).
+
+    Comment-tree expansion: with `more_comments_budget` > 0, MoreComments stubs are expanded (largest first,
+    concurrently) with up to that many API calls per post, and up to the shared `run_budget` (ApiCallBudget)
+    over the whole run; see expand_comment_tree. With 0, stubs are discarded (`replace_more(limit=0)`).
+
+    Query partitioning: Reddit listings stop at ~LISTING_CAP results whatever `max_limit` is. With
+    `partition_queries`, a search that hits the cap is split into two narrower queries covering the same
+    matches (see search_query_utils.split_query), recursively, and the partitions run in parallel.
     """
-    post_data_list = []
-    comment_data_list = []
-    post_ids_seen = set()
-    comment_ids_seen = set()
+    post_sink = post_writer if post_writer is not None else []
+    comment_sink = comment_writer if comment_writer is not None else []
+    post_metrics_sink = post_metrics_writer if post_metrics_writer is not None else []
+    post_ids_seen = post_ids_seen if post_ids_seen is not None else set()
+    comment_ids_seen = comment_ids_seen if comment_ids_seen is not None else set()
+    seen_lock = threading.Lock()
+    checkpoint_lock = threading.Lock()
+    n_unchanged_posts = 0
     extraction_time_utc = dt.datetime.now(dt.timezone.utc).isoformat()
     
     # Generate all combinations of (subreddit, query, sort)
     extraction_combinations = list(itertools.product(subreddits, queries, sorts))
     logging.info(f"Total extraction combinations to run: {len(extraction_combinations)}")
 
-    for subreddit_name, query, sort in extraction_combinations:
-        
-        logging.info(f"Processing r/{subreddit_name} | Query: '{query[:30]}...' | Sort: {sort}")
+    if manifest is not None:
+        extraction_combinations = [
+            (subreddit_name, query, sort) for subreddit_name, query, sort in extraction_combinations
+            if not manifest.is_completed(subreddit_name, query, sort, time_filter)
+        ]
+        logging.info(f"🔄 Resume: {len(extraction_combinations)} combinations left to run according to the manifest.")
+
+    def claim(ids_seen, item_id):
+        """Marks an ID as seen. Returns False if it was already claimed (by this or another worker)."""
+        with seen_lock:
+            if item_id in ids_seen:
+                return False
+            ids_seen.add(item_id)
+            return True
 
+    def checkpoint(subreddit_name, query, sort, n_posts, n_comments):
+        with checkpoint_lock:
+            # Comments first: a post on disk always has its comments on disk too
+            sinks = [sink for sink in (comment_sink, post_metrics_sink, post_sink) if isinstance(sink, ParquetPartWriter)]
+            part_paths = []
+            for sink in sinks:
+                sink.flush()
+                part_paths += sink.part_paths
+            manifest.mark_completed(subreddit_name, query, sort, time_filter, n_posts, n_comments, part_paths)
+
+    def extract_post(post, query, sort, subreddit_name):
+        """Extracts the comments of a post and then the post itself. Returns the number of new comments."""
+        n_comments = 0
         try:
-            # 1. Search for posts
-            search_results = reddit.subreddit(subreddit_name).search(
-                query,
-                sort=sort,
-                time_filter=time_filter,
-                limit=max_limit
-            )
+            if more_comments_budget > 0:
+                # Budgeted expansion of 'MoreComments' links, largest first
+                comments = expand_comment_tree(post, more_comments_budget, run_budget, expansion_executor)
+            else:
+                # Replace 'MoreComments' links to fetch top-level comments only (limit=0)
+                post.comments.replace_more(limit=0)
+                comments = post.comments.list()
             
-            # 2. Iterate over posts
-            for post in search_results:
-                if post.id in post_ids_seen:
+            logging.info(f'⚙️ Extracting data from comments of post {post.id}')
+            for comment in comments:
+                if not claim(comment_ids_seen, comment.id):
                     continue # Skip if already processed
-                logging.info(f'⚙️ Extracting data from post {post.id}')
-
-                # 2a. Extract Post Data
-                #author_data = _get_author_data(post.author)
-                
-                post_record = {
-                    # Identifiers
-                    'post_id': post.id,
-                    'post_subreddit': post.subreddit.display_name,
-                    # Text Content
-                    'post_title': post.title,
-                    'post_body': post.selftext,
-                    'post_url': post.url,
-                    # Post Metrics
-                    'post_score': post.score,
-                    'post_upvote_ratio': post.upvote_ratio,
-                    'post_num_comments': post.num_comments,
-                    'post_num_crossposts': post.num_crossposts,
-                    'post_total_awards': post.total_awards_received,
-                    'post_is_self': post.is_self,
-                    'post_is_over_18': post.over_18,
-                    'post_is_stickied': post.stickied,
-                    'post_is_locked': post.locked,
-                    'post_subreddit_subscribers': post.subreddit_subscribers,
-                    'post_domain': post.domain,
-                    'post_flair': post.link_flair_text if post.link_flair_text else None,
-                    # Author Data
-                    #'author_id': author_data['author_id'],
-                    #'author_name': author_data['author_name'],
-                    #'author_post_karma': author_data['author_post_karma'],
-                    #'author_comment_karma': author_data['author_comment_karma'],
-                    #'account_age_days': author_data['account_age_days'],
-                    #'author_status': author_data['author_status'],
-                    # Timestamps
-                    'post_created_utc': post.created_utc,
-                    'post_created_utc_date': dt.datetime.fromtimestamp(post.created_utc, dt.timezone.utc).isoformat(),
-                    # Traceability Metadata
-                    'extraction_query': query,
-                    'extraction_sort': sort,
-                    'extraction_time': extraction_time_utc,
-                }
-                
-                post_data_list.append(post_record)
-                post_ids_seen.add(post.id)
-                logging.info(f'✅ Post {post.id}')
-
-                # 2b. Extract Top-Level Comments (New universal logic)
-                try:
-                    # Replace 'MoreComments' links to fetch top-level comments only (limit=0)
-                    post.comments.replace_more(limit=0)
-                    
-                    logging.info(f'⚙️ Extracting data from comments of post {post.id}')
-                    for comment in post.comments.list():
-                        if comment.id in comment_ids_seen:
-                            continue # Skip if already processed
-
-                        #author_data_comment = _get_author_data(comment.author)
-                        
-                        comment_record = {
-                            # Identifiers
-                            'comment_id': comment.id,
-                            'post_id': post.id,
-                            # Text Content
-                            'comment_body': comment.body,
-                            # Comment Metrics
-                            'comment_score': comment.score,
-                            'comment_score_hidden': comment.score_hidden,
-                            # Author Data
-                            #'author_id': author_data_comment['author_id'],
-                            #'author_name': author_data_comment['author_name'],
-                            #'author_post_karma': author_data_comment['author_post_karma'],
-                            #'author_comment_karma': author_data_comment['author_comment_karma'],
-                            #'account_age_days': author_data_comment['account_age_days'],
-                            #'author_status': author_data_comment['author_status'],
-                            # Timestamps
-                            'comment_created_utc': comment.created_utc,
-                            'comment_created_utc_date': dt.datetime.fromtimestamp(comment.created_utc, dt.timezone.utc).isoformat(),
-                        }
-                        
-                        comment_data_list.append(comment_record)
-                        comment_ids_seen.add(comment.id)
-                        logging.info(f'✅ Comment {comment.id}')
-
-                except Exception as e:
-                    logging.warning(f"❌ Error retrieving comments for post {post.id} in r/{subreddit_name}: {e}")
+
+                comment_sink.append(_build_comment_record(comment, post.id, extraction_time_utc))
+                n_comments += 1
+                logging.info(f'✅ Comment {comment.id}')
+
+        except Exception as e:
+            logging.warning(f"❌ Error retrieving comments for post {post.id} in r/{subreddit_name}: {e}")
+
+        # The post record is written after its comments, so a resumed run never skips a post with missing comments
+        post_sink.append(_build_post_record(post, query, sort, extraction_time_utc))
+        logging.info(f'✅ Post {post.id}')
+        return n_comments
+
+    def is_unchanged(post):
+        """True if the post is known and nothing that requires refetching its comment tree has changed."""
+        if known_posts is None or post.id not in known_posts:
+            return False
+        known_num_comments, known_created_utc = known_posts[post.id]
+        return post.created_utc == known_created_utc and post.num_comments <= (known_num_comments or 0)
+
+    def search_partition(subreddit_name, search_query, query, sort, comment_executor=None):
+        """
+        Runs one search (the combination query, or a narrower partition of it) and extracts its posts.
+        Returns (n_posts, n_comments, n_results), where n_results also counts already-seen posts.
+        """
+        nonlocal n_unchanged_posts
+        n_posts, n_comments, n_results = 0, 0, 0
+
+        # 1. Search for posts
+        search_results = reddit.subreddit(subreddit_name).search(
+            search_query,
+            sort=sort,
+            time_filter=time_filter,
+            limit=max_limit
+        )
+        
+        # 2. Iterate over posts (comments inline, or handed over to the comment pool)
+        comment_futures = []
+        for post in search_results:
+            n_results += 1
+            if not claim(post_ids_seen, post.id):
+                continue # Skip if already processed
+
+            if is_unchanged(post):
+                # Incremental mode: no new comments since the last snapshot -> metrics-only update
+                post_metrics_sink.append(_build_post_metrics_record(post, extraction_time_utc))
+                with seen_lock:
+                    n_unchanged_posts += 1
+                continue
+
+            logging.info(f'⚙️ Extracting data from post {post.id}')
+            n_posts += 1
+
+            if comment_executor is None:
+                n_comments += extract_post(post, query, sort, subreddit_name)
+            else:
+                comment_futures.append(comment_executor.submit(extract_post, post, query, sort, subreddit_name))
+
+        # A search only counts as done once all of its posts are fully extracted
+        n_comments += sum(future.result() for future in comment_futures)
+        return n_posts, n_comments, n_results
+
+    def is_capped(n_results):
+        return partition_queries and n_results >= LISTING_CAP and (max_limit is None or max_limit > LISTING_CAP)
+
+    def extract_combination(subreddit_name, query, sort, comment_executor=None, partition_executor=None):
+        
+        logging.info(f"Processing r/{subreddit_name} | Query: '{query[:30]}...' | Sort: {sort}")
+        n_posts, n_comments = 0, 0
+        completed = False
+
+        try:
+            # Searches hitting the listing cap are bisected into narrower queries, wave by wave
+            pending_queries = [query]
+            while pending_queries:
+                if partition_executor is None:
+                    results = [search_partition(subreddit_name, q, query, sort, comment_executor) for q in pending_queries]
+                else:
+                    futures = [partition_executor.submit(search_partition, subreddit_name, q, query, sort, comment_executor)
+                               for q in pending_queries]
+                    results = [future.result() for future in futures]
+
+                next_queries = []
+                for search_query, (partition_posts, partition_comments, n_results) in zip(pending_queries, results):
+                    n_posts += partition_posts
+                    n_comments += partition_comments
+                    if not is_capped(n_results):
+                        continue
+                    sub_queries = split_query(search_query)
+                    if sub_queries is None:
+                        logging.warning(f"⚠️ Listing cap reached for r/{subreddit_name} | '{search_query[:30]}...' and the query cannot be split further.")
+                    else:
+                        logging.info(f"✂️ Listing cap reached for r/{subreddit_name} | '{search_query[:30]}...': splitting into {len(sub_queries)} partitions.")
+                        next_queries += sub_queries
+                pending_queries = next_queries
+
+            completed = True
             
             logging.info(f"-> Unique POSTS: {len(post_ids_seen)} | Unique COMMENTS: {len(comment_ids_seen)}")
             
         except prawcore.exceptions.NotFound:
             logging.error(f"❌ -> ERROR! Subreddit r/{subreddit_name} not found (404). Skipping.")
+            completed = True
         except prawcore.exceptions.Forbidden:
             logging.error(f"❌ -> ERROR! Subreddit r/{subreddit_name} is private or banned (403). Skipping.")
+            completed = True
         except Exception as e:
+            # Not checkpointed: a resumed run will retry this combination
             logging.error(f"❌ -> UNEXPECTED ERROR in r/{subreddit_name}: {e}. Skipping.")
+
+        if completed and manifest is not None:
+            checkpoint(subreddit_name, query, sort, n_posts, n_comments)
+
+    # Dedicated pool for MoreComments expansion (kept separate from the comment pool to avoid nested-pool deadlocks)
+    expansion_executor = ThreadPoolExecutor(max_workers=max(n_workers, 1)) if more_comments_budget > 0 else None
+
+    try:
+        if n_workers <= 1:
+            for subreddit_name, query, sort in extraction_combinations:
+                extract_combination(subreddit_name, query, sort)
+        else:
+            logging.info(f"Running in concurrent mode with {n_workers} workers.")
+            # Combination tasks wait on partition tasks, which wait on comment tasks: one pool per level, no cycles.
+            with ThreadPoolExecutor(max_workers=n_workers) as comment_executor, \
+                 ThreadPoolExecutor(max_workers=n_workers) as partition_executor, \
+                 ThreadPoolExecutor(max_workers=n_workers) as combination_executor:
+                futures = [
+                    combination_executor.submit(extract_combination, subreddit_name, query, sort, comment_executor, partition_executor)
+                    for subreddit_name, query, sort in extraction_combinations
+                ]
+                for future in as_completed(futures):
+                    future.result()
+    finally:
+        # Also on errors, so the expansion threads never outlive the run
+        if expansion_executor is not None:
+            expansion_executor.shutdown()
+
+    if manifest is not None:
+        manifest.finish()
         
-        # Pause to respect API rate limits
-        time.sleep(1.2)
-        
+    if known_posts is not None:
+        logging.info(f"Incremental mode: {n_unchanged_posts} unchanged posts got a metrics-only update (comment tree not fetched).")
     logging.info(f"Data extraction completed. Total unique posts: {len(post_ids_seen)}. Total unique comments: {len(comment_ids_seen)}.")
-    return post_data_list, comment_data_list
\ No newline at end of file
+    return post_sink, comment_sink
+
+
+# --- METRICS REFRESH ---
+
+def run_metrics_refresh(reddit, post_ids, comment_ids, post_metrics_writer, comment_metrics_writer,
+                        batch_size=100, n_workers=1):
+    """
+    Re-queries the engagement metrics of already extracted posts and comments, without crawling again.
+    IDs are looked up in batches of `batch_size` fullnames per API call (`reddit.info`, max 100), and one
+    timestamped metrics row per item is appended to the writers (POST_METRICS_SCHEMA / COMMENT_METRICS_SCHEMA).
+    Items that no longer exist are simply missing from the snapshot.
+    """
+    extraction_time_utc = dt.datetime.now(dt.timezone.utc).isoformat()
+    fullnames = [f"t3_{post_id}" for post_id in sorted(post_ids)] + [f"t1_{comment_id}" for comment_id in sorted(comment_ids)]
+    batches = [fullnames[i:i + batch_size] for i in range(0, len(fullnames), batch_size)]
+    logging.info(f"Refreshing metrics of {len(post_ids)} posts and {len(comment_ids)} comments in {len(batches)} API calls.")
+
+    def refresh_batch(batch):
+        try:
+            for item in reddit.info(fullnames=batch):
+                if isinstance(item, praw.models.Submission):
+                    post_metrics_writer.append(_build_post_metrics_record(item, extraction_time_utc))
+                else:
+                    comment_metrics_writer.append(_build_comment_metrics_record(item, extraction_time_utc))
+        except Exception as e:
+            logging.error(f"❌ Error refreshing metrics for a batch of {len(batch)} items ({batch[0]}...): {e}")
+
+    if n_workers <= 1:
+        for batch in batches:
+            refresh_batch(batch)
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(refresh_batch, batches))
+
+    logging.info(f"Metrics refresh completed. Posts: {len(post_metrics_writer)} | Comments: {len(comment_metrics_writer)}.")
+    return post_metrics_writer, comment_metrics_writer
@@ -0,0 +1,403 @@
+# data_processing_utils.py
+
+import os
+import json
+import shutil
+import logging
+import datetime as dt
+import polars as pl
+
+from src.data_extraction_uitls import list_raw_files, parse_hive_partitions
+from src.token_utils import n_tokens_expr
+
+# Values marking a comment/post text as missing
+NOISE_VALUES = ["", "[deleted]", "[removed]"]
+
+# Processed dataset: a directory with a posts and a comments table, one partition per bucket:
+# <processed_data>/02_processed_data/02_processed_{posts,comments}_bucket<NNNNN>.parquet
+PROCESSED_DATASET_NAME = '02_processed_data'
+PROCESSED_TABLES = ['posts', 'comments']
+# Bumped when the dataset layout changes, so the next run rebuilds it
+# (1: denormalized, 2: posts/comments tables, 3: token counts)
+PROCESSED_LAYOUT_VERSION = 3
+PROCESSED_MANIFEST_NAME = '02_processed_manifest.json'
+# Deduplicated RAW posts/comments (see DedupStore): <processed_data>/02_dedup/{posts,comments}/
+DEDUP_DIR_NAME = '02_dedup'
+
+# --- RAW DATA SCANNING (PARTITION PRUNING) ---
+
+def select_raw_files(raw_data_dir, file_prefix, extraction_date_from=None, extraction_date_to=None, subreddits=None):
+    """
+    Lists the RAW Parquet files of one kind (`file_prefix`: 'posts' or 'comments') and prunes them by their hive
+    partitions, from the path alone (no file is opened): extraction_date within [`extraction_date_from`,
+    `extraction_date_to`] (ISO dates, inclusive) and subreddit in `subreddits` (case-insensitive).
+    Legacy flat files carry no partition values: they are kept only when no filter is set.
+    """
+    subreddits = {subreddit.lower() for subreddit in subreddits} if subreddits else None
+    selected = []
+    for file_path in list_raw_files(raw_data_dir, file_prefix):
+        partitions = parse_hive_partitions(file_path, raw_data_dir)
+        extraction_date = partitions.get('extraction_date')
+        if (extraction_date_from or extraction_date_to) and extraction_date is None:
+            continue
+        if extraction_date_from and extraction_date < extraction_date_from:
+            continue
+        if extraction_date_to and extraction_date > extraction_date_to:
+            continue
+        if subreddits is not None and partitions.get('subreddit', '').lower() not in subreddits:
+            continue
+        selected.append(file_path)
+    return selected
+
+
+def scan_raw_files(file_paths):
+    """
+    Lazily scans RAW part files into a single LazyFrame. Files are combined diagonally, so files written
+    before a column existed (e.g. author IDs, reply structure) get nulls for it instead of failing the scan.
+    Only Parquet metadata is read here; data is read by the streaming engine when the query runs.
+    """
+    return pl.concat([pl.scan_parquet(file_path) for file_path in file_paths], how='diagonal_relaxed')
+
+# --- LAZY PROCESSING PIPELINE ---
+
+def build_processed_tables(posts, comments, author_data=None, token_counts=False):
+    """
+    Builds stage 02 as two lazy queries (nothing is materialized until they are sunk/collected), normalized so
+    that every post text is stored once, however many comments it has:
+      - posts: the posts whose title or body is not noise.
+      - comments: the comments with a non-empty/[deleted]/[removed] body whose post is kept, without post columns.
+    Author data (karma, account age, status, see 01d) is optionally LEFT JOINed onto post and comment authors.
+    With `token_counts`, token counts of the LLM input fields (post_title/post_body/comment_body_n_tokens, see
+    token_utils) are added, to size LLM runs without tokenizing again; this needs the tokenizer's encoding (downloaded
+    on first use) and runs a Python step per batch. Without them, stages 03c/04c count the tokens of the records they
+    send. The 'text_content' LLM input is not stored: see assemble_text_content.
+    """
+    # Filter 1: Remove posts where both title and body are noise (robustness check).
+    posts = posts.filter(~(pl.col('post_title').is_in(NOISE_VALUES) & pl.col('post_body').is_in(NOISE_VALUES)))
+
+    # Filter 2: Remove comments whose comment_body is empty, [deleted], or [removed] (noise).
+    comments = comments.filter(~pl.col('comment_body').is_in(NOISE_VALUES))
+
+    # Filter 3: Keep only comments whose post is kept (context for every comment).
+    comments = comments.join(posts.select('post_id'), on='post_id', how='semi')
+
+    # Token counts of the LLM input fields (optional)
+    if token_counts:
+        posts = posts.with_columns(n_tokens_expr('post_title'), n_tokens_expr('post_body'))
+        comments = comments.with_columns(n_tokens_expr('comment_body'))
+
+    # Both tables carry an extraction_time: the post's keeps the name, the comment's is prefixed
+    if 'extraction_time' in comments.collect_schema().names():
+        comments = comments.rename({'extraction_time': 'comment_extraction_time'})
+
+    # Author enrichment
+    if author_data is not None:
+        author_data = author_data.drop('author_name')
+        tables = {'post': posts, 'comment': comments}
+        for prefix, table in tables.items():
+            if f'{prefix}_author_id' not in table.collect_schema().names():
+                continue
+            tables[prefix] = table.join(
+                author_data.rename({c: f'{prefix}_{c}' for c in author_data.collect_schema().names()}),
+                on=f'{prefix}_author_id',
+                how='left'
+            )
+        posts, comments = tables['post'], tables['comment']
+
+    return posts, comments
+
+
+def assemble_text_content(comments, posts):
+    """
+    Adds the post title/body of every comment and the unified 'text_content' LLM input (post title + post body +
+    comment body) to `comments`, e.g. a batch about to be sent to the LLM. Rows keep their order.
+    `posts` may be a DataFrame or a LazyFrame (e.g. scan_processed_table): then only the posts of `comments` are read.
+    """
+    post_text = posts.select('post_id', 'post_title', 'post_body')
+    if isinstance(comments, pl.DataFrame) and isinstance(post_text, pl.LazyFrame):
+        post_text = post_text.filter(pl.col('post_id').is_in(comments['post_id'].unique().implode())).collect()
+    comments = comments.drop([c for c in ['post_title', 'post_body', 'text_content'] if c in comments.collect_schema().names()])
+
+    # Ensure post fields handle nulls/empties safely with .fill_null("").
+    return comments.join(post_text, on='post_id', how='left', maintain_order='left').with_columns((
+        'Post Title:' + '\n\n' +
+        pl.col('post_title').fill_null("") + '\n\n' +
+        'Post Body:' + '\n\n' +
+        pl.col('post_body').fill_null("") + '\n\n' +
+        'Comment Body:' + '\n\n' +
+        pl.col('comment_body')
+    ).alias('text_content'))
+
+# --- LATEST-WINS DEDUPLICATION (HASH-PARTITIONED, OUT-OF-CORE) ---
+
+# Every RAW row is identified by its key; repeated extractions store one snapshot per extraction_time
+DEDUP_KEYS = {'posts': 'post_id', 'comments': 'comment_id'}
+
+# Posts AND comments are bucketed by post_id, so a comments bucket only joins with the posts bucket of the same number
+BUCKET_KEY = 'post_id'
+
+
+def bucket_expr(n_buckets):
+    """
+    Bucket of every row: its post_id (a Reddit base-36 ID) as an integer, modulo `n_buckets`.
+    Unlike Expr.hash(), it is stable across Polars versions, so rows keep their bucket between runs.
+    IDs that are not base-36 go to bucket 0.
+    """
+    return (pl.col(BUCKET_KEY).str.to_integer(base=36, strict=False).fill_null(0) % n_buckets).cast(pl.UInt32)
+
+
+def keep_latest(data, key):
+    """
+    Keeps the latest extraction_time snapshot of every `key` (ISO-8601 UTC strings sort chronologically).
+    Rows without an extraction_time (files written before it was captured) lose against any timestamped row.
+    Ties keep the row that comes last in `data`.
+    """
+    return data.sort('extraction_time', nulls_last=False, maintain_order=True).unique(subset=key, keep='last', maintain_order=False)
+
+
+class DedupStore:
+    """
+    Deduplicated copy of one kind of RAW data ('posts' or 'comments'), stored at `<store_dir>/<kind>_bucket00000.parquet`,
+    `..._bucket00001.parquet`, ...: one file per bucket (see bucket_expr) holding the latest snapshot of every ID of
+    the bucket, plus a JSON manifest (`<kind>_manifest.json`) of the RAW files already merged.
+
+    New RAW files are merged out-of-core, in two passes: their rows are split by bucket into staging files,
+    `files_per_group` RAW files at a time; then every touched bucket is read with its staged rows, deduplicated
+    and rewritten. Peak memory is one group of RAW files or one bucket, never the whole history.
+    """
+
+    def __init__(self, store_dir, kind, n_buckets=64):
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.kind = kind
+        self.key = DEDUP_KEYS[kind]
+        self.manifest_path = os.path.join(store_dir, f'{kind}_manifest.json')
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {'n_buckets': n_buckets, 'merged_files': []}
+        if self.data['n_buckets'] != n_buckets:
+            raise ValueError(f"{store_dir} was built with {self.data['n_buckets']} buckets, not {n_buckets}: rebuild it from scratch.")
+        self.n_buckets = n_buckets
+        self.merged_files = set(self.data['merged_files'])
+
+    def bucket_path(self, bucket):
+        return os.path.join(self.store_dir, f"{self.kind}_bucket{bucket:05d}.parquet")
+
+    def merge(self, file_paths, files_per_group=50):
+        """Merges the RAW files of `file_paths` not merged yet. Returns the set of buckets rewritten."""
+        new_files = [p for p in file_paths if os.path.basename(p) not in self.merged_files]
+        if not new_files:
+            return set()
+
+        # Pass 1: split the new rows by bucket (leftovers of a crashed merge are discarded first)
+        staging_dir = os.path.join(self.store_dir, '_staging')
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        staged = {}
+        for group_number, i in enumerate(range(0, len(new_files), files_per_group)):
+            rows = scan_raw_files(new_files[i:i + files_per_group])
+            if 'extraction_time' not in rows.collect_schema().names():
+                rows = rows.with_columns(pl.lit(None, dtype=pl.Utf8).alias('extraction_time'))
+            rows = rows.with_columns(bucket_expr(self.n_buckets).alias('_bucket')).collect()
+            for (bucket,), bucket_rows in rows.partition_by('_bucket', as_dict=True, include_key=False).items():
+                staging_path = os.path.join(staging_dir, f"{bucket:05d}_{group_number:05d}.parquet")
+                bucket_rows.write_parquet(staging_path)
+                staged.setdefault(bucket, []).append(staging_path)
+
+        # Pass 2: deduplicate every touched bucket together with its staged rows
+        for bucket, staging_paths in sorted(staged.items()):
+            bucket_path = self.bucket_path(bucket)
+            parts = [pl.scan_parquet(p) for p in staging_paths]
+            if os.path.exists(bucket_path):
+                parts.insert(0, pl.scan_parquet(bucket_path))
+            merged = keep_latest(pl.concat(parts, how='diagonal_relaxed'), self.key).collect()
+            tmp_path = bucket_path + '.tmp'
+            merged.write_parquet(tmp_path)
+            os.replace(tmp_path, bucket_path)
+        shutil.rmtree(staging_dir)
+
+        # Files are recorded only once every bucket is rewritten. Merging the same rows twice changes nothing
+        # (latest-wins is idempotent), so after a crash the files are simply merged again.
+        self.merged_files.update(os.path.basename(p) for p in new_files)
+        self.data['merged_files'] = sorted(self.merged_files)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+        logging.info(f"✂️ Deduplicated {self.kind}: {len(new_files)} RAW files merged into {len(staged)} buckets.")
+        return set(staged)
+
+    def scan(self, bucket):
+        """Lazily scans one bucket. Returns None if the bucket holds no rows."""
+        bucket_path = self.bucket_path(bucket)
+        return pl.scan_parquet(bucket_path) if os.path.exists(bucket_path) else None
+
+# --- PROCESSED-FILE MANIFEST (INCREMENTAL MODE) ---
+
+class ProcessedFileManifest:
+    """
+    JSON manifest of stage 02, stored at `<processed_data>/02_processed_manifest.json`.
+    Records the layout and number of buckets of the dataset and every RAW posts/comments file already processed, with,
+    per run, the buckets rewritten, so an incremental run only processes files that arrived since the last one.
+    """
+
+    def __init__(self, path, n_buckets=None):
+        self.path = path
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {'layout_version': PROCESSED_LAYOUT_VERSION, 'n_buckets': n_buckets, 'runs': []}
+        self.processed_files = {
+            name for run in self.data['runs'] for name in run.get('post_files', []) + run['comment_files']
+        }
+
+    def matches(self, n_buckets):
+        """True if the dataset was built with the current layout and `n_buckets` buckets."""
+        return self.data.get('layout_version') == PROCESSED_LAYOUT_VERSION and self.data.get('n_buckets') == n_buckets
+
+    def is_processed(self, file_path):
+        return os.path.basename(file_path) in self.processed_files
+
+    def record_run(self, run_id, post_files, comment_files, buckets, n_rows):
+        post_names = [os.path.basename(p) for p in post_files]
+        comment_names = [os.path.basename(p) for p in comment_files]
+        self.processed_files.update(post_names + comment_names)
+        self.data['runs'].append({
+            'run_id': run_id,
+            'post_files': post_names,
+            'comment_files': comment_names,
+            'buckets': sorted(buckets),
+            'n_rows': n_rows,
+            'completed_at': dt.datetime.now(dt.timezone.utc).isoformat(),
+        })
+        self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+# --- STAGE 02 DRIVER ---
+
+def run_processing(raw_data_dir, processed_data_dir, author_data_path=None, incremental=True, n_buckets=64,
+                   extraction_date_from=None, extraction_date_to=None, subreddits=None, token_counts=False):
+    """
+    Stage 02 end to end:
+      1. Prunes the RAW files by partition and merges the new ones into the posts/comments DedupStores
+         (`<processed_data_dir>/02_dedup/`), keeping the latest extraction_time snapshot of every post/comment.
+      2. Rebuilds the processed partitions of every bucket touched by the new files,
+         `<processed_data_dir>/02_processed_data/02_processed_{posts,comments}_bucket<NNNNN>.parquet`: the lazy
+         queries of build_processed_tables over one comments bucket and the posts bucket of the same number,
+         sunk with the streaming engine (with the token count columns if `token_counts`).
+
+    Incremental mode: only RAW files not listed in the ProcessedFileManifest are merged and only the buckets
+    they touch are rebuilt, so runtime follows the new data rather than the whole history. Since a bucket is
+    rebuilt from its deduplicated rows, a new post snapshot also refreshes the rows of its older comments.
+    With `incremental=False` (or if the layout or number of buckets changed), everything is rebuilt from scratch.
+    RAW files are assumed complete: do not run stage 02 while an extraction is still writing.
+    Returns False on error, True otherwise (including when there is nothing new).
+    """
+    dataset_dir = os.path.join(processed_data_dir, PROCESSED_DATASET_NAME)
+    dedup_dir = os.path.join(processed_data_dir, DEDUP_DIR_NAME)
+    manifest_path = os.path.join(processed_data_dir, PROCESSED_MANIFEST_NAME)
+    if incremental and os.path.exists(manifest_path) and not ProcessedFileManifest(manifest_path).matches(n_buckets):
+        logging.warning(f"⚠️ The processed dataset was built with another layout or number of buckets: rebuilding it from scratch.")
+        incremental = False
+    if not incremental:
+        logging.info("🔄 Full rebuild: removing the processed dataset, the dedup stores and the manifest.")
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+        shutil.rmtree(dedup_dir, ignore_errors=True)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+    os.makedirs(dataset_dir, exist_ok=True)
+    manifest = ProcessedFileManifest(manifest_path, n_buckets)
+
+    filters = dict(extraction_date_from=extraction_date_from, extraction_date_to=extraction_date_to, subreddits=subreddits)
+    post_files = select_raw_files(raw_data_dir, 'posts', **filters)
+    comment_files = select_raw_files(raw_data_dir, 'comments', **filters)
+    new_post_files = [p for p in post_files if not manifest.is_processed(p)]
+    new_comment_files = [p for p in comment_files if not manifest.is_processed(p)]
+    logging.info(f"RAW files selected: {len(post_files)} posts ({len(new_post_files)} new) | "
+                 f"{len(comment_files)} comments ({len(new_comment_files)} new).")
+    if not post_files or not comment_files:
+        logging.error("❌ No RAW posts/comments files to process.")
+        return False
+    if not new_post_files and not new_comment_files:
+        logging.info("✅ No new RAW files since the last run. Nothing to process.")
+        return True
+
+    # 1. Latest-wins deduplication
+    post_store = DedupStore(os.path.join(dedup_dir, 'posts'), 'posts', n_buckets)
+    comment_store = DedupStore(os.path.join(dedup_dir, 'comments'), 'comments', n_buckets)
+    post_store.merge(new_post_files)
+    comment_store.merge(new_comment_files)
+
+    # Buckets touched by the new files (from their post_id column alone, so this also holds after a crashed run)
+    new_files = new_post_files + new_comment_files
+    buckets = scan_raw_files(new_files).select(bucket_expr(n_buckets).unique()).collect().to_series().to_list()
+
+    # 2. Processing of the touched buckets
+    author_data = None
+    if author_data_path is not None and os.path.exists(author_data_path):
+        logging.info("Joining author data...")
+        author_data = pl.scan_parquet(author_data_path)
+    else:
+        logging.info("No author data found (run 01d_enrich_authors.py to add it). Skipping author join.")
+
+    n_rows = 0
+    for bucket in sorted(buckets):
+        posts, comments = post_store.scan(bucket), comment_store.scan(bucket)
+        if posts is None or comments is None:
+            continue
+        tables = dict(zip(PROCESSED_TABLES, build_processed_tables(posts, comments, author_data, token_counts)))
+        for table, processed_table in tables.items():
+            output_path = processed_table_path(dataset_dir, table, bucket)
+            # Write to a temporary file and rename, so a crash never leaves a truncated partition behind
+            tmp_path = output_path + '.tmp'
+            processed_table.sink_parquet(tmp_path)
+            os.replace(tmp_path, output_path)
+        n_rows += pl.scan_parquet(processed_table_path(dataset_dir, 'comments', bucket)).select(pl.len()).collect().item()
+
+    run_id = dt.datetime.now().strftime('%Y%m%d%H%M%S')
+    manifest.record_run(run_id, new_post_files, new_comment_files, buckets, n_rows)
+    logging.info(f"📁 {len(buckets)} processed buckets rebuilt in {dataset_dir} ({n_rows} comments).")
+    return True
+
+# --- PROCESSED DATA LOADING ---
+
+def processed_table_path(dataset_dir, table, bucket):
+    return os.path.join(dataset_dir, f"02_processed_{table}_bucket{bucket:05d}.parquet")
+
+
+def scan_processed_table(processed_data_dir, table):
+    """
+    Lazily scans every partition of one processed table ('posts' or 'comments', see build_processed_tables).
+    Partitions are combined diagonally, since partitions written by older runs may lack newer columns.
+    Every post/comment lives in exactly one partition, so a table holds one row per post_id/comment_id.
+    """
+    dataset_dir = os.path.join(processed_data_dir, PROCESSED_DATASET_NAME)
+    prefix = f"02_processed_{table}_bucket"
+    partition_paths = sorted(
+        os.path.join(dataset_dir, name) for name in os.listdir(dataset_dir) if name.startswith(prefix) and name.endswith('.parquet')
+    ) if os.path.isdir(dataset_dir) else []
+    if not partition_paths:
+        raise FileNotFoundError(f"No processed {table} partitions in {dataset_dir} (run 02_process_raw_data.py).")
+    return pl.concat([pl.scan_parquet(p) for p in partition_paths], how='diagonal_relaxed')
+
+
+def scan_processed_data(processed_data_dir, with_text_content=False):
+    """
+    Denormalized view of the processed dataset: every processed comment with the columns of its post (and,
+    optionally, 'text_content'). The view is lazy: select the columns and rows needed before collecting, since
+    collecting it whole repeats the post text once per comment.
+    """
+    comments = scan_processed_table(processed_data_dir, 'comments')
+    posts = scan_processed_table(processed_data_dir, 'posts')
+    if with_text_content:
+        return assemble_text_content(comments, posts).join(posts.drop('post_title', 'post_body'), on='post_id', how='left')
+    return comments.join(posts, on='post_id', how='left')
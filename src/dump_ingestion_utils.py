@@ -0,0 +1,198 @@
+# dump_ingestion_utils.py
+
+import io
+import os
+import json
+import logging
+import datetime as dt
+import zstandard
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.data_extraction_uitls import ParquetPartWriter, POST_SCHEMA, COMMENT_SCHEMA, extraction_date_from_id
+from src.search_query_utils import compile_query_matcher
+
+# --- DUMP READING ---
+
+def classify_dump_file(file_name):
+    """Returns 'submissions', 'comments' or None for a Reddit dump file name (RS_*/RC_* or *_submissions/*_comments)."""
+    if not file_name.endswith('.zst'):
+        return None
+    if file_name.startswith('RS_') or 'submissions' in file_name:
+        return 'submissions'
+    if file_name.startswith('RC_') or 'comments' in file_name:
+        return 'comments'
+    return None
+
+
+def iter_dump_records(file_path):
+    """Streams the JSON objects of a zstd-compressed NDJSON dump file, one line at a time."""
+    with open(file_path, 'rb') as f:
+        # Dumps are compressed with a long window, which must be allowed explicitly
+        reader = zstandard.ZstdDecompressor(max_window_size=2**31).stream_reader(f)
+        for line in io.TextIOWrapper(reader, encoding='utf-8', errors='ignore'):
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+# --- HELPER FUNCTIONS: RECORD BUILDERS ---
+# Same row layout as the PRAW extraction (POST_SCHEMA / COMMENT_SCHEMA tuples), so stage 02 onward is unchanged.
+
+def _author_fields(item):
+    """(author fullname, author name), with deleted authors as (None, None) like in the PRAW extraction."""
+    author = item.get('author')
+    if author in (None, '[deleted]'):
+        return None, None
+    return item.get('author_fullname'), author
+
+
+def _build_post_record_from_dump(submission, query, extraction_time_utc):
+    created_utc = float(submission['created_utc'])
+    author_id, author_name = _author_fields(submission)
+    return (
+        # Identifiers
+        submission['id'],                           # post_id
+        submission.get('subreddit'),                # post_subreddit
+        # Text Content
+        submission.get('title'),                    # post_title
+        submission.get('selftext'),                 # post_body
+        submission.get('url'),                      # post_url
+        # Post Metrics
+        submission.get('score'),                    # post_score
+        submission.get('upvote_ratio'),             # post_upvote_ratio
+        submission.get('num_comments'),             # post_num_comments
+        submission.get('num_crossposts'),           # post_num_crossposts
+        submission.get('total_awards_received'),    # post_total_awards
+        submission.get('is_self'),                  # post_is_self
+        submission.get('over_18'),                  # post_is_over_18
+        submission.get('stickied'),                 # post_is_stickied
+        submission.get('locked'),                   # post_is_locked
+        submission.get('subreddit_subscribers'),    # post_subreddit_subscribers
+        submission.get('domain'),                   # post_domain
+        submission.get('link_flair_text') or None,  # post_flair
+        # Author Data
+        author_id,                                  # post_author_id
+        author_name,                                # post_author_name
+        # Timestamps
+        created_utc,                                # post_created_utc
+        # Traceability Metadata
+        query,                                      # extraction_query
+        'dump',                                     # extraction_sort
+        extraction_time_utc,                        # extraction_time
+    )
+
+
+def _build_comment_record_from_dump(comment, extraction_time_utc):
+    created_utc = float(comment['created_utc'])
+    author_id, author_name = _author_fields(comment)
+    return (
+        # Identifiers
+        comment['id'],                              # comment_id
+        comment['link_id'].split('_', 1)[-1],       # post_id
+        comment.get('subreddit'),                   # comment_subreddit
+        # Text Content
+        comment.get('body'),                        # comment_body
+        # Comment Metrics
+        comment.get('score'),                       # comment_score
+        comment.get('score_hidden', False),         # comment_score_hidden
+        # Author Data
+        author_id,                                  # comment_author_id
+        author_name,                                # comment_author_name
+        # Reply Structure (dumps carry no depth)
+        comment.get('parent_id'),                   # comment_parent_id
+        None,                                       # comment_depth
+        # Timestamps
+        created_utc,                                # comment_created_utc
+        # Extraction Metadata
+        extraction_time_utc,                        # extraction_time
+    )
+
+# --- WORKER FUNCTIONS (run in the process pool) ---
+
+def _ingest_submissions_file(file_path, output_dir, file_prefix, subreddits, queries, extraction_time_utc, extraction_date, batch_size):
+    """Filters one submissions dump by subreddit and query. Returns (matched post IDs, part files written)."""
+    matchers = [(query, compile_query_matcher(query)) for query in queries]
+    writer = ParquetPartWriter(output_dir, file_prefix, POST_SCHEMA, batch_size,
+                               partitions={'extraction_date': extraction_date}, partition_by={'subreddit': 'post_subreddit'})
+    matched_post_ids = set()
+
+    for submission in iter_dump_records(file_path):
+        if str(submission.get('subreddit', '')).lower() not in subreddits:
+            continue
+        text = f"{submission.get('title') or ''}\n{submission.get('selftext') or ''}"
+        query = next((q for q, matches in matchers if matches(text)), None)
+        if query is None or submission['id'] in matched_post_ids:
+            continue
+        writer.append(_build_post_record_from_dump(submission, query, extraction_time_utc))
+        matched_post_ids.add(submission['id'])
+
+    return matched_post_ids, writer.close()
+
+
+def _ingest_comments_file(file_path, output_dir, file_prefix, subreddits, post_ids, extraction_time_utc, extraction_date, batch_size):
+    """Keeps the comments of one comments dump that belong to a matched post. Returns the part files written."""
+    writer = ParquetPartWriter(output_dir, file_prefix, COMMENT_SCHEMA, batch_size,
+                               partitions={'extraction_date': extraction_date}, partition_by={'subreddit': 'comment_subreddit'})
+
+    for comment in iter_dump_records(file_path):
+        if str(comment.get('subreddit', '')).lower() not in subreddits:
+            continue
+        if comment.get('link_id', '').split('_', 1)[-1] not in post_ids:
+            continue
+        writer.append(_build_comment_record_from_dump(comment, extraction_time_utc))
+
+    return writer.close()
+
+# --- CORE INGESTION FUNCTION ---
+
+def run_dump_ingestion(dump_dir, output_dir, data_extraction_id, subreddits, queries, n_processes=4, batch_size=5000):
+    """
+    Ingests local Reddit dumps (zstd-compressed NDJSON) as an alternative to the PRAW extraction.
+
+    1. Submissions dumps are decompressed, parsed and filtered (subreddit in `subreddits` and a local evaluation of
+       `queries` on title + body) in a process pool, one file per task.
+    2. Comments dumps are then filtered the same way, keeping only comments of the posts matched in step 1.
+
+    Each task streams its records to its own Parquet part files in `output_dir`, using the RAW schemas, the
+    `posts_data_raw_<id>_*` / `comments_data_raw_<id>_*` file names and the extraction_date/subreddit hive
+    partitions, so stage 02 reads them like any other extraction.
+    """
+    extraction_time_utc = dt.datetime.now(dt.timezone.utc).isoformat()
+    extraction_date = extraction_date_from_id(data_extraction_id)
+    subreddits = {subreddit.lower() for subreddit in subreddits}
+
+    dump_files = sorted(os.listdir(dump_dir))
+    submission_files = [f for f in dump_files if classify_dump_file(f) == 'submissions']
+    comment_files = [f for f in dump_files if classify_dump_file(f) == 'comments']
+    logging.info(f"Dump files found: {len(submission_files)} submissions | {len(comment_files)} comments.")
+
+    post_ids, n_post_parts, n_comment_parts = set(), 0, 0
+
+    with ProcessPoolExecutor(max_workers=n_processes) as executor:
+
+        # 1. Submissions
+        futures = {
+            executor.submit(_ingest_submissions_file, os.path.join(dump_dir, file_name), output_dir,
+                            f"posts_data_raw_{data_extraction_id}_{file_name.split('.')[0]}",
+                            subreddits, queries, extraction_time_utc, extraction_date, batch_size): file_name
+            for file_name in submission_files
+        }
+        for future in as_completed(futures):
+            matched_post_ids, part_paths = future.result()
+            post_ids |= matched_post_ids
+            n_post_parts += len(part_paths)
+            logging.info(f"✅ {futures[future]}: {len(matched_post_ids)} matching posts.")
+
+        # 2. Comments of the matched posts
+        futures = {
+            executor.submit(_ingest_comments_file, os.path.join(dump_dir, file_name), output_dir,
+                            f"comments_data_raw_{data_extraction_id}_{file_name.split('.')[0]}",
+                            subreddits, post_ids, extraction_time_utc, extraction_date, batch_size): file_name
+            for file_name in comment_files
+        }
+        for future in as_completed(futures):
+            n_comment_parts += len(future.result())
+            logging.info(f"✅ {futures[future]}: comments filtered.")
+
+    logging.info(f"Dump ingestion completed. Posts: {len(post_ids)} ({n_post_parts} part files) | Comment part files: {n_comment_parts}.")
+    return post_ids
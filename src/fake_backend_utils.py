@@ -0,0 +1,415 @@
+# fake_backend_utils.py
+
+import re
+import json
+import zlib
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from requests.structures import CaseInsensitiveDict
+
+# ==============================================================================
+# FAKE REDDIT BACKEND
+# ==============================================================================
+# Stand-in for `requests.Session` that prawcore can use (through the `session` requestor kwarg, see
+# data_extraction_uitls.authenticate_praw). It answers the endpoints used by the extraction
+# (OAuth token, subreddit search, comment trees, morechildren, info) with deterministic synthetic data,
+# or with recorded responses, and simulates latency, rate-limit headers and transient errors.
+# No credentials or network access are needed.
+
+class FakeResponse:
+    """Minimal `requests.Response` look-alike, as consumed by prawcore."""
+
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.reason = 'OK' if status_code == 200 else 'Fake Error'
+        self.text = json.dumps(payload) if payload is not None else ''
+        self.content = self.text.encode('utf-8')
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.headers['content-length'] = str(len(self.content))
+        self._payload = payload
+
+    def json(self):
+        if self._payload is None:
+            raise ValueError("No JSON payload.")
+        return self._payload
+
+
+class FakeRedditSession:
+    """
+    Fake `requests.Session` serving synthetic Reddit data.
+
+    Data shape: each subreddit has a pool of `posts_per_subreddit` posts; every search returns
+    `posts_per_search` of them (capped at 1000, like real listings), so different queries overlap.
+    Each post has `comments_per_post` visible comments (every third one with a reply) and a
+    MoreComments stub hiding `hidden_comments_per_post` more.
+
+    Simulation: `latency_seconds` (+ up to `latency_jitter` seconds) per request; a rate-limit window of
+    `rate_limit_per_window` requests per `rate_limit_window_seconds` reported through X-Ratelimit-* headers
+    (429 once exceeded; None = unlimited); `error_rate` probability of a transient 500/503 per request.
+
+    `recorded_responses` maps URL paths (e.g. '/r/politics/search') to JSON payloads returned as-is instead
+    of synthetic data, for replaying captured responses.
+    """
+
+    def __init__(self, posts_per_subreddit=2000, posts_per_search=100, comments_per_post=20, hidden_comments_per_post=10,
+                 latency_seconds=0.0, latency_jitter=0.0, rate_limit_per_window=None, rate_limit_window_seconds=600,
+                 error_rate=0.0, recorded_responses=None, seed=0):
+        self.headers = {}
+        self.posts_per_subreddit = posts_per_subreddit
+        self.posts_per_search = min(posts_per_search, 1000)
+        self.comments_per_post = comments_per_post
+        self.hidden_comments_per_post = hidden_comments_per_post
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.rate_limit_per_window = rate_limit_per_window
+        self.rate_limit_window_seconds = rate_limit_window_seconds
+        self.error_rate = error_rate
+        self.recorded_responses = recorded_responses or {}
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.window_started_at = time.monotonic()
+        self.window_used = 0
+        self.n_requests = 0
+        self.n_errors = 0
+        self.requests_by_endpoint = {}
+        self.post_subreddits = {}
+
+    # --- requests.Session interface ---
+
+    def request(self, method, url, params=None, data=None, timeout=None, **kwargs):
+        path = urlparse(url).path.rstrip('/') or '/'
+        params = dict(params or {})
+        data = dict(data or {})
+
+        with self.lock:
+            self.n_requests += 1
+            endpoint = self._endpoint_name(path)
+            self.requests_by_endpoint[endpoint] = self.requests_by_endpoint.get(endpoint, 0) + 1
+            rate_limit_headers, rate_limited = self._consume_rate_limit()
+            injected_error = self.random.random() < self.error_rate
+            latency = self.latency_seconds + self.random.random() * self.latency_jitter
+
+        if latency:
+            time.sleep(latency)
+
+        if rate_limited:
+            with self.lock:
+                self.n_errors += 1
+            return FakeResponse(429, {'message': 'Too Many Requests', 'error': 429},
+                                {**rate_limit_headers, 'retry-after': rate_limit_headers['x-ratelimit-reset']})
+        if injected_error:
+            with self.lock:
+                self.n_errors += 1
+            status_code = self.random.choice([500, 503])
+            return FakeResponse(status_code, {'message': 'Injected error', 'error': status_code}, rate_limit_headers)
+
+        return FakeResponse(200, self._route(method.upper(), path, params, data), rate_limit_headers)
+
+    def close(self):
+        pass
+
+    # --- Simulation helpers ---
+
+    @staticmethod
+    def _endpoint_name(path):
+        if path.endswith('/access_token'):
+            return 'access_token'
+        if path.endswith('/search'):
+            return 'search'
+        if path.startswith('/comments/'):
+            return 'comments'
+        return path.rsplit('/', 1)[-1]
+
+    def _consume_rate_limit(self):
+        """Updates the fake quota window. Returns (X-Ratelimit-* headers, whether the request is rejected)."""
+        if self.rate_limit_per_window is None:
+            # Unlimited: no quota headers, so clients keep their own pacing
+            return {}, False
+
+        elapsed = time.monotonic() - self.window_started_at
+        if elapsed >= self.rate_limit_window_seconds:
+            self.window_started_at, self.window_used, elapsed = time.monotonic(), 0, 0.0
+        self.window_used += 1
+        remaining = max(self.rate_limit_per_window - self.window_used, 0)
+        headers = {
+            'x-ratelimit-remaining': f"{float(remaining)}",
+            'x-ratelimit-used': str(self.window_used),
+            'x-ratelimit-reset': str(int(self.rate_limit_window_seconds - elapsed)),
+        }
+        return headers, self.window_used > self.rate_limit_per_window
+
+    # --- Routing ---
+
+    def _route(self, method, path, params, data):
+        if path in self.recorded_responses:
+            return self.recorded_responses[path]
+        if path.endswith('/access_token'):
+            return {'access_token': 'fake-token', 'token_type': 'bearer', 'expires_in': 86400, 'scope': '*'}
+        if path.endswith('/search'):
+            return self._search(path.split('/')[2], params)
+        if path.startswith('/comments/'):
+            return self._comments(path.split('/')[2])
+        if path.endswith('/morechildren'):
+            return self._more_children(data)
+        if path.endswith('/info'):
+            return self._info(params)
+        if path.endswith('/user_data_by_account_ids'):
+            return self._user_data(params)
+        return {}
+
+    def _search(self, subreddit, params):
+        """Paginated search listing over a deterministic subset of the subreddit's post pool."""
+        rng = random.Random(f"{self.seed}|{subreddit}|{params.get('q')}|{params.get('sort')}|{params.get('t')}")
+        post_indexes = rng.sample(range(self.posts_per_subreddit), min(self.posts_per_search, self.posts_per_subreddit))
+        post_ids = [self._post_id(subreddit, i) for i in post_indexes]
+
+        after = params.get('after')
+        start = post_ids.index(after.split('_', 1)[1]) + 1 if after and after.split('_', 1)[1] in post_ids else 0
+        page = post_ids[start:start + int(params.get('limit', 100))]
+        next_after = f"t3_{page[-1]}" if page and start + len(page) < len(post_ids) else None
+        return self._listing([self._post_thing(post_id, subreddit) for post_id in page], after=next_after)
+
+    def _comments(self, post_id):
+        subreddit = self.post_subreddits.get(post_id, 'unknown')
+        top_level = []
+        for i in range(self.comments_per_post):
+            comment = self._comment_thing(post_id, f"{post_id}k{i}", parent_id=f"t3_{post_id}", depth=0)
+            if i % 3 == 0:
+                reply = self._comment_thing(post_id, f"{post_id}q{i}", parent_id=f"t1_{post_id}k{i}", depth=1)
+                comment['data']['replies'] = self._listing([reply])
+            top_level.append(comment)
+        if self.hidden_comments_per_post:
+            hidden_ids = [f"{post_id}w{i}" for i in range(self.hidden_comments_per_post)]
+            top_level.append({'kind': 'more', 'data': {
+                'count': len(hidden_ids), 'children': hidden_ids, 'id': hidden_ids[0], 'name': f"t1_{hidden_ids[0]}",
+                'parent_id': f"t3_{post_id}", 'depth': 0,
+            }})
+        return [self._listing([self._post_thing(post_id, subreddit)]), self._listing(top_level)]
+
+    def _more_children(self, data):
+        post_id = data.get('link_id', '').split('_', 1)[-1]
+        children = [c for c in data.get('children', '').split(',') if c]
+        things = [self._comment_thing(post_id, c, parent_id=f"t3_{post_id}", depth=0) for c in children]
+        return {'json': {'errors': [], 'data': {'things': things}}}
+
+    def _info(self, params):
+        things = []
+        for fullname in params.get('id', '').split(','):
+            kind, _, item_id = fullname.partition('_')
+            if kind == 't3' and item_id in self.post_subreddits:
+                things.append(self._post_thing(item_id, self.post_subreddits[item_id]))
+            elif kind == 't1':
+                post_id = re.split('[kqw]', item_id)[0]
+                things.append(self._comment_thing(post_id, item_id, parent_id=f"t3_{post_id}", depth=0))
+        return self._listing(things)
+
+    def _user_data(self, params):
+        """Account summaries by fullname: every 20th account is missing (deleted), every 50th is suspended."""
+        users = {}
+        for fullname in params.get('ids', '').split(','):
+            number = int(fullname.partition('_')[2] or '0', 16)
+            if number % 20 == 0:
+                continue
+            if number % 50 == 1:
+                users[fullname] = {'name': f"user_{number}", 'is_suspended': True}
+                continue
+            rng = random.Random(f"{self.seed}|{fullname}")
+            users[fullname] = {
+                'name': f"user_{number}", 'created_utc': 1_200_000_000.0 + rng.randint(0, 500_000_000),
+                'link_karma': rng.randint(0, 100_000), 'comment_karma': rng.randint(0, 500_000),
+                'profile_img': '', 'profile_color': '', 'profile_over_18': False,
+            }
+        return users
+
+    # --- Synthetic things ---
+
+    @staticmethod
+    def _listing(children, after=None):
+        return {'kind': 'Listing', 'data': {'after': after, 'before': None, 'dist': len(children), 'children': children}}
+
+    def _post_id(self, subreddit, index):
+        # Synthetic IDs: '<hex>p<n>' for posts, then 'k'/'q'/'w' + n for comments/replies/hidden comments
+        post_id = f"{zlib.crc32(f'{self.seed}|{subreddit}'.encode()) % 16**6:x}p{index}"
+        self.post_subreddits[post_id] = subreddit
+        return post_id
+
+    def _post_thing(self, post_id, subreddit):
+        rng = random.Random(f"{self.seed}|{post_id}")
+        created_utc = 1_700_000_000.0 + rng.randint(0, 30_000_000)
+        author_number = rng.randint(0, 10_000)
+        return {'kind': 't3', 'data': {
+            'id': post_id, 'name': f"t3_{post_id}", 'subreddit': subreddit, 'subreddit_subscribers': 1_000_000,
+            'title': f"Synthetic post {post_id} about gaza", 'selftext': 'lorem ipsum ' * rng.randint(0, 200),
+            'url': f"https://www.reddit.com/r/{subreddit}/comments/{post_id}/", 'permalink': f"/r/{subreddit}/comments/{post_id}/",
+            'score': rng.randint(0, 5000), 'upvote_ratio': round(rng.random(), 2),
+            'num_comments': self.comments_per_post + self.hidden_comments_per_post, 'num_crossposts': rng.randint(0, 5),
+            'total_awards_received': 0, 'is_self': True, 'over_18': False, 'stickied': False, 'locked': False,
+            'domain': f"self.{subreddit}", 'link_flair_text': None, 'created_utc': created_utc,
+            'author': f"user_{author_number}", 'author_fullname': f"t2_{author_number:x}",
+        }}
+
+    def _comment_thing(self, post_id, comment_id, parent_id, depth):
+        rng = random.Random(f"{self.seed}|{comment_id}")
+        author_number = rng.randint(0, 10_000)
+        return {'kind': 't1', 'data': {
+            'id': comment_id, 'name': f"t1_{comment_id}", 'link_id': f"t3_{post_id}", 'parent_id': parent_id,
+            'depth': depth, 'body': 'synthetic comment ' * rng.randint(1, 50), 'score': rng.randint(-20, 500),
+            'score_hidden': False, 'created_utc': 1_700_000_000.0 + rng.randint(0, 30_000_000), 'replies': '',
+            'subreddit': self.post_subreddits.get(post_id, 'unknown'),
+            'author': f"user_{author_number}", 'author_fullname': f"t2_{author_number:x}",
+        }}
+
+# ==============================================================================
+# FAKE OPENAI BACKEND
+# ==============================================================================
+# Stand-in for the `openai.OpenAI` client used by feature generation: chat completions (interactive mode) and the
+# Files + Batches interface (batch mode, see llm_batch_utils). Batches move validating -> in_progress ->
+# finalizing -> completed over successive `batches.retrieve` polls, and their output/error files follow the
+# provider's JSONL format. No credentials or network access are needed.
+
+class _Namespace:
+    """Attribute access over keyword arguments, like the response objects of the OpenAI client."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeOpenAIClient:
+    """
+    Fake `openai.OpenAI` client answering every request with a JSON reply.
+
+    Replies: `reply_fn(body, custom_id)` returns the reply content of a request body; by default a deterministic
+    `{feature_name: <integer 0-5>}` object, where `feature_name` is the constructor argument (chat) or the
+    'feature_name' metadata of the batch.
+
+    Simulation: `error_rate` probability of a failed request (a raised error in chat mode, a line of the error file
+    in batch mode); a batch needs `polls_to_complete` polls after creation to complete; batches created with
+    `expire_batches=True` end as 'expired' with only part of their requests answered.
+    """
+
+    BATCH_STATUS_FLOW = ['validating', 'in_progress', 'finalizing', 'completed']
+
+    def __init__(self, feature_name=None, reply_fn=None, error_rate=0.0, polls_to_complete=3, expire_batches=False, seed=0):
+        self.feature_name = feature_name
+        self.reply_fn = reply_fn
+        self.error_rate = error_rate
+        self.polls_to_complete = polls_to_complete
+        self.expire_batches = expire_batches
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.stored_files = {}
+        self.stored_batches = {}
+        self.n_chat_requests = 0
+        self.n_batch_requests = 0
+
+        self.chat = _Namespace(completions=_Namespace(create=self._chat_completion))
+        self.files = _Namespace(create=self._create_file, content=self._file_content)
+        self.batches = _Namespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    # --- Replies ---
+
+    def _reply(self, body, custom_id, feature_name):
+        if self.reply_fn is not None:
+            return self.reply_fn(body, custom_id)
+        rng = random.Random(f"{self.seed}|{custom_id or json.dumps(body['messages'])}")
+        return json.dumps({feature_name: rng.randint(0, 5)})
+
+    def _completion(self, content):
+        return {
+            'id': f"chatcmpl-{self.random.getrandbits(32):08x}", 'object': 'chat.completion',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        }
+
+    # --- Chat completions ---
+
+    def _chat_completion(self, **body):
+        with self.lock:
+            self.n_chat_requests += 1
+            failed = self.random.random() < self.error_rate
+        if failed:
+            raise RuntimeError("Injected error (fake OpenAI backend).")
+        completion = self._completion(self._reply(body, None, self.feature_name))
+        message = _Namespace(**completion['choices'][0]['message'])
+        return _Namespace(id=completion['id'], choices=[_Namespace(index=0, message=message, finish_reason='stop')])
+
+    # --- Files ---
+
+    def _create_file(self, file, purpose):
+        content = file.read()
+        content = content.decode('utf-8') if isinstance(content, bytes) else content
+        with self.lock:
+            file_id = f"file-{len(self.stored_files):06d}"
+            self.stored_files[file_id] = content
+        return _Namespace(id=file_id, purpose=purpose, bytes=len(content.encode('utf-8')))
+
+    def _file_content(self, file_id):
+        return _Namespace(text=self.stored_files[file_id])
+
+    # --- Batches ---
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata=None):
+        requests = [json.loads(line) for line in self.stored_files[input_file_id].splitlines() if line.strip()]
+        with self.lock:
+            batch_id = f"batch_{len(self.stored_batches):06d}"
+            self.stored_batches[batch_id] = {
+                'id': batch_id, 'endpoint': endpoint, 'completion_window': completion_window, 'metadata': metadata or {},
+                'input_file_id': input_file_id, 'requests': requests, 'n_polls': 0, 'status': 'validating',
+                'output_file_id': None, 'error_file_id': None, 'completed': 0, 'failed': 0,
+            }
+        return self._batch_object(batch_id)
+
+    def _retrieve_batch(self, batch_id):
+        with self.lock:
+            batch = self.stored_batches[batch_id]
+            if batch['status'] not in ('completed', 'expired'):
+                batch['n_polls'] += 1
+                step = min(batch['n_polls'] * (len(self.BATCH_STATUS_FLOW) - 1) // max(self.polls_to_complete, 1),
+                           len(self.BATCH_STATUS_FLOW) - 1)
+                batch['status'] = self.BATCH_STATUS_FLOW[step]
+                if batch['status'] == 'completed':
+                    self._run_batch(batch)
+        return self._batch_object(batch_id)
+
+    def _run_batch(self, batch):
+        """Answers the requests of a batch (half of them if it expires) and stores its output/error files."""
+        requests = batch['requests']
+        if self.expire_batches:
+            requests = requests[:len(requests) // 2]
+            batch['status'] = 'expired'
+        feature_name = batch['metadata'].get('feature_name', self.feature_name)
+        output_lines, error_lines = [], []
+        for request in requests:
+            self.n_batch_requests += 1
+            if self.random.random() < self.error_rate:
+                error_lines.append(json.dumps({
+                    'id': f"batch_req_{self.random.getrandbits(32):08x}", 'custom_id': request['custom_id'], 'response': None,
+                    'error': {'code': 'server_error', 'message': 'Injected error (fake OpenAI backend).'},
+                }))
+                continue
+            content = self._reply(request['body'], request['custom_id'], feature_name)
+            output_lines.append(json.dumps({
+                'id': f"batch_req_{self.random.getrandbits(32):08x}", 'custom_id': request['custom_id'],
+                'response': {'status_code': 200, 'body': self._completion(content)}, 'error': None,
+            }))
+        for key, lines in [('output_file_id', output_lines), ('error_file_id', error_lines)]:
+            if lines:
+                file_id = f"file-{len(self.stored_files):06d}"
+                self.stored_files[file_id] = '\n'.join(lines) + '\n'
+                batch[key] = file_id
+        batch['completed'], batch['failed'] = len(output_lines), len(error_lines)
+
+    def _batch_object(self, batch_id):
+        batch = self.stored_batches[batch_id]
+        counts = _Namespace(total=len(batch['requests']), completed=batch['completed'], failed=batch['failed'])
+        return _Namespace(
+            id=batch_id, object='batch', endpoint=batch['endpoint'], status=batch['status'],
+            completion_window=batch['completion_window'], metadata=batch['metadata'], input_file_id=batch['input_file_id'],
+            output_file_id=batch['output_file_id'], error_file_id=batch['error_file_id'], request_counts=counts,
+        )
@@ -1,27 +1,57 @@
 import os
 import json
-import logger
-import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import numpy as np
 import polars as pl
 from openai import OpenAI
 from sklearn.metrics import accuracy_score, mean_absolute_error
 
+from src.data_processing_utils import assemble_text_content
+from src.feature_store_utils import FeatureResultStore
+from src.llm_batch_utils import (
+    BATCH_MAX_REQUESTS, BatchJobLog, build_batch_request, write_batch_requests, submit_batch, wait_for_batch, download_batch_results
+)
+from src.token_utils import DEFAULT_MODEL, count_tokens, count_message_tokens, estimate_run_cost, log_run_estimate
+
 # Configurar logger
-logger.basicConfig(level=logger.INFO, format='%(levelname)s: %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# Model of every LLM call (its tokenizer and pricing are in token_utils)
+LLM_MODEL = DEFAULT_MODEL
 
 # ==============================================================================
-# 1. CONTENT RELEVANCE SCORE (Filtrado)
+# 0. LLM CALL (shared by every feature)
 # ==============================================================================
 
-def content_relevance_score(client: OpenAI, content: str, few_shot_examples: list = None):
-    """
-    Calcula la relevancia temática usando ejemplos Few-Shot dinámicos.
-    """
+def _chat_request_body(messages: list):
+    """Parameters of the chat request of a feature (sent directly, or as a line of a batch file)."""
+    return {
+        'model': LLM_MODEL,
+        'messages': messages,
+        'response_format': { "type": "json_object" },
+        'temperature': 0.0 # Temperatura 0 para máxima consistencia y reproducibilidad
+    }
 
-    prompt = f"""
-You are a content rating specialist for an academic study on public opinion regarding the Gaza conflict on Reddit.
 
-Your task is to assign a numerical **Relevance Score** from **0 (Not Related)** to **5 (Directly Related)** to the provided text.
+def _chat_completion_json(client: OpenAI, messages: list, feature_name: str, error_label: str):
+    """Sends the chat messages of a feature and returns the raw JSON reply ({feature_name: None} on API errors)."""
+    try:
+        response = client.chat.completions.create(**_chat_request_body(messages))
+        return response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Error in OpenAI API call ({error_label}): {e}")
+        return json.dumps({feature_name: None})
+
+# ==============================================================================
+# 1. CONTENT RELEVANCE SCORE (Filtrado)
+# ==============================================================================
+
+# Shared by content_relevance_prompt and thread_prompt
+CONTENT_RELEVANCE_GUIDELINES = """Your task is to assign a numerical **Relevance Score** from **0 (Not Related)** to **5 (Directly Related)** to the provided text.
 
 ---
 **STRICT GUIDELINE:**
@@ -35,7 +65,16 @@ Your task is to assign a numerical **Relevance Score** from **0 (Not Related)**
 * **3 - Marginal Context:** Related keywords (Middle East, UN, War) without explicit ties to Gaza/Israel. Broad context.
 * **2 - Accidental/Trivial:** Keywords used in non-political context (e.g., travel advice) or pure noise in a related thread.
 * **1 - Off-Topic Noise:** Personal attacks or emotional outbursts unrelated to the topic.
-* **0 - Discard/Spam:** Completely unrelated content.
+* **0 - Discard/Spam:** Completely unrelated content."""
+
+
+def content_relevance_prompt(content: str, few_shot_examples: list = None):
+    """Builds the chat messages of content_relevance_score (also used to count its prompt tokens)."""
+
+    prompt = f"""
+You are a content rating specialist for an academic study on public opinion regarding the Gaza conflict on Reddit.
+
+{CONTENT_RELEVANCE_GUIDELINES}
 
 ---
 **EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
@@ -50,36 +89,25 @@ Return a single JSON object. Example: {{"content_relevance_score": 4}}
 **TEXT TO CLASSIFY:**
 {content}
 """
+    return [
+        {"role": "system", "content": "You are a helpful classification assistant. Output JSON only."},
+        {"role": "user", "content": prompt}
+    ]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", # O el modelo que estés usando
-            messages=[
-                {"role": "system", "content": "You are a helpful classification assistant. Output JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={ "type": "json_object" },
-            temperature=0.0 # Temperatura 0 para máxima consistencia y reproducibilidad
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error in OpenAI API call (Relevance): {e}")
-        return json.dumps({"content_relevance_score": None})
+
+def content_relevance_score(client: OpenAI, content: str, few_shot_examples: list = None):
+    """
+    Calcula la relevancia temática usando ejemplos Few-Shot dinámicos.
+    """
+    return _chat_completion_json(client, content_relevance_prompt(content, few_shot_examples), "content_relevance_score", "Relevance")
 
 
 # ==============================================================================
 # 2. POLITICAL STANCE SCORE
 # ==============================================================================
 
-def political_stance_score(client: OpenAI, content: str, few_shot_examples: list = None):
-    """
-    Calcula la postura política usando ejemplos Few-Shot dinámicos.
-    """
-
-    prompt = f"""
-You are an expert political analyst for a study on the Gaza conflict.
-
-Your task is to assign a **Political Stance Score** from **1 (Pro-Palestine)** to **5 (Pro-Israel)**.
+# Shared by political_stance_prompt, combined_features_prompt and thread_prompt
+POLITICAL_STANCE_GUIDELINES = """Your task is to assign a **Political Stance Score** from **1 (Pro-Palestine)** to **5 (Pro-Israel)**.
 
 ---
 **STRICT GUIDELINES:**
@@ -93,7 +121,16 @@ Your task is to assign a **Political Stance Score** from **1 (Pro-Palestine)** t
 * **4 - Leaning Pro-Israel:** Empathy for Israeli civilians, focus on security rights, mild criticism of Palestine.
 * **3 - Neutral/Balanced:** Academic analysis, criticizing both sides equally, or factual reporting without opinion.
 * **2 - Leaning Pro-Palestine:** Focus on humanitarian crisis in Gaza, criticism of Israeli policies, empathy for Palestinian civilians.
-* **1 - Strongly Pro-Palestine:** Accusations of genocide/apartheid against Israel, strong support for Palestinian resistance.
+* **1 - Strongly Pro-Palestine:** Accusations of genocide/apartheid against Israel, strong support for Palestinian resistance."""
+
+
+def political_stance_prompt(content: str, few_shot_examples: list = None):
+    """Builds the chat messages of political_stance_score (also used to count its prompt tokens)."""
+
+    prompt = f"""
+You are an expert political analyst for a study on the Gaza conflict.
+
+{POLITICAL_STANCE_GUIDELINES}
 
 ---
 **EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
@@ -108,35 +145,24 @@ Return a single JSON object. Example: {{"political_stance": 2}}
 **TEXT TO CLASSIFY:**
 {content}
 """
+    return [
+        {"role": "system", "content": "You are a political analyst. Output JSON only."},
+        {"role": "user", "content": prompt}
+    ]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a political analyst. Output JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={ "type": "json_object" },
-            temperature=0.0
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error in OpenAI API call (Stance): {e}")
-        return json.dumps({"political_stance": None})
+
+def political_stance_score(client: OpenAI, content: str, few_shot_examples: list = None):
+    """
+    Calcula la postura política usando ejemplos Few-Shot dinámicos.
+    """
+    return _chat_completion_json(client, political_stance_prompt(content, few_shot_examples), "political_stance", "Stance")
     
 # ==============================================================================
 # 3. DISCOURSE TONE (Nuevo)
 # ==============================================================================
 
-def discourse_tone_score(client: OpenAI, content: str, few_shot_examples: list = None):
-    """
-    Identifica el tono dominante del discurso (Categórica Nominal).
-    """
-
-    prompt = f"""
-You are an expert linguist analyzing political discourse on Reddit regarding the Gaza conflict.
-
-Your task is to identify the **Dominant Discourse Tone** of the provided comment.
+# Shared by discourse_tone_prompt, combined_features_prompt and thread_prompt
+DISCOURSE_TONE_GUIDELINES = """Your task is to identify the **Dominant Discourse Tone** of the provided comment.
 
 ---
 **CATEGORIES (Choose exactly ONE):**
@@ -146,7 +172,16 @@ Your task is to identify the **Dominant Discourse Tone** of the provided comment
 3. **Hostile:** Aggressive, insulting, uses hate speech, dehumanization, or ad-hominem attacks against users or groups.
 4. **Sarcastic:** Uses irony, mockery, or satire. Says the opposite of what is meant to ridicule a position.
 5. **Informative:** Neutral sharing of links, breaking news, or clarifications without taking a clear analytical or emotional stance.
-6. **Other:** Content that does not fit the above categories.
+6. **Other:** Content that does not fit the above categories."""
+
+
+def discourse_tone_prompt(content: str, few_shot_examples: list = None):
+    """Builds the chat messages of discourse_tone_score (also used to count its prompt tokens)."""
+
+    prompt = f"""
+You are an expert linguist analyzing political discourse on Reddit regarding the Gaza conflict.
+
+{DISCOURSE_TONE_GUIDELINES}
 
 ---
 **EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
@@ -160,35 +195,25 @@ Example: {{"discourse_tone": "Sarcastic"}}
 **TEXT TO CLASSIFY:**
 {content}
 """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a linguist. Output valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={ "type": "json_object" },
-            temperature=0.0
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error in Tone: {e}")
-        return json.dumps({"discourse_tone": None})
-
+    return [
+        {"role": "system", "content": "You are a linguist. Output valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
 
-# ==============================================================================
-# 4. DOMINANT FRAME (Nuevo)
-# ==============================================================================
 
-def dominant_frame_score(client: OpenAI, content: str, few_shot_examples: list = None):
+def discourse_tone_score(client: OpenAI, content: str, few_shot_examples: list = None):
     """
-    Identifica el marco retórico o temático principal (Categórica Nominal).
+    Identifica el tono dominante del discurso (Categórica Nominal).
     """
+    return _chat_completion_json(client, discourse_tone_prompt(content, few_shot_examples), "discourse_tone", "Tone")
 
-    prompt = f"""
-You are a media analyst studying framing effects in the Gaza conflict.
 
-Your task is to identify the **Dominant Frame** used in the text. This is the "lens" through which the user views the issue.
+# ==============================================================================
+# 4. DOMINANT FRAME (Nuevo)
+# ==============================================================================
+
+# Shared by dominant_frame_prompt, combined_features_prompt and thread_prompt
+DOMINANT_FRAME_GUIDELINES = """Your task is to identify the **Dominant Frame** used in the text. This is the "lens" through which the user views the issue.
 
 ---
 **CATEGORIES (Choose exactly ONE):**
@@ -198,7 +223,16 @@ Your task is to identify the **Dominant Frame** used in the text. This is the "l
 3. **Geopolitical/Political:** Focus on international relations (US/Iran/Egypt), UN resolutions, domestic politics (Netanyahu/Biden), and diplomatic solutions.
 4. **Media/Narrative:** Focus on how the war is reported, bias in news sources (CNN/BBC/Al Jazeera), propaganda ("hasbara"), or disinformation.
 5. **Historical/Religious:** Focus on historical claims (1948, 1967), biblical/religious justifications, or long-term historical context.
-6. **Other:** Content that does not fit the above frames.
+6. **Other:** Content that does not fit the above frames."""
+
+
+def dominant_frame_prompt(content: str, few_shot_examples: list = None):
+    """Builds the chat messages of dominant_frame_score (also used to count its prompt tokens)."""
+
+    prompt = f"""
+You are a media analyst studying framing effects in the Gaza conflict.
+
+{DOMINANT_FRAME_GUIDELINES}
 
 ---
 **EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
@@ -212,35 +246,25 @@ Example: {{"dominant_frame": "Security/Military"}}
 **TEXT TO CLASSIFY:**
 {content}
 """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a media analyst. Output valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={ "type": "json_object" },
-            temperature=0.0
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error in Frame: {e}")
-        return json.dumps({"dominant_frame": None})
+    return [
+        {"role": "system", "content": "You are a media analyst. Output valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
 
 
-# ==============================================================================
-# 5. ARGUMENT QUALITY SCORE (Nuevo)
-# ==============================================================================
-
-def argument_quality_score(client: OpenAI, content: str, few_shot_examples: list = None):
+def dominant_frame_score(client: OpenAI, content: str, few_shot_examples: list = None):
     """
-    Evalúa la calidad y sofisticación del argumento (Ordinal 0-5).
+    Identifica el marco retórico o temático principal (Categórica Nominal).
     """
+    return _chat_completion_json(client, dominant_frame_prompt(content, few_shot_examples), "dominant_frame", "Frame")
 
-    prompt = f"""
-You are an academic researcher evaluating the quality of public deliberation about Gaza conflict.
 
-Your task is to assign an **Argument Quality Score** from **0 to 5** based on the sophistication and justification of the text.
+# ==============================================================================
+# 5. ARGUMENT QUALITY SCORE (Nuevo)
+# ==============================================================================
+
+# Shared by argument_quality_prompt, combined_features_prompt and thread_prompt
+ARGUMENT_QUALITY_GUIDELINES = """Your task is to assign an **Argument Quality Score** from **0 to 5** based on the sophistication and justification of the text.
 
 ---
 **SCORING RUBRIC:**
@@ -250,7 +274,16 @@ Your task is to assign an **Argument Quality Score** from **0 to 5** based on th
 * **2 - Basic (Opinion):** Stating a clear position but with minimal or weak justification. Repetitive talking points.
 * **3 - Moderate (Justified Opinion):** A position supported by at least one coherent reason or personal anecdote. Clear logic but limited depth.
 * **4 - High (Reasoned Argument):** Well-structured argument linking evidence to claims. Shows nuance or acknowledges context.
-* **5 - Elite (Sophisticated Discourse):** Exceptional depth. Cites specific sources/laws, considers counter-arguments, or synthesizes complex information.
+* **5 - Elite (Sophisticated Discourse):** Exceptional depth. Cites specific sources/laws, considers counter-arguments, or synthesizes complex information."""
+
+
+def argument_quality_prompt(content: str, few_shot_examples: list = None):
+    """Builds the chat messages of argument_quality_score (also used to count its prompt tokens)."""
+
+    prompt = f"""
+You are an academic researcher evaluating the quality of public deliberation about Gaza conflict.
+
+{ARGUMENT_QUALITY_GUIDELINES}
 
 ---
 **EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
@@ -264,31 +297,24 @@ Example: {{"argument_quality_score": 3}}
 **TEXT TO CLASSIFY:**
 {content}
 """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a researcher. Output valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={ "type": "json_object" },
-            temperature=0.0
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error in Quality: {e}")
-        return json.dumps({"argument_quality_score": None})
+    return [
+        {"role": "system", "content": "You are a researcher. Output valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def argument_quality_score(client: OpenAI, content: str, few_shot_examples: list = None):
+    """
+    Evalúa la calidad y sofisticación del argumento (Ordinal 0-5).
+    """
+    return _chat_completion_json(client, argument_quality_prompt(content, few_shot_examples), "argument_quality_score", "Quality")
 
 # ==============================================================================
 # 5. SENTIMENT SCORE
 # ==============================================================================
 
-def sentiment_score(client: OpenAI, content: str, few_shot_examples: list = None):
-
-    prompt = f"""
-You are an expert in Natural Language Processing (NLP) specializing in sentiment analysis of political discourse.
-
-Your task is to analyze the **Emotional Valence** of the text regarding the Gaza conflict.
+# Shared by sentiment_prompt, combined_features_prompt and thread_prompt
+SENTIMENT_GUIDELINES = """Your task is to analyze the **Emotional Valence** of the text regarding the Gaza conflict.
 Assign a continuous **Sentiment Score** from **-1.0** (Very Negative) to **1.0** (Very Positive).
 
 ---
@@ -304,7 +330,16 @@ Assign a continuous **Sentiment Score** from **-1.0** (Very Negative) to **1.0**
 Do NOT confuse "Political Stance" with "Sentiment".
 - A user can be angry (Negative Sentiment) while supporting a "Good Cause".
 - A user can be hopeful (Positive Sentiment) about a controversial solution.
-- Focus ONLY on the **tone and emotion** of the language used, not the validity of their opinion.
+- Focus ONLY on the **tone and emotion** of the language used, not the validity of their opinion."""
+
+
+def sentiment_prompt(content: str, few_shot_examples: list = None):
+    """Builds the chat messages of sentiment_score (also used to count its prompt tokens)."""
+
+    prompt = f"""
+You are an expert in Natural Language Processing (NLP) specializing in sentiment analysis of political discourse.
+
+{SENTIMENT_GUIDELINES}
 
 ---
 **EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
@@ -318,22 +353,169 @@ Example: {{"sentiment_score": -0.45}}
 **TEXT TO CLASSIFY:**
 {content}
 """
+    return [
+        {"role": "system", "content": "You are a sentiment analysis expert. Output valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def sentiment_score(client: OpenAI, content: str, few_shot_examples: list = None):
+    return _chat_completion_json(client, sentiment_prompt(content, few_shot_examples), "sentiment_score", "Sentiment")
+
+# ==============================================================================
+# 6. COMBINED FEATURES (one call returns several features)
+# ==============================================================================
+
+# Guidelines of every feature (shared with its own prompt) and an example value, for the prompts covering several
+# features (combined_features_prompt) or several comments (thread_prompt)
+FEATURE_GUIDELINES = {
+    'content_relevance_score': (CONTENT_RELEVANCE_GUIDELINES, 4),
+    'political_stance': (POLITICAL_STANCE_GUIDELINES, 2),
+    'sentiment_score': (SENTIMENT_GUIDELINES, -0.45),
+    'discourse_tone': (DISCOURSE_TONE_GUIDELINES, "Sarcastic"),
+    'dominant_frame': (DOMINANT_FRAME_GUIDELINES, "Security/Military"),
+    'argument_quality_score': (ARGUMENT_QUALITY_GUIDELINES, 3),
+}
+
+
+def process_labeled_sample_for_combined_llm(df, feature_names):
+    """
+    Few-shot examples of the combined prompt: the labeled texts once, and per feature its labels by text number
+    ({"1": label, ...}, unlabeled texts skipped), so a text is not repeated in the prompt for every feature.
+    """
+    labels = {}
+    for feature_name in feature_names:
+        values = df[feature_name].to_list() if feature_name in df.columns else []
+        labels[feature_name] = {str(i): value for i, value in enumerate(values, start=1) if value is not None}
+    texts = df['text_content'].to_list() if 'text_content' in df.columns else []
+    return {'texts': texts, 'labels': labels}
+
+
+def combined_features_prompt(content: str, few_shot_examples: dict, feature_names: list):
+    """Builds the chat messages returning every feature of `feature_names` as one JSON object."""
+
+    reference_texts = "\n".join(f"[{i}] {text}" for i, text in enumerate(few_shot_examples['texts'], start=1))
+    sections = []
+    for i, feature_name in enumerate(feature_names, start=1):
+        guidelines, _ = FEATURE_GUIDELINES[feature_name]
+        reference_labels = json.dumps(few_shot_examples['labels'].get(feature_name, {}), ensure_ascii=False)
+        sections.append(f"""
+### FEATURE {i}: "{feature_name}"
+{guidelines}
+
+**Reference labels ({feature_name}, by reference text number):** {reference_labels}
+""")
+    output_keys = ", ".join(f'"{feature_name}"' for feature_name in feature_names)
+    example_reply = json.dumps({feature_name: FEATURE_GUIDELINES[feature_name][1] for feature_name in feature_names})
+
+    prompt = f"""
+You are an expert analyst of political discourse on Reddit regarding the Gaza conflict, for an academic study.
+
+Your task is to annotate the provided text with {len(feature_names)} features. Every feature has its own guidelines and its own
+expert labels: evaluate each feature independently, following only its section.
+The features MUST primarily reflect the **Comment Body**. Use the Post Title/Body ONLY as context.
+
+---
+**EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
+Reference texts, labeled for every feature in its section below:
+
+{reference_texts}
+
+---{"---".join(sections)}
+---
+**OUTPUT FORMAT:**
+Return a single JSON object with exactly these keys: {output_keys}.
+Example: {example_reply}
+
+**TEXT TO CLASSIFY:**
+{content}
+"""
+    return [
+        {"role": "system", "content": "You are an expert discourse analyst. Output valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def combined_features_score(client: OpenAI, content: str, few_shot_examples: dict, feature_names: list):
+    """Generates every feature of `feature_names` with a single LLM call (raw JSON reply)."""
+    return _chat_completion_json(client, combined_features_prompt(content, few_shot_examples, feature_names), "combined_features", "Combined")
+
+# ==============================================================================
+# 7. THREAD-GROUPED REQUESTS (one call classifies several comments of a post)
+# ==============================================================================
+
+def thread_prompt(feature_name: str, post_title: str, post_body: str, comment_bodies: list, few_shot_examples: list = None):
+    """Builds the chat messages classifying `feature_name` for several comments of one post, sent with its context once."""
+
+    guidelines, example_value = FEATURE_GUIDELINES[feature_name]
+    numbered_comments = "\n\n".join(f"[{i}] {body}" for i, body in enumerate(comment_bodies, start=1))
+    example_reply = json.dumps({'results': [{'id': 1, feature_name: example_value}, {'id': 2, feature_name: example_value}]})
+
+    prompt = f"""
+You are an expert analyst of political discourse on Reddit regarding the Gaza conflict, for an academic study.
+
+{guidelines}
+
+---
+**EXPERT KNOWLEDGE: REFERENCE SAMPLES (Ground Truth)**
+Use the following expert-labeled examples as your calibration standard:
+
+{few_shot_examples}
+
+---
+**THREAD CONTEXT (shared by every comment below, use it ONLY as context):**
+Post Title: {post_title}
 
+Post Body: {post_body}
+
+---
+**COMMENTS TO CLASSIFY ({len(comment_bodies)}, numbered):**
+Classify every comment independently.
+
+{numbered_comments}
+
+---
+**OUTPUT FORMAT:**
+Return a single JSON object with a "results" array holding one object per comment: its number in "id" and its
+value in "{feature_name}".
+Example: {example_reply}
+"""
+    return [
+        {"role": "system", "content": "You are a helpful classification assistant. Output valid JSON only."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def thread_score(client: OpenAI, feature_name: str, post_title: str, post_body: str, comment_bodies: list, few_shot_examples: list = None):
+    """Classifies `feature_name` for several comments of a post with a single LLM call (raw JSON reply)."""
+    messages = thread_prompt(feature_name, post_title, post_body, comment_bodies, few_shot_examples)
+    return _chat_completion_json(client, messages, "results", "Thread")
+
+
+def parse_thread_predictions(llm_response, feature_name, feature_type, n_comments):
+    """
+    Extracts {comment number: value} from the 'results' array of a thread reply. Malformed replies give {}, and
+    entries with an unknown number or an invalid value are skipped, so only those comments need another call.
+    """
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a sentiment analysis expert. Output valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={ "type": "json_object" },
-            temperature=0.0
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error in Quality: {e}")
-        return json.dumps({"argument_quality_score": None})
-    
+        results = json.loads(llm_response).get('results')
+    except (TypeError, ValueError, AttributeError):
+        return {}
+    if not isinstance(results, list):
+        return {}
+    predictions = {}
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        value = parse_prediction(json.dumps(item), feature_name, feature_type)
+        if 1 <= number <= n_comments and value is not None and number not in predictions:
+            predictions[number] = value
+    return predictions
+
 # ==============================================================================
 # Helper additional functions
 # ==============================================================================
@@ -389,6 +571,22 @@ def process_labeled_sample_for_llm(df, feature_name):
 
 #==============================================================================
 
+def parse_prediction(llm_response, feature_name, feature_type):
+    """Extracts the value of `feature_name` from a raw JSON reply, cast to its feature type. Returns None if missing or invalid."""
+    try:
+        predicted_value = json.loads(llm_response).get(feature_name)
+        if predicted_value is None:
+            return None
+        if feature_type == 'ordinal':
+            return int(predicted_value)
+        elif feature_type == 'continuous':
+            return float(predicted_value)
+        return str(predicted_value)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+#==============================================================================
+
 def adjacent_accuracy(y_true, y_pred, adjacent_tol=1):
     """Calculates adjacent accuracy for ordinal scales."""
     
@@ -403,7 +601,12 @@ def adjacent_accuracy(y_true, y_pred, adjacent_tol=1):
 
 def run_labeling_samples(df, data_columns_to_include, features_to_label, 
                          sample_n, sample_seed, val_sample_ratio, manual_train_ids, manual_val_ids,
-                         train_sample_path, val_sample_path): 
+                         train_sample_path, val_sample_path, posts=None): 
+    """
+    Samples the train (few-shot) and validation sets to label by hand from `df`.
+    If `posts` is given, `df` holds comments only (normalized storage): the post columns and 'text_content'
+    are assembled for the sampled records alone.
+    """
 
     logger.info("⚙️ Starting generation of samples (Manual + Random)...")
 
@@ -458,6 +661,10 @@ def run_labeling_samples(df, data_columns_to_include, features_to_label,
 
     logger.info(f"📊 FINAL SPLIT -> Train (Few-Shot): {len(df_train_final)} | Validation (Blind): {len(df_val_final)}")
 
+    if posts is not None:
+        df_train_final = assemble_text_content(df_train_final, posts)
+        df_val_final = assemble_text_content(df_val_final, posts)
+
     # 7. EXPORT TO JSON
     export_labeling_samples_to_json(df_train_final, train_sample_path, data_columns_to_include, features_to_label)
     export_labeling_samples_to_json(df_val_final, val_sample_path, data_columns_to_include, features_to_label)
@@ -466,6 +673,60 @@ def run_labeling_samples(df, data_columns_to_include, features_to_label,
 
 #==============================================================================
 
+# Value scored when a prediction is missing or invalid (counted as a wrong answer)
+VALIDATION_ERROR_VALUES = {'ordinal': -1, 'continuous': 0.0, 'categorical': "ERROR"}
+
+def _validation_pair(predicted_value, true_score, feature_type):
+    """Casts a predicted and a true value to the feature type (a missing prediction becomes its error value)."""
+    if predicted_value is None:
+        predicted_value = VALIDATION_ERROR_VALUES[feature_type]
+    if feature_type == 'ordinal':
+        return int(predicted_value), int(true_score)
+    elif feature_type == 'continuous':
+        # Float conversion for Sentiment
+        return float(predicted_value), float(true_score)
+    # Categorical (String)
+    return str(predicted_value), str(true_score)
+
+
+def report_validation_metrics(feature_name, feature_config, y_true, y_pred, logger):
+    """Logs the validation metrics of a feature against its `validation_threshold` (shared by the per-feature and combined validations)."""
+
+    logger.log("-" * 60)
+    logger.log(f"📊 METRICS logger: {feature_name}")
+    
+    # --- ORDINAL LOGIC ---
+    if feature_config['type'] == 'ordinal':
+        error_value = adjacent_accuracy(y_true, y_pred) # adjacent_tol = 1 by default
+        logger.log(f"   🎯 Adjacent Accuracy:  {error_value:.2%} (Target: {feature_config['validation_threshold']:.0%}) (Tolerance +/- 1)")
+        
+        if feature_name == 'content_relevance_score':
+            cutoff = feature_config['cutoff']
+            bin_true = [1 if x >= cutoff else 0 for x in y_true]
+            bin_pred = [1 if x >= cutoff else 0 for x in y_pred]
+            bin_acc = accuracy_score(bin_true, bin_pred)
+            logger.log(f"   ⚖️ Binary Filter Acc:  {bin_acc:.2%} (Score >= {cutoff})")
+
+    # --- CONTINUOUS LOGIC (SENTIMENT) ---
+    elif feature_config['type'] == 'continuous':
+        error_value = mean_absolute_error(y_true, y_pred)
+        logger.log(f"   📉 Mean Absolute Error (MAE): {error_value:.4f} (Target: < {feature_config['validation_threshold']})")
+
+    # --- CATEGORICAL LOGIC ---
+    elif feature_config['type'] == 'categorical':
+        error_value = accuracy_score(y_true, y_pred)
+        logger.log(f"   🎯 Exact Accuracy:     {error_value:.2%} (Target: {feature_config['validation_threshold']:.0%})")
+
+    if error_value <= feature_config['validation_threshold']:
+        logger.log("   ✅ SUCCESS: Error is within acceptable limits.")
+    else:
+        logger.log("   🛑 FAILURE: High error rate.")
+
+    logger.log("-" * 60)
+    return error_value
+
+#==============================================================================
+
 def run_validation_for_feature(feature_name, feature_config, df_train, df_val, client, logger): 
 
     if not feature_config:
@@ -509,25 +770,11 @@ def run_validation_for_feature(feature_name, feature_config, df_train, df_val, c
             predicted_value = response_json.get(feature_name)
             
             # Safety Casting based on feature_config
-            if feature_config['type'] == 'ordinal':
-                predicted_value = int(predicted_value) if predicted_value is not None else -1
-                true_score = int(true_score)
-            
-            elif feature_config['type'] == 'continuous':
-                # Float conversion for Sentiment
-                predicted_value = float(predicted_value) if predicted_value is not None else 0.0
-                true_score = float(true_score)
-
-            else:
-                # Categorical (String)
-                predicted_value = str(predicted_value) if predicted_value is not None else "ERROR"
-                true_score = str(true_score)
+            predicted_value, true_score = _validation_pair(predicted_value, true_score, feature_config['type'])
 
         except Exception as e:
-            logger.warning(f"⚠️ Error in record {i}: {e}")
-            if feature_config['type'] == 'ordinal': predicted_value = -1
-            elif feature_config['type'] == 'continuous': predicted_value = 0.0
-            else: predicted_value = "ERROR"
+            logger.log(f"⚠️ Error in record {i}: {e}")
+            predicted_value, true_score = _validation_pair(None, true_score, feature_config['type'])
 
         y_true.append(true_score)
         y_pred.append(predicted_value)
@@ -535,84 +782,187 @@ def run_validation_for_feature(feature_name, feature_config, df_train, df_val, c
         if (i+1) % 10 == 0: print(f"   Processed {i+1}/{len(df_val)}...")
 
     # 4. Metrics & Reporting
-    logger.log("-" * 60)
-    logger.log(f"📊 METRICS logger: {feature_name}")
-    
-    # --- ORDINAL LOGIC ---
-    if feature_config['type'] == 'ordinal':
-        error_value = adjacent_accuracy(y_true, y_pred) # adjacent_tol = 1 by default
-        logger.log(f"   🎯 Adjacent Accuracy:  {error_value:.2%} (Target: {feature_config['validation_threshold']:.0%}) (Tolerance +/- 1)")
-        
-        if feature_name == 'content_relevance_score':
-            cutoff = feature_config['cutoff']
-            bin_true = [1 if x >= cutoff else 0 for x in y_true]
-            bin_pred = [1 if x >= cutoff else 0 for x in y_pred]
-            bin_acc = accuracy_score(bin_true, bin_pred)
-            logger.log(f"   ⚖️ Binary Filter Acc:  {bin_acc:.2%} (Score >= {cutoff})")
+    report_validation_metrics(feature_name, feature_config, y_true, y_pred, logger)
 
-    # --- CONTINUOUS LOGIC (SENTIMENT) ---
-    elif feature_config['type'] == 'continuous':
-        error_value = mean_absolute_error(y_true, y_pred)
-        logger.log(f"   📉 Mean Absolute Error (MAE): {error_value:.4f} (Target: < {feature_config['validation_threshold']})")
+#==============================================================================
 
-    # --- CATEGORICAL LOGIC ---
-    elif feature_config['type'] == 'categorical':
-        error_value = accuracy_score(y_true, y_pred)
-        logger.log(f"   🎯 Exact Accuracy:     {error_value:.2%} (Target: {feature_config['validation_threshold']:.0%})")
+def run_combined_validation_for_features(feature_names, feature_configs, df_train, df_val, client, logger):
+    """
+    Validates the combined mode (one call returns every feature of `feature_names`, see combined_features_prompt):
+    one call per validation record, then the metrics of every feature as in run_validation_for_feature, to compare
+    them with the per-feature calls. Also reports the calls and prompt template tokens saved.
+    """
 
-    if error_value <= feature_config['validation_threshold']:
-        logger.log("   ✅ SUCCESS: Error is within acceptable limits.")
-    else:
-        logger.log("   🛑 FAILURE: High error rate.")
+    logger.log(f"\n🔵 VALIDATING COMBINED FEATURES: {', '.join(feature_names)}")
 
-    logger.log("-" * 60)
+    if len(df_train) == 0 or len(df_val) == 0:
+        logger.log("❌ Error: Missing labeled data. Check 'data/labeled_samples' folder.")
+        return
 
-#==============================================================================
+    logger.log(f"📂 Data Loaded -> Train (Few-Shot): {len(df_train)} | Val (Test): {len(df_val)}")
 
-def run_generation_for_feature(feature_name, feature_file_path, feature_config, df, df_train, batch_save_size, pilot_mode, pilot_size, pilot_seed, client, logging): 
+    # 1. Few-shot examples (each feature keeps its own labels) and prompt size vs one prompt per feature
+    few_shot_examples = process_labeled_sample_for_combined_llm(df_train, feature_names)
+    combined_tokens = count_message_tokens(combined_features_prompt('', few_shot_examples, feature_names), LLM_MODEL)
+    single_tokens = sum(
+        count_message_tokens(feature_configs[f]['prompt']('', process_labeled_sample_for_llm(df_train.filter(pl.col(f).is_not_null()), f)), LLM_MODEL)
+        for f in feature_names
+    )
+    logger.log(f"🧮 Calls per record: 1 (vs {len(feature_names)}) | Prompt template tokens: {combined_tokens} (vs {single_tokens})")
 
-    mode_msg = f"🧪 PILOT MODE (Max {pilot_size} records)" if pilot_mode else "🚀 PRODUCTION MODE (Full Data)"
-    logging.info(f"STARTING GENERATION of {feature_name}")
-    logging.info(f"MODE: {mode_msg}")
+    # 2. Inference: one call per record, fanned out to every feature
+    y_true = {f: [] for f in feature_names}
+    y_pred = {f: [] for f in feature_names}
 
-    few_shot_examples = process_labeled_sample_for_llm(df_train, feature_name)
+    logger.log(f"⏳ Running predictions on {len(df_val)} records...")
 
-   # 4. PREPARE DATA (Resume Logic)
-    
-    # A. Check what is already done
-    processed_ids = set()
-    if os.path.exists(feature_file_path):
-        try:
-            df_existing = pl.read_parquet(feature_file_path)
-            processed_ids = set(df_existing['comment_id'].to_list())
-            logging.info(f"🔄 Resume: Found {len(processed_ids)} records already processed in output file.")
-        except Exception as e:
-            logging.warning(f"⚠️ Output file exists but couldn't be read: {e}")
+    for i, row in enumerate(df_val.iter_rows(named=True)):
+        llm_response = combined_features_score(client, row['text_content'], few_shot_examples, feature_names)
+        for feature_name in feature_names:
+            if row.get(feature_name) is None:
+                continue
+            feature_type = feature_configs[feature_name]['type']
+            predicted_value = parse_prediction(llm_response, feature_name, feature_type)
+            predicted_value, true_score = _validation_pair(predicted_value, row[feature_name], feature_type)
+            y_true[feature_name].append(true_score)
+            y_pred[feature_name].append(predicted_value)
+
+        if (i+1) % 10 == 0: print(f"   Processed {i+1}/{len(df_val)}...")
+
+    # 3. Metrics & Reporting, per feature
+    for feature_name in feature_names:
+        if not y_true[feature_name]:
+            logger.log(f"❌ No labeled validation records for {feature_name}")
+            continue
+        report_validation_metrics(feature_name, feature_configs[feature_name], y_true[feature_name], y_pred[feature_name], logger)
+
+#==============================================================================
 
-    # B. Filter out processed records
-    df_to_process = df.filter(~ pl.col('comment_id').is_in(processed_ids))
+def _select_pending_records(processed_ids, df, pilot_mode, pilot_size, pilot_seed, logging):
+    """Records of `df` not in `processed_ids` (lazy comment_id column of the stored results), cut to `pilot_size` in pilot mode."""
+
+    # A. Check what is already done (only the comment_id column of the stored results is read)
+    processed_ids = processed_ids.collect()
+    if len(processed_ids) > 0:
+        logging.info(f"🔄 Resume: Found {len(processed_ids)} records already processed in output files.")
+
+    # B. Filter out processed records (anti-join)
+    df_to_process = df.join(processed_ids, on='comment_id', how='anti')
     
     # C. Apply PILOT LIMIT (The only change in logic)
     if pilot_mode:
         if len(df_to_process) > pilot_size:
             logging.info(f"✂️ Cutting dataset to {pilot_size} records for Pilot test.")
             df_to_process = df_to_process.sample(n=pilot_size, seed=pilot_seed)
+
+    return df_to_process
+
+
+def _log_generation_estimate(feature_name, template_messages, df_to_process, posts,
+                             output_tokens_per_record, outlier_prompt_tokens, batch_api=False):
+    """Logs the projected tokens and cost of one prompt (`template_messages` + 'text_content') per record of `df_to_process`."""
+    template_tokens = count_message_tokens(template_messages, LLM_MODEL)
+    prompt_tokens = []
+    for chunk in df_to_process.iter_slices(10_000):
+        if posts is not None:
+            chunk = assemble_text_content(chunk, posts)
+        prompt_tokens.extend(template_tokens + n for n in count_tokens(chunk['text_content'].to_list(), LLM_MODEL))
+    estimate = estimate_run_cost(prompt_tokens, output_tokens_per_record, LLM_MODEL, outlier_prompt_tokens, batch_api)
+    log_run_estimate(feature_name, estimate, outlier_prompt_tokens)
+
+
+def _iter_text_records(df_to_process, posts, slice_size):
+    """Yields (comment_id, text_content) of every record; 'text_content' is assembled per slice, only for the records about to be sent."""
+    for chunk in df_to_process.iter_slices(slice_size):
+        if posts is not None:
+            chunk = assemble_text_content(chunk, posts)
+        yield from chunk.select('comment_id', 'text_content').iter_rows()
+
+
+def _generate_concurrently(work_items, n_to_process, generate, save, batch_save_size, max_concurrent_requests, logging):
+    """
+    Runs `generate(*item) -> [(comment_id, result or None), ...]` for every item of `work_items` (a record, or several
+    records answered by one call), with up to `max_concurrent_requests` calls in flight, and passes the results to `save`
+    every `batch_save_size` records. Returns the number of failed records (result None), which are not saved.
+    """
+
+    results_buffer = [] 
+    n_processed_records, n_failed_records = 0, 0
+
+    def collect(futures):
+        nonlocal results_buffer, n_processed_records, n_failed_records
+        for future in futures:
+            for comment_id, result in future.result():
+                n_processed_records += 1
+                if result is None:
+                    # Not saved: the record is retried on the next run (resume)
+                    n_failed_records += 1
+                    continue
+                results_buffer.append((comment_id, result))
+
+        # 6. Incremental Saving (Batching), keyed by comment_id (results arrive out of order)
+        if len(results_buffer) >= batch_save_size or (n_processed_records == n_to_process and results_buffer):
+            logging.info(f"💾 Saving batch... ({n_processed_records}/{n_to_process})")
+            save(results_buffer)
+            results_buffer = []
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_requests) as executor:
+        in_flight = set()
+        for item in work_items:
+            # Bounded queue: never more than 2 x max_concurrent_requests calls submitted ahead
+            if len(in_flight) >= 2 * max_concurrent_requests:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(generate, *item))
+        collect(wait(in_flight).done)
+
+    return n_failed_records
+
+#==============================================================================
+
+def run_generation_for_feature(feature_name, features_dir, feature_config, df, df_train, batch_save_size, pilot_mode, pilot_size, pilot_seed, client, logging, posts=None,
+                               output_tokens_per_record=12, outlier_prompt_tokens=None, max_concurrent_requests=1, compact_every=50, prepare_records=None): 
+    """
+    Generates `feature_name` with the LLM for every record of `df` not already stored in `<features_dir>/<feature_name>/`,
+    saving every `batch_save_size` records as a new part file (see FeatureResultStore; parts are compacted every
+    `compact_every` parts). If `posts` is given, `df` holds comments only (normalized storage) and 'text_content'
+    is assembled batch by batch, so post texts are never repeated in memory for the whole dataset.
+    Before the first call, the projected tokens and cost of the run are logged (see token_utils).
+    Up to `max_concurrent_requests` calls run in parallel threads, so throughput follows the provider's rate limit
+    (the OpenAI client retries rate-limited calls with backoff) rather than the latency of each call.
+    Parsed values are saved keyed by comment_id; records whose call fails are not saved, so a rerun retries them.
+    `prepare_records(df_to_process, posts) -> (df_to_process, posts)`, if given, builds the inputs of the pending
+    records only (after resume and pilot selection), e.g. the post contexts of their posts (see post_context_utils).
+    """
+
+    mode_msg = f"🧪 PILOT MODE (Max {pilot_size} records)" if pilot_mode else "🚀 PRODUCTION MODE (Full Data)"
+    logging.info(f"STARTING GENERATION of {feature_name}")
+    logging.info(f"MODE: {mode_msg}")
+
+    few_shot_examples = process_labeled_sample_for_llm(df_train, feature_name)
+
+   # 4. PREPARE DATA (Resume Logic)
+    store = FeatureResultStore(features_dir, feature_name, feature_config['type'], compact_every)
+    df_to_process = _select_pending_records(store.scan_ids(), df, pilot_mode, pilot_size, pilot_seed, logging)
     
     n_to_process = len(df_to_process)
     if n_to_process == 0:
         logging.info("✅ No new records to process. Exiting.")
+        store.close()
         return
 
     logging.info(f"⏳ Queue size: {n_to_process} new records to process.")
+    if prepare_records is not None:
+        # Inputs built for the pending records only (e.g. post contexts of their posts)
+        df_to_process, posts = prepare_records(df_to_process, posts)
 
-    # 5. PROCESSING LOOP
-    results_buffer = [] 
-    n_processed_records = 0
-    
-    for row in df_to_process.iter_rows(named=True):
-        comment_id = row['comment_id']
-        text_input = row['text_content']
-                
+    # D. Token/cost estimate: prompt template (instructions + few-shot examples) + 'text_content' of every record
+    if feature_config.get('prompt') is not None:
+        _log_generation_estimate(feature_name, feature_config['prompt']('', few_shot_examples), df_to_process, posts,
+                                 output_tokens_per_record, outlier_prompt_tokens)
+
+    # 5. PROCESSING LOOP (up to `max_concurrent_requests` calls in flight, results collected as they complete)
+    def generate(comment_id, text_input):
         try:
             # CALL TO LLM
             llm_response = feature_config['func'](
@@ -620,62 +970,347 @@ def run_generation_for_feature(feature_name, feature_file_path, feature_config,
                 content=text_input, 
                 few_shot_examples=few_shot_examples
             )
-            
-            response_json = json.loads(llm_response)
-            predicted_value = response_json.get(feature_name)
-            
-            # Safety Casting based on feature_config
-            if feature_config['type'] == 'ordinal':
-                predicted_value = int(predicted_value) if predicted_value is not None else -1
-                true_score = int(true_score)
-            
-            elif feature_config['type'] == 'continuous':
-                # Float conversion for Sentiment
-                predicted_value = float(predicted_value) if predicted_value is not None else 0.0
-                true_score = float(true_score)
+            return [(comment_id, parse_prediction(llm_response, feature_name, feature_config['type']))]
+        except Exception as e:
+            logging.warning(f"⚠️ Error in record {comment_id}: {e}")
+            return [(comment_id, None)]
+
+    n_failed_records = _generate_concurrently(_iter_text_records(df_to_process, posts, batch_save_size), n_to_process, generate, store.append,
+                                              batch_save_size, max_concurrent_requests, logging)
 
-            else:
-                # Categorical (String)
-                predicted_value = str(predicted_value) if predicted_value is not None else "ERROR"
-                true_score = str(true_score)
+    # Final compaction: the feature ends up in a single file
+    store.close()
 
+    if n_failed_records:
+        logging.warning(f"⚠️ {n_failed_records} records failed (API error or invalid reply). They will be retried on the next run.")
+    logging.info("✅ Generation Process Completed.")
+
+#==============================================================================
+
+def run_combined_generation_for_features(feature_names, features_dir, feature_configs, df, df_train, batch_save_size, pilot_mode, pilot_size, pilot_seed, client, logging,
+                                         posts=None, output_tokens_per_record=12, outlier_prompt_tokens=None, max_concurrent_requests=1, compact_every=50,
+                                         prepare_records=None):
+    """
+    Combined mode of run_generation_for_feature: a single call per record returns every feature of `feature_names` as one
+    JSON object (combined_features_prompt, each feature with its own guidelines and few-shot labels), so 'text_content'
+    and the request overhead are sent once instead of once per feature. The reply is fanned out to the per-feature
+    outputs (`<features_dir>/<feature_name>/`), which stay the same as in per-feature mode.
+
+    A record is pending until every feature is stored for it, and its call asks only for the features it still lacks
+    (e.g. features stored by a per-feature run or by an earlier reply are not generated nor saved again). Features
+    missing or invalid in a reply are not saved for that record (it is sent again on the next run, for those features
+    only); a reply with no valid feature counts as failed.
+    """
+
+    mode_msg = f"🧪 PILOT MODE (Max {pilot_size} records)" if pilot_mode else "🚀 PRODUCTION MODE (Full Data)"
+    logging.info(f"STARTING COMBINED GENERATION of {', '.join(feature_names)}")
+    logging.info(f"MODE: {mode_msg}")
+
+    few_shot_examples = process_labeled_sample_for_combined_llm(df_train, feature_names)
+
+    # Resume: done records are the ones stored for every feature
+    stores = {f: FeatureResultStore(features_dir, f, feature_configs[f]['type'], compact_every) for f in feature_names}
+    stored_ids = {f: store.scan_ids().unique().collect() for f, store in stores.items()}
+    processed_ids = None
+    for ids in stored_ids.values():
+        processed_ids = ids if processed_ids is None else processed_ids.join(ids, on='comment_id', how='inner')
+    df_to_process = _select_pending_records(processed_ids.lazy(), df, pilot_mode, pilot_size, pilot_seed, logging)
+
+    n_to_process = len(df_to_process)
+    if n_to_process == 0:
+        logging.info("✅ No new records to process. Exiting.")
+        for store in stores.values():
+            store.close()
+        return
+
+    # Features each pending record still lacks, in the order of `feature_names`
+    df_to_process = df_to_process.with_columns(
+        pl.concat_list([
+            pl.when(pl.col('comment_id').is_in(stored_ids[f]['comment_id'].implode())).then(pl.lit(None, dtype=pl.Utf8)).otherwise(pl.lit(f))
+            for f in feature_names
+        ]).list.drop_nulls().list.join(',').alias('missing_features')
+    )
+    groups = df_to_process.partition_by('missing_features', maintain_order=True, as_dict=True)
+    n_missing_values = sum(len(group) * len(key[0].split(',')) for key, group in groups.items())
+    logging.info(f"⏳ Queue size: {n_to_process} new records to process ({n_missing_values} missing feature values, "
+                 f"{len(groups)} feature sets).")
+
+    if prepare_records is not None:
+        # Inputs built for the pending records only (e.g. post contexts of their posts)
+        df_to_process, posts = prepare_records(df_to_process, posts)
+        groups = df_to_process.partition_by('missing_features', maintain_order=True, as_dict=True)
+
+    # One estimate per set of missing features (records sharing a set share the prompt template)
+    for (missing_features,), group in groups.items():
+        group_features = missing_features.split(',')
+        _log_generation_estimate(f"combined features: {missing_features}", combined_features_prompt('', few_shot_examples, group_features),
+                                 group, posts, output_tokens_per_record * len(group_features), outlier_prompt_tokens)
+
+    def iter_work_items():
+        for (missing_features,), group in groups.items():
+            group_features = missing_features.split(',')
+            for comment_id, text_input in _iter_text_records(group, posts, batch_save_size):
+                yield comment_id, text_input, group_features
+
+    def generate(comment_id, text_input, group_features):
+        try:
+            llm_response = combined_features_score(client, text_input, few_shot_examples, group_features)
+            values = {f: parse_prediction(llm_response, f, feature_configs[f]['type']) for f in group_features}
+            values = {f: value for f, value in values.items() if value is not None}
+            return [(comment_id, values or None)]
         except Exception as e:
-            logging.warning(f"⚠️ Error in record {i}: {e}")
-            if feature_config['type'] == 'ordinal': predicted_value = -1
-            elif feature_config['type'] == 'continuous': predicted_value = 0.0
-            else: predicted_value = "ERROR"
-        
-        # Add result to buffer
-        results_buffer.append({
-            "comment_id": comment_id,
-            feature_name: llm_response
-        })
-        
-        n_processed_records += 1
+            logging.warning(f"⚠️ Error in record {comment_id}: {e}")
+            return [(comment_id, None)]
 
-        # 6. Incremental Saving (Batching)
-        if n_processed_records % batch_save_size == 0 or n_processed_records == n_to_process:
-            logging.info(f"💾 Saving batch... ({n_processed_records}/{n_to_process})")
-            
-            df_new_chunk = pl.DataFrame(results_buffer)
-            
-            # Append Logic
-            if os.path.exists(feature_file_path):
-                try:
-                    df_current = pl.read_parquet(feature_file_path)
-                    # Vertical concat
-                    df_combined = pl.concat([df_current, df_new_chunk])
-                    df_combined.write_parquet(feature_file_path)
-                except Exception as e:
-                    logging.error(f"❌ Error saving batch: {e}")
-            else:
-                # Create new file
-                df_new_chunk.write_parquet(feature_file_path)
-            
-            # Clear buffer
-            results_buffer = []
+    def save(results):
+        # Fan-out: one (comment_id, value) part per feature, holding only the features the records lacked
+        for feature_name, store in stores.items():
+            feature_results = [(comment_id, values[feature_name]) for comment_id, values in results if feature_name in values]
+            if feature_results:
+                store.append(feature_results)
 
-    logging.info("✅ Generation Process Completed.")
+    n_failed_records = _generate_concurrently(iter_work_items(), n_to_process, generate, save,
+                                              batch_save_size, max_concurrent_requests, logging)
+
+    # Final compaction: every feature ends up in a single file
+    for store in stores.values():
+        store.close()
+
+    if n_failed_records:
+        logging.warning(f"⚠️ {n_failed_records} records failed (API error or invalid reply). They will be retried on the next run.")
+    logging.info("✅ Combined Generation Process Completed.")
+
+#==============================================================================
+
+def _build_thread_chunks(df_to_process, max_comment_tokens, max_comments):
+    """
+    Groups pending comments by post_id into chunks of up to `max_comments` comments and `max_comment_tokens` comment
+    tokens (a longer comment gets a chunk of its own). Returns one comments DataFrame per chunk.
+    """
+    # Counts missing from the processed tables (see build_processed_tables) are computed here
+    if 'comment_body_n_tokens' not in df_to_process.columns or df_to_process['comment_body_n_tokens'].null_count() > 0:
+        df_to_process = df_to_process.with_columns(
+            pl.Series('comment_body_n_tokens', count_tokens(df_to_process['comment_body'].to_list(), LLM_MODEL), dtype=pl.UInt32)
+        )
+    chunks = []
+    for comments in df_to_process.partition_by('post_id', maintain_order=True):
+        start, n_tokens = 0, 0
+        for i, tokens in enumerate(comments['comment_body_n_tokens'].to_list()):
+            if i > start and (n_tokens + tokens > max_comment_tokens or i - start >= max_comments):
+                chunks.append(comments[start:i])
+                start, n_tokens = i, 0
+            n_tokens += tokens
+        chunks.append(comments[start:])
+    return chunks
+
+
+def run_thread_generation_for_feature(feature_name, features_dir, feature_config, df, df_train, batch_save_size, pilot_mode, pilot_size, pilot_seed, client, logging, posts,
+                                      output_tokens_per_record=12, outlier_prompt_tokens=None, max_concurrent_requests=1, compact_every=50,
+                                      max_comment_tokens=3000, max_comments_per_request=20, prepare_records=None):
+    """
+    Thread-grouped mode of run_generation_for_feature: pending comments are grouped by post_id into chunks (see
+    _build_thread_chunks) and each chunk is classified by one call (thread_prompt), with the post context sent once
+    and the comments as a numbered list. The reply is a JSON 'results' array keyed by comment number.
+
+    Comments missing from the reply, or with an invalid value (malformed or partial array), fall back to
+    single-comment calls (feature_config['func']), so a bad reply only costs the calls of the comments it missed.
+    Chunks of a single comment use the single-comment call directly.
+    """
+
+    if posts is None:
+        raise ValueError("Thread-grouped requests need the posts table (`posts`) to send each post context once.")
+
+    mode_msg = f"🧪 PILOT MODE (Max {pilot_size} records)" if pilot_mode else "🚀 PRODUCTION MODE (Full Data)"
+    logging.info(f"STARTING THREAD-GROUPED GENERATION of {feature_name}")
+    logging.info(f"MODE: {mode_msg}")
+
+    few_shot_examples = process_labeled_sample_for_llm(df_train, feature_name)
+
+    store = FeatureResultStore(features_dir, feature_name, feature_config['type'], compact_every)
+    df_to_process = _select_pending_records(store.scan_ids(), df, pilot_mode, pilot_size, pilot_seed, logging)
+
+    n_to_process = len(df_to_process)
+    if n_to_process == 0:
+        logging.info("✅ No new records to process. Exiting.")
+        store.close()
+        return
+
+    if prepare_records is not None:
+        # Inputs built for the pending records only (e.g. post contexts of their posts)
+        df_to_process, posts = prepare_records(df_to_process, posts)
+
+    # 1. Chunks of comments of the same post, and the context of their posts
+    chunks = _build_thread_chunks(df_to_process, max_comment_tokens, max_comments_per_request)
+    post_context = {
+        post_id: (post_title or '', post_body or '')
+        for post_id, post_title, post_body in posts.filter(pl.col('post_id').is_in(df_to_process['post_id'].unique().implode()))
+        .select('post_id', 'post_title', 'post_body').iter_rows()
+    }
+    logging.info(f"⏳ Queue size: {n_to_process} new records to process.")
+    logging.info(f"🧵 {n_to_process} comments grouped into {len(chunks)} requests ({n_to_process / len(chunks):.1f} comments per request).")
+
+    # 2. Token/cost estimate: prompt template + post context + numbered comments of every chunk
+    template_tokens = count_message_tokens(thread_prompt(feature_name, '', '', [], few_shot_examples), LLM_MODEL)
+    chunk_texts = []
+    for comments in chunks:
+        post_title, post_body = post_context.get(comments['post_id'][0], ('', ''))
+        numbered_comments = "\n\n".join(f"[{i}] {body}" for i, body in enumerate(comments['comment_body'].to_list(), start=1))
+        chunk_texts.append(post_title + post_body + numbered_comments)
+    prompt_tokens = [template_tokens + n for n in count_tokens(chunk_texts, LLM_MODEL)]
+    estimate = estimate_run_cost(prompt_tokens, output_tokens_per_record, LLM_MODEL, outlier_prompt_tokens, n_output_records=n_to_process)
+    log_run_estimate(feature_name, estimate, outlier_prompt_tokens)
+
+    # 3. One call per chunk, single-comment calls for the comments it missed
+    lock = threading.Lock()
+    n_fallback_calls = 0
+
+    def generate_single(comments):
+        nonlocal n_fallback_calls
+        post_id = comments['post_id'][0]
+        post_title, post_body = post_context.get(post_id, ('', ''))
+        post_df = pl.DataFrame({'post_id': [post_id], 'post_title': [post_title], 'post_body': [post_body]})
+        results = []
+        for comment_id, text_input in _iter_text_records(comments, post_df, len(comments)):
+            try:
+                llm_response = feature_config['func'](
+                    client=client, 
+                    content=text_input, 
+                    few_shot_examples=few_shot_examples
+                )
+                results.append((comment_id, parse_prediction(llm_response, feature_name, feature_config['type'])))
+            except Exception as e:
+                logging.warning(f"⚠️ Error in record {comment_id}: {e}")
+                results.append((comment_id, None))
+        with lock:
+            n_fallback_calls += len(comments)
+        return results
+
+    def generate(comments):
+        if len(comments) == 1:
+            return generate_single(comments)
+        post_title, post_body = post_context.get(comments['post_id'][0], ('', ''))
+        comment_ids = comments['comment_id'].to_list()
+        try:
+            llm_response = thread_score(client, feature_name, post_title, post_body, comments['comment_body'].to_list(), few_shot_examples)
+            predictions = parse_thread_predictions(llm_response, feature_name, feature_config['type'], len(comment_ids))
+        except Exception as e:
+            logging.warning(f"⚠️ Error in thread request ({len(comment_ids)} comments of post {comments['post_id'][0]}): {e}")
+            predictions = {}
+        results = [(comment_ids[number - 1], value) for number, value in predictions.items()]
+        missing = [i for i in range(len(comment_ids)) if i + 1 not in predictions]
+        if missing:
+            results += generate_single(comments.select(pl.all().gather(missing)))
+        return results
+
+    n_failed_records = _generate_concurrently(((comments,) for comments in chunks), n_to_process, generate, store.append,
+                                              batch_save_size, max_concurrent_requests, logging)
+
+    # Final compaction: the feature ends up in a single file
+    store.close()
+
+    n_single_chunks = sum(1 for comments in chunks if len(comments) == 1)
+    logging.info(f"🔁 {n_fallback_calls - n_single_chunks} comments re-sent as single-comment calls (missing or invalid in the thread reply).")
+    if n_failed_records:
+        logging.warning(f"⚠️ {n_failed_records} records failed (API error or invalid reply). They will be retried on the next run.")
+    logging.info("✅ Thread-Grouped Generation Process Completed.")
+
+#==============================================================================
+
+def run_batch_generation_for_feature(feature_name, features_dir, feature_config, df, df_train, pilot_mode, pilot_size, pilot_seed, client, logging, posts=None,
+                                     output_tokens_per_record=12, outlier_prompt_tokens=None, max_requests_per_batch=BATCH_MAX_REQUESTS,
+                                     poll_seconds=60, timeout_seconds=None, compact_every=50, prepare_records=None):
+    """
+    Batch mode of run_generation_for_feature, for full-dataset runs that do not need interactive latency: the prompts
+    of every pending record are rendered into JSONL request files (`<features_dir>/batches/<feature_name>/`, up to
+    `max_requests_per_batch` requests each) and submitted through the provider's asynchronous batch interface, at
+    batch pricing (see llm_batch_utils). Batches are polled every `poll_seconds` and their replies are ingested into
+    the FeatureResultStore keyed by comment_id (the custom_id of every request).
+
+    Submitted batches are kept in a BatchJobLog until ingested: if polling stops (`timeout_seconds`, or the process
+    is interrupted), the next run waits for the same batches instead of submitting their records again.
+    Failed requests are not saved, so the next run submits them again.
+    """
+
+    if feature_config.get('prompt') is None:
+        raise ValueError(f"Batch mode needs the prompt builder of '{feature_name}' ('prompt' in its FEATURE_CONFIG).")
+
+    mode_msg = f"🧪 PILOT MODE (Max {pilot_size} records)" if pilot_mode else "🚀 PRODUCTION MODE (Full Data)"
+    logging.info(f"STARTING BATCH GENERATION of {feature_name}")
+    logging.info(f"MODE: {mode_msg}")
+
+    few_shot_examples = process_labeled_sample_for_llm(df_train, feature_name)
+    store = FeatureResultStore(features_dir, feature_name, feature_config['type'], compact_every)
+    batch_dir = os.path.join(features_dir, 'batches', feature_name)
+    job_log = BatchJobLog(batch_dir)
+
+    def ingest(job):
+        """Waits for a submitted batch and saves its parsed replies. Returns False if it is still running."""
+        batch = wait_for_batch(client, job['batch_id'], poll_seconds, timeout_seconds)
+        if batch is None:
+            logging.warning(f"⚠️ Batch {job['batch_id']} still running: its results will be ingested on the next run.")
+            return False
+        replies = download_batch_results(client, batch)
+        results = [(comment_id, parse_prediction(reply, feature_name, feature_config['type'])) for comment_id, reply in replies.items()]
+        results = [(comment_id, value) for comment_id, value in results if value is not None]
+        if results:
+            store.append(results)
+        n_failed = job['n_requests'] - len(results)
+        job_log.record_ingestion(job['batch_id'], batch.status, len(results), n_failed)
+        logging.info(f"💾 Batch {job['batch_id']} ({batch.status}): {len(results)}/{job['n_requests']} results saved.")
+        if n_failed:
+            logging.warning(f"⚠️ {n_failed} requests failed or unanswered (API error, invalid reply or expired batch). They will be submitted again on the next run.")
+        return True
+
+    # 1. Batches submitted by a previous run come first: their records must not be submitted twice
+    pending_jobs = job_log.pending()
+    if pending_jobs:
+        logging.info(f"🔄 Resume: {len(pending_jobs)} batches submitted by a previous run.")
+        still_running = [job for job in pending_jobs if not ingest(job)]
+        if still_running:
+            store.close()
+            return
+
+    # 2. Pending records (resume and pilot limit as in the interactive mode)
+    df_to_process = _select_pending_records(store.scan_ids(), df, pilot_mode, pilot_size, pilot_seed, logging)
+    n_to_process = len(df_to_process)
+    if n_to_process == 0:
+        logging.info("✅ No new records to process. Exiting.")
+        store.close()
+        return
+
+    logging.info(f"⏳ Queue size: {n_to_process} new records to process.")
+    if prepare_records is not None:
+        # Inputs built for the pending records only (e.g. post contexts of their posts)
+        df_to_process, posts = prepare_records(df_to_process, posts)
+    _log_generation_estimate(feature_name, feature_config['prompt']('', few_shot_examples), df_to_process, posts,
+                             output_tokens_per_record, outlier_prompt_tokens, batch_api=True)
+
+    # 3. Render the request files ('text_content' assembled per slice) and submit them
+    def iter_requests(chunk):
+        for records in chunk.iter_slices(10_000):
+            if posts is not None:
+                records = assemble_text_content(records, posts)
+            for comment_id, text_input in records.select('comment_id', 'text_content').iter_rows():
+                messages = feature_config['prompt'](text_input, few_shot_examples)
+                yield build_batch_request(comment_id, _chat_request_body(messages))
+
+    for chunk in df_to_process.iter_slices(max_requests_per_batch):
+        # Numbered after every batch ever submitted for the feature, so request files are never overwritten
+        input_path = os.path.join(batch_dir, f"batch_input_{len(job_log.data['batches']):05d}.jsonl")
+        n_requests = write_batch_requests(input_path, iter_requests(chunk))
+        batch = submit_batch(client, input_path, metadata={'feature_name': feature_name})
+        job_log.record_submission(batch.id, input_path, n_requests)
+        logging.info(f"📤 Batch {batch.id} submitted: {n_requests} requests ({input_path}).")
+
+    # 4. Poll and ingest (batches run in parallel on the provider side)
+    still_running = [job for job in job_log.pending() if not ingest(job)]
+
+    # Final compaction: the feature ends up in a single file
+    store.close()
+    if still_running:
+        logging.info(f"⏸️ {len(still_running)} batches still running: rerun to ingest their results.")
+        return
+    logging.info("✅ Batch Generation Process Completed.")
 
 #==============================================================================
 
@@ -0,0 +1,150 @@
+# feature_store_utils.py
+
+import os
+import re
+import logging
+import threading
+import polars as pl
+
+# Stored dtype of every feature type
+FEATURE_DTYPES = {'ordinal': pl.Int64, 'continuous': pl.Float64, 'categorical': pl.Utf8}
+
+# File names inside a feature directory: part_<NNNNN>.parquet (one checkpoint) and compacted_<NNNNN>.parquet
+# (every part up to NNNNN). Numbers only grow, so sorting by number sorts files from oldest to newest.
+FEATURE_FILE_PATTERN = re.compile(r'^(part|compacted)_(\d{5,})\.parquet$')
+
+# --- LEGACY SINGLE-FILE OUTPUT ---
+
+def load_feature_results(feature_file_path, feature_name, feature_type):
+    """
+    Reads a single feature file (comment_id, feature_name) with the feature column cast to its type.
+    Files written before values were parsed hold the raw JSON replies: their values are extracted.
+    """
+    df = pl.read_parquet(feature_file_path)
+    column = pl.col(feature_name)
+    if df.schema[feature_name] == pl.Utf8:
+        df = df.with_columns(
+            pl.when(column.str.starts_with('{')).then(column.str.json_path_match(f'$.{feature_name}')).otherwise(column).alias(feature_name)
+        )
+    return df.with_columns(column.cast(FEATURE_DTYPES[feature_type], strict=False))
+
+# --- APPEND-ONLY FEATURE STORE ---
+
+class FeatureResultStore:
+    """
+    Append-only output of a generated feature, stored at `<features_dir>/<feature_name>/`.
+
+    Every checkpoint is a new, small, immutable part file (written to a temporary file and renamed), so its cost
+    does not grow with the run and a crash can at most lose the batch being written. Once `compact_every` parts
+    have accumulated, a background thread merges them, with the previous compacted file, into a new compacted
+    file and deletes the merged files. Readers dedupe by comment_id (latest file wins), so a crash between
+    writing the compacted file and deleting its inputs only leaves duplicates behind.
+
+    A legacy single file `<features_dir>/<feature_name>.parquet` is read too, and merged by the next compaction.
+    """
+
+    def __init__(self, features_dir, feature_name, feature_type, compact_every=50):
+        self.feature_dir = os.path.join(features_dir, feature_name)
+        self.legacy_path = os.path.join(features_dir, f'{feature_name}.parquet')
+        self.feature_name = feature_name
+        self.feature_type = feature_type
+        self.schema = {'comment_id': pl.Utf8, feature_name: FEATURE_DTYPES[feature_type]}
+        self.compact_every = compact_every
+        numbers = [number for _, number in self._files()]
+        self.next_number = max(numbers) + 1 if numbers else 0
+        self.n_parts_since_compaction = sum(1 for kind, _ in self._files() if kind == 'part')
+        self.compaction_thread = None
+
+    def _files(self):
+        """(kind, number) of the files of the store, from oldest to newest."""
+        files = []
+        # The feature directory is created by the first append, so reading a store never creates it
+        if not os.path.isdir(self.feature_dir):
+            return files
+        for name in os.listdir(self.feature_dir):
+            match = FEATURE_FILE_PATTERN.match(name)
+            if match:
+                files.append((match.group(1), int(match.group(2))))
+        # A compacted file is older than the part of the same number it absorbed
+        return sorted(files, key=lambda f: (f[1], f[0] == 'part'))
+
+    def _path(self, kind, number):
+        return os.path.join(self.feature_dir, f'{kind}_{number:05d}.parquet')
+
+    def _write(self, df, path):
+        tmp_path = path + '.tmp'
+        df.write_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+    def append(self, results):
+        """Writes (comment_id, value) results as a new part file. Triggers a background compaction when due."""
+        df = pl.DataFrame(results, schema=self.schema, orient='row')
+        os.makedirs(self.feature_dir, exist_ok=True)
+        self._write(df, self._path('part', self.next_number))
+        self.next_number += 1
+        self.n_parts_since_compaction += 1
+        if self.n_parts_since_compaction >= self.compact_every and not self._compacting():
+            self.n_parts_since_compaction = 0
+            self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+            self.compaction_thread.start()
+
+    def _compacting(self):
+        return self.compaction_thread is not None and self.compaction_thread.is_alive()
+
+    def scan(self):
+        """
+        Lazily scans every stored result, one row per comment_id (latest file wins).
+        Returns an empty LazyFrame with the store schema if nothing is stored yet.
+        """
+        frames = []
+        if os.path.exists(self.legacy_path):
+            frames.append(load_feature_results(self.legacy_path, self.feature_name, self.feature_type).lazy())
+        frames += [pl.scan_parquet(self._path(kind, number)) for kind, number in self._files()]
+        if not frames:
+            return pl.LazyFrame(schema=self.schema)
+        return pl.concat(frames, how='vertical_relaxed').unique(subset='comment_id', keep='last', maintain_order=True)
+
+    def scan_ids(self):
+        """Lazily scans the comment_id column alone, e.g. to anti-join the records still to process."""
+        return self.scan().select('comment_id')
+
+    def compact(self):
+        """Merges the files present now (and the legacy file) into one compacted file, then deletes them."""
+        files = self._files()
+        has_legacy = os.path.exists(self.legacy_path)
+        if len(files) + has_legacy <= 1:
+            return
+        last_number = files[-1][1] if files else self.next_number - 1
+        frames = [load_feature_results(self.legacy_path, self.feature_name, self.feature_type).lazy()] if has_legacy else []
+        frames += [pl.scan_parquet(self._path(kind, number)) for kind, number in files]
+        compacted_path = self._path('compacted', last_number)
+        tmp_path = compacted_path + '.tmp'
+        pl.concat(frames, how='vertical_relaxed').unique(subset='comment_id', keep='last', maintain_order=True).sink_parquet(tmp_path)
+        # A compacted file may replace a part file of the same number: it is renamed over nothing else
+        os.replace(tmp_path, compacted_path)
+        for kind, number in files:
+            if (kind, number) != ('compacted', last_number):
+                os.remove(self._path(kind, number))
+        if has_legacy:
+            os.remove(self.legacy_path)
+        logging.info(f"🗂️ {self.feature_name}: {len(files) + has_legacy} files compacted into {compacted_path}")
+
+    def close(self):
+        """Waits for a running background compaction, then compacts what is left into a single file."""
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+        self.compact()
+        # Leftovers of writes interrupted by a crash
+        for name in (os.listdir(self.feature_dir) if os.path.isdir(self.feature_dir) else []):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.feature_dir, name))
+
+
+def scan_feature_results(features_dir, feature_name, feature_type):
+    """
+    Lazily scans a generated feature (comment_id, feature_name), whatever its storage state (parts, compacted,
+    legacy single file). Raises FileNotFoundError if the feature has not been generated.
+    """
+    if not os.path.isdir(os.path.join(features_dir, feature_name)) and not os.path.exists(os.path.join(features_dir, f'{feature_name}.parquet')):
+        raise FileNotFoundError(f"Feature '{feature_name}' not found in {features_dir} (run the generation scripts first).")
+    return FeatureResultStore(features_dir, feature_name, feature_type).scan()
@@ -0,0 +1,237 @@
+# graph_utils.py
+
+import numpy as np
+import polars as pl
+import scipy.sparse as sp
+
+# --- REPLY EDGES ---
+
+def build_reply_edges(comments_df, stance_groups):
+    """
+    Builds one reply edge per comment (child -> parent) from a comments table with comment_id, post_id,
+    comment_parent_id, comment_author_id, post_author_id and an optional 'stance' column (e.g. political_stance).
+
+    Replies to a comment point to that comment and its author; top-level comments point to the post author
+    (parent_comment_id is null). Stance scores are mapped to group indexes with `stance_groups`
+    ({score: group index}); comments without a (known) stance get a null group.
+    Everything is done with joins, so millions of edges stay vectorized.
+    """
+    has_stance = 'stance' in comments_df.columns
+    nodes = comments_df.select(
+        'comment_id', 'post_id', 'comment_parent_id', 'comment_author_id', 'post_author_id',
+        pl.col('stance').cast(pl.Float64) if has_stance else pl.lit(None, dtype=pl.Float64).alias('stance'),
+    ).unique(subset='comment_id', keep='first').filter(pl.col('comment_parent_id').is_not_null())
+
+    nodes = nodes.with_columns(
+        pl.col('stance').round(0).cast(pl.Int64).replace_strict(stance_groups, default=None, return_dtype=pl.Int64).alias('stance_group'),
+        pl.when(pl.col('comment_parent_id').str.starts_with('t1_'))
+          .then(pl.col('comment_parent_id').str.slice(3))
+          .alias('parent_comment_id'),
+    )
+    parents = nodes.select(
+        pl.col('comment_id').alias('parent_comment_id'),
+        pl.col('comment_author_id').alias('parent_comment_author_id'),
+        pl.col('stance').alias('parent_stance'),
+        pl.col('stance_group').alias('parent_stance_group'),
+    )
+
+    return nodes.join(parents, on='parent_comment_id', how='left').select(
+        pl.col('comment_id').alias('child_comment_id'),
+        'parent_comment_id',
+        'post_id',
+        pl.col('comment_author_id').alias('child_author_id'),
+        pl.when(pl.col('parent_comment_id').is_null())
+          .then(pl.col('post_author_id'))
+          .otherwise(pl.col('parent_comment_author_id'))
+          .alias('parent_author_id'),
+        pl.col('stance').alias('child_stance'),
+        'parent_stance',
+        pl.col('stance_group').alias('child_stance_group'),
+        'parent_stance_group',
+    )
+
+# --- SPARSE ADJACENCY (CSR) ---
+
+def build_comment_adjacency(edges):
+    """
+    Comment reply graph as a CSR matrix: A[i, j] = 1 if comment i replies to comment j.
+    Returns (A, comment_ids), comment_ids[i] being the ID of node i.
+    """
+    edges = edges.filter(pl.col('parent_comment_id').is_not_null())
+    comment_ids = pl.concat([edges['child_comment_id'], edges['parent_comment_id']]).unique().sort()
+    index = pl.DataFrame({'comment_id': comment_ids, 'node': np.arange(len(comment_ids))})
+    rows = edges.join(index, left_on='child_comment_id', right_on='comment_id')['node'].to_numpy()
+    cols = edges.join(index, left_on='parent_comment_id', right_on='comment_id')['node'].to_numpy()
+    A = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(comment_ids), len(comment_ids)))
+    return A, comment_ids
+
+
+def build_author_adjacency(edges):
+    """
+    Author interaction graph as a CSR matrix: A[i, j] = number of replies of author i to author j
+    (self-replies and deleted authors excluded). Returns (A, author_ids), author_ids[i] being the ID of node i.
+    """
+    edges = edges.filter(
+        pl.col('child_author_id').is_not_null() & pl.col('parent_author_id').is_not_null() &
+        (pl.col('child_author_id') != pl.col('parent_author_id'))
+    )
+    author_ids = pl.concat([edges['child_author_id'], edges['parent_author_id']]).unique().sort()
+    index = pl.DataFrame({'author_id': author_ids, 'node': np.arange(len(author_ids))})
+    pairs = (edges.select('child_author_id', 'parent_author_id')
+             .join(index.rename({'author_id': 'child_author_id', 'node': 'row'}), on='child_author_id')
+             .join(index.rename({'author_id': 'parent_author_id', 'node': 'col'}), on='parent_author_id'))
+    # Duplicate (row, col) pairs are summed by the CSR constructor
+    A = sp.csr_matrix((np.ones(len(pairs), dtype=np.float32), (pairs['row'].to_numpy(), pairs['col'].to_numpy())),
+                      shape=(len(author_ids), len(author_ids)))
+    return A, author_ids
+
+
+def author_stance_groups(comments_df, author_ids, stance_groups):
+    """
+    Stance group index of every author in `author_ids` (their mean comment stance, rounded),
+    or -1 for authors without any stance-scored comment.
+    """
+    author_stance = (comments_df.filter(pl.col('stance').is_not_null() & pl.col('comment_author_id').is_not_null())
+                     .group_by('comment_author_id')
+                     .agg(pl.col('stance').cast(pl.Float64).mean().round(0).cast(pl.Int64).alias('stance')))
+    groups = (pl.DataFrame({'comment_author_id': author_ids})
+              .join(author_stance, on='comment_author_id', how='left')
+              .select(pl.col('stance').replace_strict(stance_groups, default=-1, return_dtype=pl.Int64)))
+    return groups.to_series().fill_null(-1).to_numpy()
+
+# --- POLARIZATION METRICS ---
+
+def stance_mixing_matrix(child_groups, parent_groups, n_groups):
+    """k x k matrix of edge counts between stance groups (rows: replying side, columns: replied side)."""
+    child_groups, parent_groups = np.asarray(child_groups), np.asarray(parent_groups)
+    known = (child_groups >= 0) & (parent_groups >= 0)
+    flat = child_groups[known] * n_groups + parent_groups[known]
+    return np.bincount(flat, minlength=n_groups * n_groups).reshape(n_groups, n_groups).astype(np.float64)
+
+
+def cross_stance_rate(mixing):
+    """Share of interactions between different stance groups (off-diagonal mass of the mixing matrix)."""
+    total = mixing.sum()
+    return float(1 - np.trace(mixing) / total) if total else float('nan')
+
+
+def categorical_assortativity(mixing):
+    """
+    Newman's assortativity coefficient for categorical node attributes, on the symmetrized mixing matrix:
+    r = (sum_i e_ii - sum_i a_i^2) / (1 - sum_i a_i^2). 1 = only same-group interactions, 0 = random mixing,
+    negative = interactions mostly across groups.
+    """
+    e = mixing + mixing.T
+    total = e.sum()
+    if not total:
+        return float('nan')
+    e = e / total
+    a_squared = (e.sum(axis=1) ** 2).sum()
+    return float((np.trace(e) - a_squared) / (1 - a_squared)) if a_squared < 1 else float('nan')
+
+
+def numeric_assortativity(child_values, parent_values):
+    """Pearson correlation of the stance scores at both ends of every edge, both directions counted (undirected)."""
+    child_values, parent_values = np.asarray(child_values, dtype=np.float64), np.asarray(parent_values, dtype=np.float64)
+    known = ~(np.isnan(child_values) | np.isnan(parent_values))
+    x = np.concatenate([child_values[known], parent_values[known]])
+    y = np.concatenate([parent_values[known], child_values[known]])
+    if len(x) < 2 or x.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def author_exposure_metrics(A, author_ids, author_groups, n_groups):
+    """
+    Per-author exposure to the other stance groups, from the author interaction graph.
+
+    The graph is symmetrized (U = A + A^T, replies in either direction count as an interaction) and multiplied
+    by the sparse one-hot matrix G of author groups: (U @ G)[i, g] = interactions of author i with group g.
+    Returns (per-author DataFrame, author-level mixing matrix G^T U G).
+    """
+    U = (A + A.T).tocsr()
+    known = author_groups >= 0
+    G = sp.csr_matrix((np.ones(known.sum()), (np.flatnonzero(known), author_groups[known])), shape=(len(author_ids), n_groups))
+    exposure = np.asarray((U @ G).todense())
+    mixing = np.asarray((G.T @ U @ G).todense())
+
+    n_interactions = np.asarray(U.sum(axis=1)).ravel()
+    n_known_interactions = exposure.sum(axis=1)
+    same_group = np.where(known, exposure[np.arange(len(author_ids)), np.clip(author_groups, 0, None)], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        same_group_share = np.where(n_known_interactions > 0, same_group / n_known_interactions, np.nan)
+
+    df = pl.DataFrame({
+        'author_id': author_ids,
+        'stance_group': author_groups,
+        'n_interactions': n_interactions.astype(np.int64),
+        'n_interaction_partners': np.diff(U.indptr).astype(np.int64),
+        'n_interactions_with_known_stance': n_known_interactions.astype(np.int64),
+        'same_stance_share': same_group_share,
+    }).with_columns(
+        pl.when(pl.col('stance_group') < 0).then(None).otherwise(pl.col('stance_group')).alias('stance_group'),
+        pl.col('same_stance_share').fill_nan(None),
+    )
+    return df, mixing
+
+
+def thread_echo_chamber_metrics(comments_df, edges, stance_groups, n_groups):
+    """
+    Echo-chamber metrics per thread (post_id), all computed with group_by aggregations:
+      - n_comments, n_authors, n_stance_comments, stance_mean, stance_std
+      - stance_homogeneity: share of the thread's largest stance group (1 = a single group)
+      - stance_entropy: normalized entropy of the stance group shares (0 = a single group, 1 = even mix)
+      - n_stance_edges, cross_stance_rate: share of comment-to-comment replies across stance groups
+      - stance_assortativity: correlation of stance scores between replies and their parents
+    """
+    scored = comments_df.filter(pl.col('stance').is_not_null()).with_columns(
+        pl.col('stance').cast(pl.Float64).round(0).cast(pl.Int64)
+          .replace_strict(stance_groups, default=None, return_dtype=pl.Int64).alias('stance_group')
+    )
+
+    group_shares = (scored.filter(pl.col('stance_group').is_not_null())
+                    .group_by('post_id', 'stance_group').agg(pl.len().alias('n'))
+                    .with_columns((pl.col('n') / pl.col('n').sum().over('post_id')).alias('share'))
+                    .group_by('post_id').agg(
+                        pl.col('share').max().alias('stance_homogeneity'),
+                        (-(pl.col('share') * pl.col('share').log()).sum() / np.log(n_groups)).alias('stance_entropy'),
+                    ))
+
+    threads = comments_df.group_by('post_id').agg(
+        pl.len().alias('n_comments'),
+        pl.col('comment_author_id').drop_nulls().n_unique().alias('n_authors'),
+        pl.col('stance').is_not_null().sum().alias('n_stance_comments'),
+        pl.col('stance').cast(pl.Float64).mean().alias('stance_mean'),
+        pl.col('stance').cast(pl.Float64).std().alias('stance_std'),
+    )
+
+    thread_edges = (edges.filter(pl.col('child_stance_group').is_not_null() & pl.col('parent_stance_group').is_not_null())
+                    .group_by('post_id').agg(
+                        pl.len().alias('n_stance_edges'),
+                        (pl.col('child_stance_group') != pl.col('parent_stance_group')).mean().alias('cross_stance_rate'),
+                        pl.corr('child_stance', 'parent_stance').alias('stance_assortativity'),
+                    ))
+
+    return (threads.join(group_shares, on='post_id', how='left')
+                   .join(thread_edges, on='post_id', how='left')
+                   .with_columns(pl.col('n_stance_edges').fill_null(0), pl.col('stance_assortativity').fill_nan(None))
+                   .sort('n_comments', descending=True))
+
+
+def compute_global_metrics(edges, author_mixing, n_groups):
+    """Corpus-level summary: cross-stance interaction rates and assortativity, at comment and author level."""
+    child_groups = edges['child_stance_group'].fill_null(-1).to_numpy()
+    parent_groups = edges['parent_stance_group'].fill_null(-1).to_numpy()
+    comment_mixing = stance_mixing_matrix(child_groups, parent_groups, n_groups)
+    return {
+        'n_reply_edges': len(edges),
+        'n_stance_edges': int(comment_mixing.sum()),
+        'comment_cross_stance_rate': cross_stance_rate(comment_mixing),
+        'comment_categorical_assortativity': categorical_assortativity(comment_mixing),
+        'comment_numeric_assortativity': numeric_assortativity(edges['child_stance'].fill_null(np.nan).to_numpy(),
+                                                               edges['parent_stance'].fill_null(np.nan).to_numpy()),
+        'comment_mixing_matrix': comment_mixing.tolist(),
+        'author_cross_stance_rate': cross_stance_rate(author_mixing),
+        'author_categorical_assortativity': categorical_assortativity(author_mixing),
+        'author_mixing_matrix': author_mixing.tolist(),
+    }
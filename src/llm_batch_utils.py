@@ -0,0 +1,147 @@
+# llm_batch_utils.py
+
+import os
+import json
+import time
+import logging
+import datetime as dt
+
+# --- BATCH INTERFACE ---
+
+# Asynchronous batch interface of the provider (OpenAI Batch API): a JSONL file of chat requests is uploaded,
+# processed within the completion window at a discounted price, and its replies are downloaded as another JSONL file.
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+# Provider limit of requests per batch
+BATCH_MAX_REQUESTS = 50_000
+# Statuses after which a batch no longer changes (an expired or cancelled batch may still hold partial results)
+BATCH_FINAL_STATUSES = ['completed', 'failed', 'expired', 'cancelled']
+
+# --- REQUEST FILES ---
+
+def build_batch_request(custom_id, body, endpoint=BATCH_ENDPOINT):
+    """One line of a batch input file: the request `body` sent to `endpoint`, identified by `custom_id`."""
+    return {'custom_id': custom_id, 'method': 'POST', 'url': endpoint, 'body': body}
+
+
+def write_batch_requests(path, requests):
+    """Writes the batch requests to a JSONL file (temporary file + rename). Returns the number of requests written."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    n_requests = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+            n_requests += 1
+    os.replace(tmp_path, path)
+    return n_requests
+
+
+def parse_batch_output(text):
+    """
+    Yields (custom_id, reply content) for every line of a batch output (or error) file.
+    The content is None for requests that failed (error or non-200 status).
+    """
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get('response') or {}
+        content = None
+        if not record.get('error') and response.get('status_code') == 200:
+            try:
+                content = response['body']['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                content = None
+        yield record['custom_id'], content
+
+# --- SUBMISSION, POLLING AND RESULTS ---
+
+def submit_batch(client, input_path, metadata=None, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW):
+    """Uploads a JSONL request file and creates a batch on it. Returns the batch object."""
+    with open(input_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+    return client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=endpoint,
+        completion_window=completion_window,
+        metadata=metadata
+    )
+
+
+def wait_for_batch(client, batch_id, poll_seconds=60, timeout_seconds=None):
+    """
+    Polls a batch every `poll_seconds` until it reaches a final status and returns it.
+    Returns None if `timeout_seconds` elapse first (the batch keeps running and can be resumed later).
+    """
+    started_at = time.monotonic()
+    last_status = None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status != last_status:
+            counts = batch.request_counts
+            progress = f" ({counts.completed + counts.failed}/{counts.total} requests)" if counts else ""
+            logging.info(f"🔄 Batch {batch_id}: {batch.status}{progress}")
+            last_status = batch.status
+        if batch.status in BATCH_FINAL_STATUSES:
+            return batch
+        if timeout_seconds is not None and time.monotonic() - started_at >= timeout_seconds:
+            return None
+        time.sleep(poll_seconds)
+
+
+def download_batch_results(client, batch):
+    """Returns {custom_id: reply content or None} for every request of a finished batch that has a result."""
+    results = {}
+    for file_id in [batch.output_file_id, batch.error_file_id]:
+        if file_id:
+            results.update(parse_batch_output(client.files.content(file_id).text))
+    return results
+
+# --- PENDING BATCH JOBS ---
+
+class BatchJobLog:
+    """
+    JSON log of the batches submitted for a feature, stored at `<batch_dir>/batch_jobs.json`.
+    A batch stays pending until its results are ingested, so a run interrupted while waiting (or a run that
+    stops polling on timeout) resumes the same batches instead of paying again for their requests.
+    """
+
+    def __init__(self, batch_dir):
+        self.path = os.path.join(batch_dir, 'batch_jobs.json')
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {'batches': []}
+
+    def pending(self):
+        return [job for job in self.data['batches'] if job.get('ingested_at') is None]
+
+    def record_submission(self, batch_id, input_path, n_requests):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.data['batches'].append({
+            'batch_id': batch_id,
+            'input_file': os.path.basename(input_path),
+            'n_requests': n_requests,
+            'submitted_at': dt.datetime.now(dt.timezone.utc).isoformat(),
+            'ingested_at': None,
+        })
+        self._save()
+
+    def record_ingestion(self, batch_id, status, n_saved, n_failed):
+        for job in self.data['batches']:
+            if job['batch_id'] == batch_id:
+                job.update({
+                    'status': status,
+                    'n_saved': n_saved,
+                    'n_failed': n_failed,
+                    'ingested_at': dt.datetime.now(dt.timezone.utc).isoformat(),
+                })
+        self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
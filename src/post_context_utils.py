@@ -0,0 +1,185 @@
+# post_context_utils.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import polars as pl
+
+from src.token_utils import DEFAULT_MODEL
+
+# --- POST CONTEXT MODES ---
+
+# 'full': the whole post body (as before) | 'truncate': the body cut at `max_chars` |
+# 'summary': a one-time LLM summary of the bodies longer than `max_chars` (shorter bodies are kept as they are)
+POST_CONTEXT_MODES = ['full', 'truncate', 'summary']
+
+TRUNCATION_MARKER = ' [...]'
+SUMMARY_PREFIX = '(Summary) '
+
+# --- HELPER FUNCTIONS: COMPACT CONTEXTS ---
+
+def truncate_post_body(body, max_chars):
+    """Cuts `body` at the last word boundary before `max_chars` characters, marking the cut."""
+    if body is None or len(body) <= max_chars:
+        return body
+    cut = body[:max_chars]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def summarize_post(client, post_title, post_body, max_words=120, model=DEFAULT_MODEL):
+    """Summarizes a post with the LLM (`model`), as context to interpret its comments. Returns None if the call fails."""
+
+    prompt = f"""
+Summarize the following Reddit post in at most {max_words} words. Keep the claims, positions, actors and events
+mentioned, since the summary is the only context available to interpret the comments of the post.
+Write plain text only.
+
+**POST TITLE:**
+{post_title}
+
+**POST BODY:**
+{post_body}
+"""
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a concise summarization assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.0
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        logging.error(f"❌ Error in OpenAI API call (Post Summary): {e}")
+        return None
+
+
+def _source_hash(post_title, post_body):
+    return hashlib.sha1(f"{post_title}\x00{post_body}".encode('utf-8')).hexdigest()
+
+# --- PERSISTENT POST CONTEXT CACHE ---
+
+# Post ids per lookup query (SQLite bounds the number of parameters of a statement)
+CACHE_LOOKUP_CHUNK_SIZE = 500
+
+class PostContextCache:
+    """
+    On-disk (SQLite) cache of post summaries, keyed by post_id.
+    Every row keeps the hash of the title/body it was generated from, so a summary is regenerated only
+    when the post text changes (e.g. an edited post re-extracted later), and never once per comment.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS post_summaries (
+                post_id TEXT PRIMARY KEY,
+                source_hash TEXT,
+                summary TEXT,
+                created_at REAL
+            ) WITHOUT ROWID;
+        """)
+
+    def get(self, post_ids):
+        """Returns {post_id: (source_hash, summary)} for the cached posts of `post_ids`."""
+        post_ids = list(dict.fromkeys(post_ids))
+        cached = {}
+        # Primary-key lookups of the requested ids only, in chunks below SQLite's bound-parameter limit
+        for i in range(0, len(post_ids), CACHE_LOOKUP_CHUNK_SIZE):
+            chunk = post_ids[i:i + CACHE_LOOKUP_CHUNK_SIZE]
+            rows = self.conn.execute(
+                f"SELECT post_id, source_hash, summary FROM post_summaries WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            cached.update({row[0]: (row[1], row[2]) for row in rows})
+        return cached
+
+    def upsert(self, post_id, source_hash, summary):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO post_summaries (post_id, source_hash, summary, created_at) VALUES (?, ?, ?, ?)",
+                (post_id, source_hash, summary, time.time())
+            )
+
+    def close(self):
+        self.conn.close()
+
+# --- CORE FUNCTION ---
+
+def build_post_contexts(posts, mode='truncate', max_chars=1500, client=None, cache=None, max_concurrent_requests=1, model=DEFAULT_MODEL):
+    """
+    Returns one compact context per post: a DataFrame (post_id, post_title, post_body) where post_body is the
+    context sent with every comment of the post (see assemble_text_content), instead of the full body.
+
+    - 'full': bodies unchanged.
+    - 'truncate': bodies longer than `max_chars` are cut at a word boundary.
+    - 'summary': bodies longer than `max_chars` are replaced by an LLM summary, generated once per post and kept
+      in `cache` (PostContextCache) across runs. Posts whose summary fails fall back to the truncated body.
+      Missing summaries are generated by `model` (the model of the feature generation), with up to
+      `max_concurrent_requests` calls in flight.
+
+    `posts` may be a DataFrame or a LazyFrame of processed posts: pass only the posts of the comments about to be
+    sent, so no summary is generated for posts whose comments are already done. Stored token counts of the post
+    fields are kept; the body count is cleared where the context replaces the body (see apply_truncation_policies).
+    """
+    if mode not in POST_CONTEXT_MODES:
+        raise ValueError(f"Unknown post context mode '{mode}'. Use one of {POST_CONTEXT_MODES}.")
+    columns = ['post_id', 'post_title', 'post_body', pl.col('^post_(title|body)_n_tokens$')]
+    if isinstance(posts, pl.LazyFrame):
+        posts = posts.select(columns).collect()
+    posts = posts.select(columns)
+    n_chars_before = posts['post_body'].str.len_chars().sum() or 0
+
+    if mode == 'full':
+        return posts
+
+    long_posts = posts.filter(pl.col('post_body').str.len_chars() > max_chars)
+    contexts = {}
+    if mode == 'summary' and len(long_posts) > 0:
+        if client is None or cache is None:
+            raise ValueError("Post context mode 'summary' needs an OpenAI client and a PostContextCache.")
+        cached = cache.get(long_posts['post_id'])
+        to_generate = []
+        for post_id, post_title, post_body in long_posts.iter_rows():
+            source_hash = _source_hash(post_title, post_body)
+            cached_hash, summary = cached.get(post_id, (None, None))
+            if cached_hash == source_hash and summary is not None:
+                contexts[post_id] = SUMMARY_PREFIX + summary
+            else:
+                to_generate.append((post_id, post_title, post_body, source_hash))
+
+        n_generated, n_failed = 0, 0
+        with ThreadPoolExecutor(max_workers=max(max_concurrent_requests, 1)) as executor:
+            summaries = executor.map(lambda post: summarize_post(client, post[1], post[2], model=model), to_generate)
+            # Cache writes stay on this thread (the SQLite connection is not shared across threads)
+            for (post_id, _, _, source_hash), summary in zip(to_generate, summaries):
+                if summary is None:
+                    n_failed += 1
+                    continue
+                cache.upsert(post_id, source_hash, summary)
+                contexts[post_id] = SUMMARY_PREFIX + summary
+                n_generated += 1
+        logging.info(f"📝 Post summaries: {len(long_posts)} long posts | {len(long_posts) - len(to_generate)} cached | "
+                     f"{n_generated} generated | {n_failed} failed (truncated instead).")
+
+    posts = posts.with_columns(
+        pl.struct('post_id', 'post_body').map_elements(
+            lambda row: contexts.get(row['post_id']) or truncate_post_body(row['post_body'], max_chars),
+            return_dtype=pl.Utf8
+        ).alias('post_context')
+    )
+    if 'post_body_n_tokens' in posts.columns:
+        posts = posts.with_columns(
+            pl.when(pl.col('post_context') == pl.col('post_body')).then(pl.col('post_body_n_tokens')).alias('post_body_n_tokens')
+        )
+    posts = posts.with_columns(pl.col('post_context').alias('post_body')).drop('post_context')
+    n_chars_after = posts['post_body'].str.len_chars().sum() or 0
+    logging.info(f"✂️ Post contexts ({mode}): {len(posts)} posts | body characters {n_chars_before} -> {n_chars_after}.")
+    return posts
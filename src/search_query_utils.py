@@ -0,0 +1,149 @@
+# search_query_utils.py
+
+import re
+
+# --- QUERY PARSING ---
+# Parses the boolean search queries used in config_01.LIST_QUERIES, e.g.
+#   '((gaza OR palestine*) AND (hamas OR "anti-semit*")) OR (israel AND war)'
+# into a small tree of tuples:
+#   ('term', 'gaza') | ('phrase', 'anti-semit*') | ('and', [nodes]) | ('or', [nodes]) | ('not', node)
+# Adjacent terms without an operator (e.g. 'war crime') are combined with AND.
+
+_TOKEN_PATTERN = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+
+
+def _tokenize(query):
+    return _TOKEN_PATTERN.findall(query)
+
+
+def parse_query(query):
+    """Parses a boolean search query into a query tree."""
+    tokens = _tokenize(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == 'OR':
+            take()
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def parse_and():
+        children = [parse_unary()]
+        while peek() is not None and peek() not in ('OR', ')'):
+            if peek() == 'AND':
+                take()
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def parse_unary():
+        token = take()
+        if token == 'NOT':
+            return ('not', parse_unary())
+        if token == '(':
+            node = parse_or()
+            if peek() == ')':
+                take()
+            return node
+        if token.startswith('"'):
+            return ('phrase', token.strip('"'))
+        return ('term', token)
+
+    if not tokens:
+        raise ValueError("Empty search query.")
+    return parse_or()
+
+
+def render_query(node):
+    """Renders a query tree back into a search query string."""
+    kind = node[0]
+    if kind == 'term':
+        return node[1]
+    if kind == 'phrase':
+        return f'"{node[1]}"'
+    if kind == 'not':
+        return f'NOT {_render_operand(node[1])}'
+    operator = ' AND ' if kind == 'and' else ' OR '
+    return operator.join(_render_operand(child) for child in node[1])
+
+
+def _render_operand(node):
+    return f'({render_query(node)})' if node[0] in ('and', 'or') else render_query(node)
+
+# --- QUERY PARTITIONING ---
+
+def _n_alternatives(node):
+    """Number of OR alternatives that can be split apart in a query tree (1 = not splittable)."""
+    if node[0] == 'or':
+        return len(node[1])
+    if node[0] == 'and':
+        return max(_n_alternatives(child) for child in node[1])
+    return 1
+
+
+def _split_node(node):
+    if node[0] == 'or':
+        half = len(node[1]) // 2
+        left, right = node[1][:half], node[1][half:]
+        return [
+            left[0] if len(left) == 1 else ('or', left),
+            right[0] if len(right) == 1 else ('or', right),
+        ]
+    if node[0] == 'and':
+        # A AND (B OR C) == (A AND B) OR (A AND C): split the child with the most alternatives
+        children = node[1]
+        index = max(range(len(children)), key=lambda i: _n_alternatives(children[i]))
+        return [
+            ('and', children[:index] + [part] + children[index + 1:])
+            for part in _split_node(children[index])
+        ]
+    raise ValueError(f"Query node '{node[0]}' cannot be split.")
+
+
+def split_query(query):
+    """
+    Splits a boolean search query into two narrower queries whose matches, together, cover exactly the
+    matches of the original one (they may overlap). Returns None if the query has no OR to split on.
+    """
+    node = parse_query(query)
+    if _n_alternatives(node) < 2:
+        return None
+    return [render_query(part) for part in _split_node(node)]
+
+# --- LOCAL QUERY EVALUATION ---
+
+def _term_pattern(text):
+    """Case-insensitive regex for a term or phrase: whole words, a trailing '*' matching any word suffix."""
+    words = [re.escape(word.rstrip('*')) + (r"[\w'-]*" if word.endswith('*') else '') for word in text.lower().split()]
+    return re.compile(r'(?<![\w-])' + r'\W+'.join(words) + r"(?![\w'-])")
+
+
+def compile_query_matcher(query):
+    """
+    Compiles a boolean search query into a function `matches(text) -> bool` that evaluates it locally,
+    approximating Reddit search (case-insensitive, whole words, '*' as suffix wildcard, quoted phrases).
+    """
+
+    def compile_node(node):
+        kind = node[0]
+        if kind in ('term', 'phrase'):
+            pattern = _term_pattern(node[1])
+            return lambda text: pattern.search(text) is not None
+        if kind == 'not':
+            child = compile_node(node[1])
+            return lambda text: not child(text)
+        children = [compile_node(child) for child in node[1]]
+        if kind == 'and':
+            return lambda text: all(child(text) for child in children)
+        return lambda text: any(child(text) for child in children)
+
+    matcher = compile_node(parse_query(query))
+    return lambda text: matcher(text.lower())
@@ -0,0 +1,179 @@
+# token_utils.py
+
+import logging
+import polars as pl
+import tiktoken
+
+# --- TOKENIZER AND PRICING ---
+
+# Model of the LLM calls (see feature_engineering_utils): it sets the tokenizer and the price of a token
+DEFAULT_MODEL = 'gpt-4o-mini'
+
+# USD per 1M tokens
+MODEL_PRICING = {
+    'gpt-4o-mini': {'input': 0.15, 'output': 0.60},
+}
+# Requests sent through the asynchronous batch interface (see llm_batch_utils) are billed at this fraction of the price
+BATCH_PRICE_FACTOR = 0.5
+
+# Tokens added by the chat format around every message (role, separators) and to prime the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Texts are tokenized in slices of this many rows, so token lists never exist for a whole dataset at once
+TOKENIZE_SLICE_SIZE = 10_000
+
+TRUNCATION_POLICIES = ['head', 'head_tail']
+TRUNCATION_MARKER = ' [...] '
+
+_ENCODINGS = {}
+
+
+def get_encoding(model=DEFAULT_MODEL):
+    """Returns the tiktoken encoding of `model` (loaded once per process)."""
+    if model not in _ENCODINGS:
+        _ENCODINGS[model] = tiktoken.encoding_for_model(model)
+    return _ENCODINGS[model]
+
+# --- VECTORIZED TOKEN COUNTS ---
+
+def count_tokens(texts, model=DEFAULT_MODEL):
+    """
+    Token counts of a list (or Series) of texts. Texts are encoded in batch by tiktoken's multi-threaded
+    Rust core, not one Python call per text. Nulls count as 0 tokens.
+    """
+    encoding = get_encoding(model)
+    texts = ['' if text is None else text for text in texts]
+    counts = []
+    for i in range(0, len(texts), TOKENIZE_SLICE_SIZE):
+        counts.extend(len(tokens) for tokens in encoding.encode_ordinary_batch(texts[i:i + TOKENIZE_SLICE_SIZE]))
+    return counts
+
+
+def n_tokens_expr(column, model=DEFAULT_MODEL):
+    """Polars expression with the token count of a text column, named `<column>_n_tokens` (runs batch by batch, also in streaming queries)."""
+    return pl.col(column).map_batches(
+        lambda s: pl.Series(count_tokens(s.to_list(), model), dtype=pl.UInt32),
+        return_dtype=pl.UInt32,
+        is_elementwise=True
+    ).alias(f'{column}_n_tokens')
+
+
+def count_message_tokens(messages, model=DEFAULT_MODEL):
+    """Input tokens of a chat request (list of {'role', 'content'} messages), including the chat format overhead."""
+    return sum(TOKENS_PER_MESSAGE + n for n in count_tokens([m['content'] for m in messages], model)) + TOKENS_PER_REPLY
+
+# --- TRUNCATION POLICIES ---
+
+def _truncate_tokens(encoding, tokens, max_tokens, policy, marker):
+    """
+    Cuts one over-budget text (its `tokens`) to at most `max_tokens` tokens, marker included; returns (text, count).
+    Decoding can split a multi-byte character and tokens can merge across the cut, so the text is counted again
+    and the kept tokens are reduced until it fits. A budget too small for the marker gets a plain cut of the head.
+    """
+    n_marker_tokens = len(encoding.encode_ordinary(marker))
+    if max_tokens <= n_marker_tokens:
+        policy, marker, n_marker_tokens = 'head', '', 0
+    n_keep = max_tokens - n_marker_tokens
+    while True:
+        if policy == 'head':
+            text = encoding.decode(tokens[:n_keep]) + marker
+        else:
+            # An odd budget gives the extra token to the head
+            n_head, n_tail = n_keep - n_keep // 2, n_keep // 2
+            text = encoding.decode(tokens[:n_head]) + marker + encoding.decode(tokens[len(tokens) - n_tail:])
+        n_tokens = len(encoding.encode_ordinary(text))
+        if n_tokens <= max_tokens or n_keep == 0:
+            return text, n_tokens
+        n_keep = max(n_keep - (n_tokens - max_tokens), 0)
+
+
+def truncate_texts(texts, max_tokens, policy='head', model=DEFAULT_MODEL):
+    """
+    Cuts every text longer than `max_tokens` tokens. Returns (texts, token counts after truncation).
+    - 'head': keeps the first tokens.
+    - 'head_tail': keeps the first and the last tokens, half each (the end of a long comment often holds its point).
+    The marker joining the kept tokens counts towards `max_tokens`, and the count of a truncated text is taken on
+    the string actually returned, so it matches what is sent and never exceeds the budget (see _truncate_tokens).
+    Only the texts over the budget are decoded back to strings.
+    """
+    if policy not in TRUNCATION_POLICIES:
+        raise ValueError(f"Unknown truncation policy '{policy}'. Use one of {TRUNCATION_POLICIES}.")
+    encoding = get_encoding(model)
+    marker = TRUNCATION_MARKER.rstrip() if policy == 'head' else TRUNCATION_MARKER
+    texts = list(texts)
+    counts = []
+    for i in range(0, len(texts), TOKENIZE_SLICE_SIZE):
+        batch = texts[i:i + TOKENIZE_SLICE_SIZE]
+        for j, tokens in enumerate(encoding.encode_ordinary_batch(['' if t is None else t for t in batch])):
+            if len(tokens) <= max_tokens:
+                counts.append(len(tokens))
+                continue
+            texts[i + j], n_tokens = _truncate_tokens(encoding, tokens, max_tokens, policy, marker)
+            counts.append(n_tokens)
+    return texts, counts
+
+
+def apply_truncation_policies(df, policies, model=DEFAULT_MODEL):
+    """
+    Applies per-field token budgets to the text columns of `df`, e.g.
+    {'post_body': {'max_tokens': 400, 'policy': 'head'}, 'comment_body': {'max_tokens': 800, 'policy': 'head_tail'}}.
+    Columns missing from `df` are skipped. The stored `<column>_n_tokens` counts (see data_processing_utils) pick the
+    rows over the budget, so only those (and rows without a count) are tokenized; the counts of truncated rows are refreshed.
+    """
+    for column, config in (policies or {}).items():
+        if column not in df.columns:
+            continue
+        max_tokens, policy = config['max_tokens'], config.get('policy', 'head')
+        count_column = f'{column}_n_tokens'
+        if count_column not in df.columns:
+            df = df.with_columns(pl.lit(None, dtype=pl.UInt32).alias(count_column))
+        stored_counts = df[count_column].cast(pl.UInt32)
+        idx = (stored_counts.is_null() | (stored_counts > max_tokens)).arg_true()
+        before = df[column].gather(idx).to_list()
+        texts, counts = truncate_texts(before, max_tokens, policy, model)
+        n_truncated = sum(1 for b, a in zip(before, texts) if b is not None and b != a)
+        df = df.with_columns(
+            df[column].cast(pl.Utf8).scatter(idx, texts),
+            stored_counts.scatter(idx, counts),
+        )
+        logging.info(f"✂️ {column}: {n_truncated}/{len(df)} texts truncated to {max_tokens} tokens ({policy}), {len(idx)} tokenized.")
+    return df
+
+# --- RUN ESTIMATES ---
+
+def estimate_run_cost(prompt_tokens, output_tokens_per_record, model=DEFAULT_MODEL, outlier_prompt_tokens=None, batch_api=False,
+                      n_output_records=None):
+    """
+    Projects the tokens and cost (USD) of sending one request per record, given the input tokens of every rendered
+    prompt (`prompt_tokens`). Records whose prompt exceeds `outlier_prompt_tokens` are counted as outliers.
+    With `batch_api`, the cost is projected at batch pricing. When a request answers several records (thread-grouped
+    requests), `n_output_records` is the total number of records answered.
+    """
+    price_factor = BATCH_PRICE_FACTOR if batch_api else 1.0
+    pricing = {kind: price * price_factor for kind, price in MODEL_PRICING[model].items()}
+    s = pl.Series('prompt_tokens', prompt_tokens, dtype=pl.Int64)
+    n_records = len(s)
+    input_tokens = int(s.sum() or 0)
+    output_tokens = (n_records if n_output_records is None else n_output_records) * output_tokens_per_record
+    return {
+        'n_records': n_records,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'mean_prompt_tokens': float(s.mean() or 0),
+        'p99_prompt_tokens': float(s.quantile(0.99) or 0),
+        'max_prompt_tokens': int(s.max() or 0),
+        'n_outliers': int((s > outlier_prompt_tokens).sum()) if outlier_prompt_tokens else 0,
+        'cost_usd': (input_tokens * pricing['input'] + output_tokens * pricing['output']) / 1_000_000,
+        'batch_api': batch_api,
+    }
+
+
+def log_run_estimate(feature_name, estimate, outlier_prompt_tokens=None):
+    logging.info(f"🧮 TOKEN ESTIMATE ({feature_name}): {estimate['n_records']} requests | "
+                 f"input {estimate['input_tokens']:,} + output {estimate['output_tokens']:,} tokens | "
+                 f"projected cost ${estimate['cost_usd']:.4f}{' (batch pricing)' if estimate.get('batch_api') else ''}")
+    logging.info(f"   Prompt tokens per request -> mean {estimate['mean_prompt_tokens']:.0f} | "
+                 f"p99 {estimate['p99_prompt_tokens']:.0f} | max {estimate['max_prompt_tokens']}")
+    if estimate['n_outliers']:
+        logging.warning(f"⚠️ {estimate['n_outliers']} requests exceed {outlier_prompt_tokens} prompt tokens (check the truncation policies).")
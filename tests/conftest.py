@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+import tiktoken
+
+# The tests import the project modules as the scripts do (src.*, config.*), from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import token_utils
+
+
+@pytest.fixture
+def offline_encoding(monkeypatch):
+    """
+    Byte-level encoding standing in for the model's (whose ranks tiktoken downloads on first use), so token counts
+    run offline and are deterministic. A few merges make tokens span several bytes, as in the real encoding.
+    """
+    ranks = {bytes([i]): i for i in range(256)}
+    for merge in [b' w', b'or', b' wor', b'ord', b' word']:
+        ranks[merge] = len(ranks)
+    encoding = tiktoken.Encoding(
+        name='offline_test', mergeable_ranks=ranks, special_tokens={},
+        pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+    )
+    monkeypatch.setitem(token_utils._ENCODINGS, token_utils.DEFAULT_MODEL, encoding)
+    return encoding
@@ -0,0 +1,79 @@
+import json
+import logging
+
+import polars as pl
+
+from config.config_03bc_04bc import FEATURE_CONFIG
+from src.fake_backend_utils import FakeOpenAIClient
+from src.feature_engineering_utils import parse_thread_predictions, run_thread_generation_for_feature
+from src.feature_store_utils import scan_feature_results
+
+
+def _thread_reply(*items):
+    return json.dumps({'results': [dict(zip(('id', 'political_stance'), item)) for item in items]})
+
+
+# --- parse_thread_predictions ---
+
+def test_parse_thread_predictions_maps_numbers_to_values():
+    reply = _thread_reply((1, 4), (2, '2'), (3, 5))
+    assert parse_thread_predictions(reply, 'political_stance', 'ordinal', 3) == {1: 4, 2: 2, 3: 5}
+
+
+def test_parse_thread_predictions_ignores_out_of_range_numbers():
+    reply = _thread_reply((0, 1), (1, 4), (4, 2), (-1, 3))
+    assert parse_thread_predictions(reply, 'political_stance', 'ordinal', 3) == {1: 4}
+
+
+def test_parse_thread_predictions_keeps_the_first_of_duplicate_numbers():
+    reply = _thread_reply((2, 1), (2, 5), (1, 3))
+    assert parse_thread_predictions(reply, 'political_stance', 'ordinal', 2) == {2: 1, 1: 3}
+
+
+def test_parse_thread_predictions_ignores_items_without_a_valid_number_or_value():
+    reply = json.dumps({'results': [
+        {'political_stance': 4},               # no number
+        {'id': 'two', 'political_stance': 4},  # not a number
+        {'id': 2},                             # no value
+        {'id': 3, 'political_stance': None},   # null value
+        'id 1: 4',                             # not an object
+        {'id': '1', 'political_stance': 2},
+    ]})
+    assert parse_thread_predictions(reply, 'political_stance', 'ordinal', 3) == {1: 2}
+
+
+def test_parse_thread_predictions_gives_nothing_for_malformed_replies():
+    for reply in [None, '', 'not json', '[]', '{"results": {"id": 1}}', json.dumps({'political_stance': 3})]:
+        assert parse_thread_predictions(reply, 'political_stance', 'ordinal', 2) == {}
+
+# --- Thread-grouped generation: single-comment fallback ---
+
+def test_thread_generation_sends_comments_missing_from_the_reply_to_single_calls(tmp_path, offline_encoding):
+    # One post with 4 comments (one thread request): the reply answers comment 1, duplicates it with another
+    # value, numbers a comment that does not exist, gives an invalid value for comment 3 and omits comment 4
+    df = pl.DataFrame({'comment_id': ['c1', 'c2', 'c3', 'c4'], 'post_id': ['p1'] * 4,
+                       'comment_body': ['first', 'second', 'third', 'fourth']})
+    posts = pl.DataFrame({'post_id': ['p1'], 'post_title': ['title'], 'post_body': ['body']})
+    df_train = pl.DataFrame({'text_content': ['reference text'], 'political_stance': [3]})
+    requests = []
+
+    def reply_fn(body, custom_id):
+        content = body['messages'][-1]['content']
+        requests.append(content)
+        if '"results"' in content:
+            return json.dumps({'results': [{'id': 1, 'political_stance': 2}, {'id': 1, 'political_stance': 5},
+                                           {'id': 7, 'political_stance': 5}, {'id': 2, 'political_stance': 4},
+                                           {'id': 3, 'political_stance': 'unknown'}]})
+        return json.dumps({'political_stance': 1})
+
+    client = FakeOpenAIClient(reply_fn=reply_fn)
+    run_thread_generation_for_feature('political_stance', str(tmp_path), FEATURE_CONFIG['political_stance'], df, df_train,
+                                      10, False, 1, 1, client, logging, posts, max_comments_per_request=10)
+
+    stored = scan_feature_results(str(tmp_path), 'political_stance', 'ordinal').collect()
+    assert dict(stored.iter_rows()) == {'c1': 2, 'c2': 4, 'c3': 1, 'c4': 1}
+    # One thread request, then one single-comment request per comment it missed
+    assert client.n_chat_requests == 3
+    single_requests = [content for content in requests if '"results"' not in content]
+    assert ['third' in content for content in single_requests] == [True, False]
+    assert ['fourth' in content for content in single_requests] == [False, True]
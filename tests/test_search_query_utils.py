@@ -0,0 +1,87 @@
+import itertools
+
+import pytest
+
+from src.search_query_utils import compile_query_matcher, parse_query, render_query, split_query
+
+# Queries of the shape used in config_01.LIST_QUERIES
+QUERIES = [
+    'gaza',
+    'gaza OR israel',
+    '"hate speech" AND israel',
+    'gaza war crime',
+    'NOT hamas AND gaza',
+    '(gaza OR palestine*) AND (hamas OR terroris* OR attack)',
+    '((gaza OR palestine*) AND (hamas OR terroris* OR attack OR hostages OR netanyahu OR IDF OR war OR conflict)) '
+    'OR (israel AND (hamas OR terroris* OR attack OR hostages OR netanyahu OR IDF OR war OR conflict))',
+    '((gaza OR palestine*) AND (media OR antisemit* OR "anti-semit*" OR "hate speech")) OR (israel AND NOT media)',
+]
+
+# Every combination of up to 3 of these words, so every branch of the queries above is hit and missed
+WORDS = ['Gaza', 'palestinians', 'israel', 'hamas', 'terrorism', 'attack', 'hostages', 'media', 'anti-semitism',
+         'hate speech', 'war crime', 'conflict', 'weather']
+TEXTS = [' '.join(words) for n in range(4) for words in itertools.combinations(WORDS, n)]
+
+
+def _split_until_atomic(query):
+    """Splits a query recursively until no part can be split; returns the leaf queries."""
+    parts = split_query(query)
+    if parts is None:
+        return [query]
+    return [leaf for part in parts for leaf in _split_until_atomic(part)]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_render_query_round_trips(query):
+    node = parse_query(query)
+    assert parse_query(render_query(node)) == node
+
+
+def test_parse_query_structure():
+    assert parse_query('gaza war crime') == ('and', [('term', 'gaza'), ('term', 'war'), ('term', 'crime')])
+    assert parse_query('a OR b AND c') == ('or', [('term', 'a'), ('and', [('term', 'b'), ('term', 'c')])])
+    assert parse_query('NOT "hate speech"') == ('not', ('phrase', 'hate speech'))
+    with pytest.raises(ValueError):
+        parse_query('   ')
+
+
+def test_split_query_distributes_or_over_and():
+    assert split_query('gaza AND (hamas OR attack)') == ['gaza AND hamas', 'gaza AND attack']
+    assert split_query('(a OR b) AND (c OR d OR e)') == ['(a OR b) AND c', '(a OR b) AND (d OR e)']
+    assert split_query('a OR b OR c') == ['a', 'b OR c']
+
+
+def test_split_query_returns_none_without_or():
+    assert split_query('gaza') is None
+    assert split_query('gaza AND "hate speech"') is None
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_split_query_is_lossless(query):
+    # The union of the parts matches exactly the texts the query matches, at every level of splitting
+    matches = compile_query_matcher(query)
+    parts = split_query(query) or [query]
+    leaves = _split_until_atomic(query)
+    part_matchers = [compile_query_matcher(part) for part in parts]
+    leaf_matchers = [compile_query_matcher(leaf) for leaf in leaves]
+    for text in TEXTS:
+        assert matches(text) == any(m(text) for m in part_matchers), (text, parts)
+        assert matches(text) == any(m(text) for m in leaf_matchers), (text, leaves)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_compile_query_matcher_agrees_with_rendered_query(query):
+    matches = compile_query_matcher(query)
+    matches_rendered = compile_query_matcher(render_query(parse_query(query)))
+    assert any(matches(text) for text in TEXTS)
+    for text in TEXTS:
+        assert matches(text) == matches_rendered(text), text
+
+
+def test_compile_query_matcher_rules():
+    matches = compile_query_matcher('(gaza OR palestine*) AND "anti-semit*" AND NOT media')
+    assert matches('GAZA and anti-semitism')
+    assert matches('Palestines: anti-semitic')  # suffix wildcards
+    assert not matches('gaza anti-semitism media')
+    assert not matches('gazan anti-semitism')  # whole words only
+    assert not matches('gaza semitism')
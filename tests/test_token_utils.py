@@ -0,0 +1,56 @@
+import polars as pl
+import pytest
+
+from src.token_utils import TRUNCATION_POLICIES, apply_truncation_policies, count_tokens, truncate_texts
+
+TEXTS = [
+    None,
+    '',
+    'short comment',
+    'word ' * 40,
+    ' '.join(f'w{i}' for i in range(300)),
+    'A long comment about the ceasefire talks, with punctuation! And numbers: 1948, 1967, 2023. ' * 12,
+    'Çà et là, les réfugiés — 難民 — « déplacés » ' * 20,
+]
+
+
+@pytest.mark.parametrize('policy', TRUNCATION_POLICIES)
+@pytest.mark.parametrize('max_tokens', [1, 2, 3, 7, 8, 15, 16, 51, 100])
+def test_truncate_texts_fits_the_budget_and_counts_what_is_sent(offline_encoding, policy, max_tokens):
+    texts, counts = truncate_texts(TEXTS, max_tokens, policy)
+    assert len(texts) == len(counts) == len(TEXTS)
+    # Stored counts are the counts of the texts actually sent, and never exceed the budget (marker included)
+    assert counts == count_tokens(texts)
+    assert all(n <= max_tokens for n in counts)
+    for before, after in zip(TEXTS, texts):
+        if count_tokens([before])[0] <= max_tokens:
+            assert after == before
+
+
+@pytest.mark.parametrize('max_tokens', [31, 32])
+def test_head_tail_uses_the_whole_budget(offline_encoding, max_tokens):
+    text = ' '.join(f'w{i}' for i in range(300))
+    (truncated,), (n_tokens,) = truncate_texts([text], max_tokens, 'head_tail')
+    assert truncated.startswith('w0 w1') and truncated.endswith('w298 w299')
+    # Byte-level tokens can merge across the cut, so the text may end a token or so short of the budget
+    assert max_tokens - 2 <= n_tokens <= max_tokens
+
+
+def test_truncate_texts_rejects_unknown_policies(offline_encoding):
+    with pytest.raises(ValueError):
+        truncate_texts(TEXTS, 10, 'tail')
+
+
+def test_apply_truncation_policies_uses_stored_counts(offline_encoding):
+    texts = ['short', 'word ' * 50, 'also long ' * 30, None]
+    # The count of the third text is stale (as if stored before an edit): it is trusted, so the text is kept as is;
+    # the last row has no stored count and is counted
+    df = pl.DataFrame({
+        'comment_body': texts,
+        'comment_body_n_tokens': pl.Series([count_tokens(['short'])[0], count_tokens([texts[1]])[0], 5, None], dtype=pl.UInt32),
+    })
+    result = apply_truncation_policies(df, {'comment_body': {'max_tokens': 20, 'policy': 'head_tail'}})
+    assert result['comment_body'].to_list()[0] == 'short'
+    assert result['comment_body'].to_list()[2] == texts[2]
+    assert result['comment_body_n_tokens'].to_list() == [count_tokens(['short'])[0], count_tokens([result['comment_body'][1]])[0], 5, 0]
+    assert result['comment_body_n_tokens'][1] <= 20